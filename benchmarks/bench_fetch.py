@@ -0,0 +1,87 @@
+
+"""
+Times cold and cached fetches through the local stand-in for the Polygon
+aggregates API, with configurable latency, rate limits and errors.
+
+    $ python benchmarks/bench_fetch.py --tickers 20 --days 60 --latency 50 --rate 10
+"""
+
+from argparse import (ArgumentParser)
+from datetime import (datetime, timedelta)
+
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'correlate'))
+
+from replay import (Faults, ReplayServer)
+from util.client import (PolygonClient)
+from util.logs import (logger)
+
+import util.database as database
+import util.storage as storage
+
+
+def main() -> None:
+    parser = ArgumentParser(prog='bench_fetch', allow_abbrev=False)
+    parser.add_argument('--tickers', default=10, type=int, metavar='N')
+    parser.add_argument('--days', default=30, type=int, metavar='N')
+    parser.add_argument('--latency', default=20.0, type=float, metavar='MS')
+    parser.add_argument('--jitter', default=0.0, type=float, metavar='MS')
+    parser.add_argument('--rate', default=None, type=float, metavar='N')
+    parser.add_argument('--burst', default=5, type=int, metavar='N')
+    parser.add_argument('--error-rate', default=0.0, type=float, metavar='FRACTION')
+    parser.add_argument('--page-size', default=5000, type=int, metavar='N')
+    parser.add_argument('--output', default=None, type=str, metavar='FILE')
+    args = parser.parse_args()
+
+    logger.setLevel(logging.WARNING)
+
+    tickers = [f"SIM{i:04d}" for i in range(args.tickers)]
+    t0 = datetime(2024, 1, 1, 8, 30)
+    t1 = t0 + timedelta(days=args.days)
+
+    faults = Faults(
+        latency=args.latency / 1000,
+        jitter=args.jitter / 1000,
+        rate=args.rate,
+        burst=args.burst,
+        error_rate=args.error_rate,
+    )
+
+    with tempfile.TemporaryDirectory() as directory, ReplayServer(faults=faults, page_size=args.page_size) as server:
+        database.PATH = os.path.join(directory, 'olhcv.db')
+        storage.use('sqlite').init()
+
+        client = PolygonClient(api_key='offline', base=server.url)
+
+        results = {}
+
+        for name in ('cold', 'cached'):
+            before = server.stats()
+
+            t = time.perf_counter()
+            panel = client.fetch_panel(tickers=tickers, t0=t0, t1=t1)
+            seconds = time.perf_counter() - t
+
+            after = server.stats()
+
+            results[name] = {
+                'seconds': seconds,
+                'bars': int(panel.values.size),
+                'bars_per_second': panel.values.size / seconds,
+                'server': {key: after[key] - before[key] for key in after},
+            }
+
+    print(json.dumps(results, indent=4))
+
+    if args.output is not None:
+        with open(args.output, 'w') as file:
+            json.dump({'args': vars(args), 'results': results}, file, indent=4)
+
+if __name__ == '__main__':
+    main()
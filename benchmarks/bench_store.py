@@ -0,0 +1,101 @@
+
+"""
+Compares full-history loads from the SQLite and columnar bar stores on
+synthetic hourly bars.
+
+    $ python benchmarks/bench_store.py --tickers 10 --bars 50000
+"""
+
+from argparse import (ArgumentParser)
+from datetime import (datetime)
+from typing import (Callable, Dict, List)
+
+import numpy as np
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'correlate'))
+
+from util.ohlcv import (OHLCVBatch)
+
+import util.colstore as colstore
+import util.database as database
+
+
+def synthetic_batch(symbol: str, n: int, seed: int) -> OHLCVBatch:
+    """
+    Generates 'n' hourly bars following a geometric random walk.
+    """
+
+    rng = np.random.default_rng(seed)
+    close = 100.0 * np.exp(np.cumsum(rng.normal(0.0, 0.01, n)))
+    spread = np.abs(rng.normal(0.0, 0.005, n)) * close
+
+    return OHLCVBatch(
+        symbol=symbol,
+        t=1_500_000_000 + 3600 * np.arange(n, dtype=np.int64),
+        open=np.roll(close, 1),
+        high=close + spread,
+        low=close - spread,
+        close=close,
+        volume=rng.integers(1_000, 100_000, n).astype(np.float64),
+    )
+
+def best_of(repeat: int, f: Callable[[], object]) -> float:
+    """
+    Returns the fastest wall time of 'repeat' calls to 'f', in seconds.
+    """
+
+    times = []
+
+    for _ in range(repeat):
+        t = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - t)
+
+    return min(times)
+
+def main() -> None:
+    parser = ArgumentParser(prog='bench_store', allow_abbrev=False)
+    parser.add_argument('--tickers', default=10, type=int, metavar='N')
+    parser.add_argument('--bars', default=50_000, type=int, metavar='N')
+    parser.add_argument('--repeat', default=5, type=int, metavar='N')
+    args = parser.parse_args()
+
+    tickers: List[str] = [f"SIM{i:04d}" for i in range(args.tickers)]
+    t0 = datetime.fromtimestamp(0)
+    t1 = datetime.fromtimestamp(2**31 - 1)
+
+    with tempfile.TemporaryDirectory() as directory:
+        database.PATH = os.path.join(directory, 'olhcv.db')
+        colstore.PATH = os.path.join(directory, 'bars')
+
+        results: Dict[str, Dict[str, float]] = {}
+
+        for name, backend in (('sqlite', database), ('columnar', colstore)):
+            backend.init()
+
+            t = time.perf_counter()
+            for i, ticker in enumerate(tickers):
+                backend.insert_ohlcv(synthetic_batch(ticker, args.bars, seed=i))
+            insert = time.perf_counter() - t
+
+            def load():
+                for ticker in tickers:
+                    np.sum(backend.select_ohlcv_batch(ticker=ticker, t0=t0, t1=t1).close)
+
+            results[name] = {'insert': insert, 'load': best_of(args.repeat, load)}
+
+    nbars = args.tickers * args.bars
+
+    print(f"{args.tickers} tickers x {args.bars} bars")
+    print(f"{'backend':<10} {'insert (s)':>12} {'load (s)':>12} {'bars/s':>14}")
+
+    for name, result in results.items():
+        print(f"{name:<10} {result['insert']:>12.4f} {result['load']:>12.4f} {nbars / result['load']:>14.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+
+"""
+Measures the startup time of the 'correlate' CLI with 'python -X importtime',
+and optionally compares it against a baseline so that import regressions can
+be tracked.
+
+    $ python benchmarks/startup.py --output startup.json
+    $ python benchmarks/startup.py --baseline startup.json --tolerance 0.25
+"""
+
+from argparse import (ArgumentParser)
+from typing import (Dict, List, Tuple)
+
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+# The directory holding the 'correlate' sources.
+SOURCES: str = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'correlate')
+
+# The commands to time, by scenario: the CLI's help, and the imports of the
+# modules that a cached run loads before fitting anything.
+SCENARIOS: Dict[str, List[str]] = {
+    'help': [SOURCES, '--help'],
+    'modules': ['-c', f"""
+import sys
+sys.path.insert(0, {SOURCES!r})
+import args, cache, pipeline
+import util.client, util.prefetch, util.results, util.storage
+"""],
+}
+
+# A line of 'python -X importtime' output: the self and cumulative import
+# times in microseconds, and the module name indented by its nesting depth.
+LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$')
+
+def importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    """
+    Returns the (module, depth, cumulative microseconds) of each import
+    reported by 'python -X importtime'.
+    """
+
+    imports = []
+
+    for line in stderr.splitlines():
+        match = LINE.match(line)
+
+        if match is not None:
+            imports.append((match.group(4), len(match.group(3)) // 2, int(match.group(2))))
+
+    return imports
+
+def measure(arguments: List[str], repeat: int, top: int) -> Dict[str, object]:
+    """
+    Runs the interpreter with 'arguments' 'repeat' times, and returns the
+    fastest wall time and total import time, in milliseconds, along with the
+    'top' slowest top-level imports of the run with the fastest imports.
+    """
+
+    walls, runs = [], []
+
+    for _ in range(repeat):
+        t = time.perf_counter()
+        process = subprocess.run([sys.executable, '-X', 'importtime', *arguments], capture_output=True, text=True)
+        walls.append(time.perf_counter() - t)
+
+        if process.returncode != 0:
+            raise RuntimeError(f"{' '.join(arguments)} failed:\n{process.stderr}")
+
+        runs.append(importtime(process.stderr))
+
+    imports = min(runs, key=lambda run: sum(us for _, depth, us in run if depth == 0))
+    roots = sorted(((name, us) for name, depth, us in imports if depth == 0), key=lambda root: -root[1])
+
+    return {
+        'wall_ms': round(min(walls) * 1e3, 2),
+        'import_ms': round(sum(us for _, us in roots) / 1e3, 2),
+        'modules': len(imports),
+        'top': [[name, round(us / 1e3, 2)] for name, us in roots[:top]],
+    }
+
+def main() -> None:
+    parser = ArgumentParser(prog='startup', allow_abbrev=False)
+    parser.add_argument('--repeat', default=5, type=int, metavar='N')
+    parser.add_argument('--top', default=10, type=int, metavar='N')
+    parser.add_argument('--output', default=None, type=str, metavar='FILE')
+    parser.add_argument('--baseline', default=None, type=str, metavar='FILE')
+    parser.add_argument('--tolerance', default=0.25, type=float, metavar='FRACTION')
+    args = parser.parse_args()
+
+    results = {name: measure(arguments, args.repeat, args.top) for name, arguments in SCENARIOS.items()}
+
+    print(json.dumps(results, indent=4))
+
+    if args.output is not None:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=4)
+
+    if args.baseline is not None:
+        with open(args.baseline, 'r') as file:
+            baseline = json.load(file)
+
+        regressions = []
+
+        for name, result in results.items():
+            if name not in baseline:
+                continue
+
+            before, after = baseline[name]['import_ms'], result['import_ms']
+
+            print(f"{name:<10} import {before:9.2f} ms -> {after:9.2f} ms ({after / before - 1:+.1%})", file=sys.stderr)
+
+            if after > before * (1 + args.tolerance):
+                regressions.append(name)
+
+        if len(regressions) > 0:
+            print(f"startup regressed beyond {args.tolerance:.0%}: {', '.join(regressions)}", file=sys.stderr)
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,313 @@
+
+"""
+Times the hot paths of the GARCH and DCC models and of the data layer over a
+grid of sizes, on synthetic data and without network access, and compares
+runs for regressions.
+
+    $ python benchmarks/suite.py --bars 100,1000,10000 --tickers 2,10,50 --output before.json
+    $ python benchmarks/suite.py --bars 100,1000,10000 --tickers 2,10,50 --compare before.json
+
+Cases are run from the smallest size up; once a case takes longer than
+'--budget' seconds, its larger sizes are recorded as skipped.
+"""
+
+from argparse import (ArgumentParser)
+from datetime import (datetime)
+from typing import (Any, Callable, Dict, Final, List, Optional, Self, Tuple)
+
+import itertools
+import json
+import logging
+import numpy as np
+import os
+import platform
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'correlate'))
+
+from bench_store import (best_of, synthetic_batch)
+from dcc import (DCC)
+from dcc_loss import (dcc_loss)
+from garch import (GARCH)
+from garch_loss import (garch_loss, garch_process)
+from util.client import (PolygonClient)
+from util.logs import (logger)
+
+import util.colstore as colstore
+import util.database as database
+import util.storage as storage
+
+# The parameters of the GARCH(1, 1) process the synthetic returns follow.
+THETA: Final[np.ndarray] = np.array([1e-6, 0.05, 0.05, 0.85])
+
+def synthetic_returns(T: int, seed: int) -> np.ndarray:
+    """
+    Generates 'T' returns of a GJR-GARCH(1, 1) process with parameters
+    'THETA'.
+    """
+
+    rng = np.random.default_rng(seed)
+    z = rng.standard_normal(T)
+    w, alpha, gamma, beta = THETA
+
+    r = np.empty(T)
+    var = w / (1.0 - alpha - 0.5 * gamma - beta)
+
+    for t in range(T):
+        r[t] = np.sqrt(var) * z[t]
+        var = w + (alpha + gamma * (r[t] < 0)) * r[t] ** 2 + beta * var
+
+    return r
+
+def synthetic_residuals(n: int, T: int, seed: int) -> np.ndarray:
+    """
+    Generates (n, T) standardized residuals with a constant correlation of
+    0.3 between every pair of assets.
+    """
+
+    rng = np.random.default_rng(seed)
+    common = rng.standard_normal(T)
+
+    return np.sqrt(0.3) * common + np.sqrt(0.7) * rng.standard_normal((n, T))
+
+class Case:
+    """
+    A benchmark over a grid of sizes. 'setup' builds the inputs for a size,
+    and returns the function to time along with the number of bars it
+    processes.
+    """
+
+    def __init__(self: Self, name: str, sizes: Callable[[Any], List[Tuple[int, int]]], setup: Callable[..., Tuple[Callable[[], Any], int]]) -> None:
+        self.name = name
+        self.sizes = sizes
+        self.setup = setup
+
+def series(args: Any) -> List[Tuple[int, int]]:
+    return [(1, T) for T in args.bars]
+
+def panels(args: Any) -> List[Tuple[int, int]]:
+    return list(itertools.product(args.tickers, args.bars))
+
+def setup_garch_loss(n: int, T: int, args: Any) -> Tuple[Callable[[], Any], int]:
+    r = synthetic_returns(T, seed=0)[::-1]
+
+    return (lambda: garch_loss(r, THETA, 1, 1)), T
+
+def setup_garch_process(n: int, T: int, args: Any) -> Tuple[Callable[[], Any], int]:
+    r = synthetic_returns(T, seed=0)[::-1]
+
+    return (lambda: garch_process(r, THETA, 1, 1)), T
+
+def setup_garch_fit(n: int, T: int, args: Any) -> Tuple[Callable[[], Any], int]:
+    r = synthetic_returns(T, seed=0)[::-1]
+
+    return (lambda: GARCH(max_iterations=args.iterations).fit(r)), T
+
+def setup_dcc_loss(n: int, T: int, args: Any) -> Tuple[Callable[[], Any], int]:
+    epsilon = synthetic_residuals(n, T, seed=0)
+
+    return (lambda: dcc_loss(epsilon, np.array([0.05, 0.9]))), n * T
+
+def setup_dcc_fit(n: int, T: int, args: Any) -> Tuple[Callable[[], Any], int]:
+    epsilon = synthetic_residuals(n, T, seed=0)
+
+    return (lambda: DCC(n=n, max_iterations=args.iterations).fit(epsilon)), n * T
+
+def store(name: str, directory: str) -> Any:
+    """
+    Points the storage backend 'name' at a fresh location in 'directory',
+    and returns it.
+    """
+
+    database.PATH = os.path.join(directory, f'{time.perf_counter_ns()}.db')
+    colstore.PATH = os.path.join(directory, f'{time.perf_counter_ns()}.bars')
+
+    backend = storage.use(name)
+    backend.init()
+
+    return backend
+
+def setup_insert(name: str) -> Callable[..., Tuple[Callable[[], Any], int]]:
+    def setup(n: int, T: int, args: Any) -> Tuple[Callable[[], Any], int]:
+        batches = [synthetic_batch(f"SIM{i:04d}", T, seed=i) for i in range(n)]
+
+        def insert():
+            backend = store(name, args.directory)
+
+            for batch in batches:
+                backend.insert_ohlcv(batch)
+
+        return insert, n * T
+
+    return setup
+
+def setup_select(name: str, method: str) -> Callable[..., Tuple[Callable[[], Any], int]]:
+    def setup(n: int, T: int, args: Any) -> Tuple[Callable[[], Any], int]:
+        backend = store(name, args.directory)
+        tickers = [f"SIM{i:04d}" for i in range(n)]
+
+        for i, ticker in enumerate(tickers):
+            backend.insert_ohlcv(synthetic_batch(ticker, T, seed=i))
+
+        t0, t1 = datetime.fromtimestamp(0), datetime.fromtimestamp(2**31 - 1)
+
+        if method == 'select_panel':
+            return (lambda: backend.select_panel(tickers=tickers, t0=t0, t1=t1)), n * T
+
+        select = getattr(backend, method)
+
+        return (lambda: [select(ticker=ticker, t0=t0, t1=t1) for ticker in tickers]), n * T
+
+    return setup
+
+def setup_fetch(n: int, T: int, args: Any) -> Tuple[Callable[[], Any], int]:
+    backend = store('sqlite', args.directory)
+    tickers = [f"SIM{i:04d}" for i in range(n)]
+
+    t0 = datetime.fromtimestamp(1_500_000_000)
+    t1 = datetime.fromtimestamp(1_500_000_000 + 3600 * T - 1)
+
+    for i, ticker in enumerate(tickers):
+        backend.insert_bars(synthetic_batch(ticker, T, seed=i), t0, t1)
+
+    client = PolygonClient(api_key='offline')
+
+    return (lambda: list(client.fetch(tickers=tickers, t0=t0, t1=t1))), n * T
+
+# The benchmark cases, by name.
+CASES: Final[Dict[str, Case]] = {case.name: case for case in [
+    Case('garch_process', series, setup_garch_process),
+    Case('garch_loss', series, setup_garch_loss),
+    Case('garch_fit', series, setup_garch_fit),
+    Case('dcc_loss', panels, setup_dcc_loss),
+    Case('dcc_fit', panels, setup_dcc_fit),
+    Case('sqlite_insert', panels, setup_insert('sqlite')),
+    Case('sqlite_select_ohlcv', panels, setup_select('sqlite', 'select_ohlcv')),
+    Case('sqlite_select_batch', panels, setup_select('sqlite', 'select_ohlcv_batch')),
+    Case('sqlite_select_panel', panels, setup_select('sqlite', 'select_panel')),
+    Case('columnar_insert', panels, setup_insert('columnar')),
+    Case('columnar_select_batch', panels, setup_select('columnar', 'select_ohlcv_batch')),
+    Case('columnar_select_panel', panels, setup_select('columnar', 'select_panel')),
+    Case('fetch', panels, setup_fetch),
+]}
+
+def run(args: Any) -> List[Dict[str, Any]]:
+    """
+    Runs the selected cases over their grid of sizes, and returns one result
+    per case and size.
+    """
+
+    results = []
+
+    for name in args.cases:
+        case = CASES[name]
+        over: Optional[Tuple[int, int]] = None
+
+        for n, T in case.sizes(args):
+            result = {'case': name, 'n': n, 'T': T}
+
+            if over is not None and n >= over[0] and T >= over[1]:
+                result['skipped'] = f'n={over[0]}, T={over[1]} exceeded the {args.budget} s budget'
+            else:
+                f, bars = case.setup(n, T, args)
+                seconds = best_of(args.repeat, f)
+
+                result['seconds'] = seconds
+                result['bars_per_second'] = bars / seconds
+
+                if seconds > args.budget:
+                    over = (n, T) if over is None else (min(over[0], n), min(over[1], T))
+
+            results.append(result)
+
+            if 'skipped' in result:
+                print(f"{name:<24} n={n:<5} T={T:<8} skipped", file=sys.stderr)
+            else:
+                print(f"{name:<24} n={n:<5} T={T:<8} {result['seconds']:>12.6f} s {result['bars_per_second']:>14.0f} bars/s", file=sys.stderr)
+
+    return results
+
+def compare(before: List[Dict[str, Any]], after: List[Dict[str, Any]], tolerance: float) -> List[str]:
+    """
+    Prints the speedup of each case and size measured in both runs, and
+    returns the cases that got slower by more than 'tolerance'.
+    """
+
+    previous = {(r['case'], r['n'], r['T']): r for r in before if 'seconds' in r}
+    regressions = []
+
+    print(f"{'case':<24} {'n':>5} {'T':>8} {'before (s)':>12} {'after (s)':>12} {'speedup':>9}")
+
+    for r in after:
+        key = (r['case'], r['n'], r['T'])
+
+        if 'seconds' not in r or key not in previous:
+            continue
+
+        b, a = previous[key]['seconds'], r['seconds']
+
+        print(f"{r['case']:<24} {r['n']:>5} {r['T']:>8} {b:>12.6f} {a:>12.6f} {b / a:>8.2f}x")
+
+        if a > b * (1 + tolerance):
+            regressions.append(f"{r['case']} (n={r['n']}, T={r['T']})")
+
+    return regressions
+
+def sizes(s: str) -> List[int]:
+    return [int(x) for x in s.split(',')]
+
+def main() -> None:
+    parser = ArgumentParser(prog='suite', allow_abbrev=False)
+    parser.add_argument('--bars', default=[100, 1000, 10000], type=sizes, metavar='T[,T...]')
+    parser.add_argument('--tickers', default=[2, 10, 50], type=sizes, metavar='N[,N...]')
+    parser.add_argument('--cases', default=list(CASES), type=lambda s: s.split(','), metavar='CASE[,CASE...]')
+    parser.add_argument('--repeat', default=3, type=int, metavar='N')
+    parser.add_argument('--iterations', default=5, type=int, metavar='N')
+    parser.add_argument('--budget', default=30.0, type=float, metavar='SECONDS')
+    parser.add_argument('--output', default=None, type=str, metavar='FILE')
+    parser.add_argument('--compare', default=None, type=str, metavar='FILE')
+    parser.add_argument('--tolerance', default=0.2, type=float, metavar='FRACTION')
+    args = parser.parse_args()
+
+    unknown = [name for name in args.cases if name not in CASES]
+
+    if len(unknown) > 0:
+        parser.error(f"unknown cases {unknown}. Must be among {', '.join(CASES)}.")
+
+    logger.setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as directory:
+        args.directory = directory
+        results = run(args)
+
+    report = {
+        'meta': {
+            'time': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'repeat': args.repeat,
+            'iterations': args.iterations,
+        },
+        'results': results,
+    }
+
+    if args.output is not None:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=4)
+
+    if args.compare is not None:
+        with open(args.compare, 'r') as file:
+            before = json.load(file)['results']
+
+        regressions = compare(before, results, args.tolerance)
+
+        if len(regressions) > 0:
+            print(f"slower by more than {args.tolerance:.0%}: {', '.join(regressions)}", file=sys.stderr)
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,58 @@
 
-from .args import *
-from .dcc import *
-from .dcc_loss import *
-from .garch import *
-from .garch_loss import *
-from .model import *
-from .util import *
\ No newline at end of file
+from importlib import (import_module)
+from typing import (Any, Dict, Final, List)
+
+"""
+The modules of the package are imported on first use of one of their names,
+so that importing 'correlate' does not pull in SciPy, pandas or the Polygon
+client until they are needed.
+"""
+
+# The submodule defining each name exported by the package.
+EXPORTS: Final[Dict[str, str]] = {
+    'is_weekend': 'args',
+    'verbosity': 'args',
+    'dateformat': 'args',
+    'parse_args': 'args',
+    'DCC': 'dcc',
+    'Q_average': 'dcc_loss',
+    'Q_gen': 'dcc_loss',
+    'R_gen': 'dcc_loss',
+    'R_iter': 'dcc_loss',
+    'dcc_loss': 'dcc_loss',
+    'dcc_loss_gen': 'dcc_loss',
+    'EWMA': 'ewma',
+    'GARCH': 'garch',
+    'garch_process': 'garch_loss',
+    'garch_loss': 'garch_loss',
+    'garch_loss_gen': 'garch_loss',
+    'Minimize': 'model',
+    'PolygonClient': 'util',
+    'logger': 'util',
+    'handler': 'util',
+    'formatter': 'util',
+    'OHLCV_DTYPE': 'util',
+    'Model': 'util',
+    'OHLCV': 'util',
+    'OHLCVBatch': 'util',
+    'weekly': 'util',
+    'Calendar': 'util',
+    'CALENDARS': 'util',
+    'NYSE': 'util',
+    'restrict': 'util',
+    'encode': 'util',
+}
+
+__all__: List[str] = list(EXPORTS)
+
+def __getattr__(name: str) -> Any:
+    if name not in EXPORTS:
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+
+    value = getattr(import_module(f".{EXPORTS[name]}", __name__), name)
+    globals()[name] = value
+
+    return value
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(__all__))
@@ -7,15 +7,12 @@
 # import pandas as pd
 
 from args import (parse_args)
-from garch import *
-from garch_loss import *
-from dcc import *
-from dcc_loss import *
-from matplotlib import pyplot as plt
-from util import *
+from argparse import (Namespace)
+from datetime import (datetime)
+from typing import (List, NoReturn)
+from util.logs import (handler, logger)
 
-import util.database as database
-import sqlite3
+import logging
 
 # from argparse import (ArgumentParser, ArgumentTypeError)
 # from datetime import (datetime, timedelta)
@@ -44,11 +41,13 @@ import sqlite3
 
 #     return 0 <= date.weekday() <= 4
 
-def plot_data(dataframe: pd.DataFrame) -> NoReturn:
+def plot_data(dataframe: 'pd.DataFrame') -> NoReturn:
     """
     Plot financial returns.
     """
 
+    from matplotlib import pyplot as plt
+
     plt.figure(figsize=(12, 6))
     plt.plot(dataframe, label='Graph', linewidth=2)
     plt.title('Title Label')
@@ -72,41 +71,212 @@ def main():
     else:
         raise ValueError(f"Invalid verbosity level: {args.verbosity}. Must be 'debug' or 'info'.")
 
-    database.init()
-
-    client = PolygonClient(api_key=args.api_key)
-
-    for series in client.fetch(tickers=args.tickers, t0=args.start, t1=args.end):
-        epsilon = []
-
-        for ticker in args.tickers:
-            returns = series[ticker]
-
-            model = GARCH(
-                max_iterations=args.max_iterations,
-                p=args.p,
-                q=args.q,
-                method=args.method,
-                stopping_early=args.stopping_early,
-            )
+    # Write the metrics of the run periodically, and once more when it ends.
+    if args.metrics is not None:
+        from util.metrics import (Exporter)
 
-            model.fit(returns)
-
-            epsilon.append(returns / model.sigma(returns))
-
-        epsilon = np.array(epsilon)
-
-        dcc_model = DCC(
+        exporter = Exporter(args.metrics, interval=args.metrics_interval)
+        exporter.start()
+    else:
+        exporter = None
+
+    try:
+        if args.profile:
+            profiled(args)
+        else:
+            run(args)
+    finally:
+        if exporter is not None:
+            exporter.stop()
+
+def profiled(args: Namespace) -> None:
+    import util.profile as profile
+
+    profiler = profile.enable(cprofile=args.profile_dump is not None, interval=None if args.profile_stacks is None else args.profile_interval / 1000)
+
+    try:
+        run(args)
+    finally:
+        profile.disable()
+
+        print(profiler.report())
+
+        if args.profile_dump is not None:
+            profiler.dump(args.profile_dump)
+
+        if args.profile_stacks is not None:
+            profiler.dump_stacks(args.profile_stacks)
+
+def run(args: Namespace) -> None:
+    # Imported once the arguments are parsed, so that '--help' and argument
+    # errors do not pay for loading NumPy, the Polygon client and the models.
+    from cache import (FitCache)
+    from concurrent.futures import (ProcessPoolExecutor)
+    from pipeline import (fit_window, union)
+    from util.client import (PolygonClient)
+    from util.pairs import (named)
+    from util.prefetch import (prefetch)
+    from util.profile import (stage)
+    from util.results import (ResultSink)
+
+    import util.storage as storage
+
+    storage.use(args.store).init()
+
+    client = PolygonClient(api_key=args.api_key, base=args.api_base)
+
+    # Reuse the models fitted by earlier runs to the same returns.
+    cache = None if args.no_fit_cache else FitCache(path=args.fit_cache, max_bytes=args.fit_cache_size * 2**20)
+
+    # Fit the tickers' GARCH models on a pool of worker processes, if more
+    # than one worker was requested.
+    executor = ProcessPoolExecutor(max_workers=args.workers) if args.workers > 1 else None
+
+    if args.serve is not None:
+        from service import (CorrelationService, serve)
+
+        service = CorrelationService(
+            client=client,
+            executor=executor,
+            cache=cache,
+            column=args.column,
+            timespan=args.timespan,
+            kind=args.returns,
+            missing=args.missing,
+            session=args.session,
+            calendar=args.calendar,
             max_iterations=args.max_iterations,
+            p=args.p,
+            q=args.q,
             method=args.method,
             stopping_early=args.stopping_early,
-            n=len(args.tickers),
+            model=args.model,
+            decay=args.decay,
+            top_k=args.top_k,
+            threshold=args.threshold,
+            steps=args.pairs_steps,
         )
 
-        dcc_model.fit(epsilon)
-
-        result = dcc_model.ab
-        print(result)
+        try:
+            serve(args.serve, service, delay=args.batch_delay / 1000)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        return
+
+    # The settings that determine the returns and the fitted models, which
+    # key the windows of the results database and are the defaults of jobs.
+    settings = {
+        'column': args.column,
+        'timespan': args.timespan,
+        'returns': args.returns,
+        'missing': args.missing,
+        'session': args.session,
+        'calendar': args.calendar,
+        'max_iterations': args.max_iterations,
+        'method': args.method,
+        'p': args.p,
+        'q': args.q,
+        'stopping_early': args.stopping_early,
+        'model': args.model,
+        'decay': args.decay,
+        'top_k': args.top_k,
+        'threshold': args.threshold,
+        'steps': args.pairs_steps,
+    }
+
+    if args.jobs is not None:
+        import jobs
+
+        try:
+            jobs.run(jobs.load(args.jobs, defaults=settings), client, executor=executor, cache=cache, depth=args.prefetch)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        return
+
+    sink = ResultSink(path=args.results, settings=settings)
+
+    # Every universe is fitted over the same windows. The returns of the union
+    # of their tickers are fetched once per window, and each ticker's GARCH
+    # model is only fitted once per window.
+    universes = [universe.split() for universe in args.universe]
+
+    if len(args.tickers) > 0:
+        universes.append(args.tickers)
+
+    tickers = union(universes)
+
+    # With --resume, windows already in the results database for every
+    # universe are not fetched or fitted again.
+    stored = [sink.windows(universe) if args.resume else set() for universe in universes]
+
+    def done(t0: datetime, t1: datetime) -> List[bool]:
+        return [(int(t0.timestamp()), int(t1.timestamp())) in windows for windows in stored]
+
+    def skip(t0: datetime, t1: datetime) -> bool:
+        return all(done(t0, t1))
+
+    # Fetch and build the returns of the following windows on a background
+    # thread while the models for the current window are being fitted.
+    windows = prefetch(client.fetch(
+        tickers=tickers,
+        t0=args.start,
+        t1=args.end,
+        column=args.column,
+        timespan=args.timespan,
+        kind=args.returns,
+        missing=args.missing,
+        skip=skip,
+        session=args.session,
+        calendar=args.calendar,
+    ), depth=args.prefetch)
+
+    try:
+        for (t0, t1), series in windows:
+            pending = [universe for universe, fitted in zip(universes, done(t0, t1)) if not fitted]
+
+            with stage('fit', window=f'{t0:%Y-%m-%d}'):
+                fits = fit_window(
+                    series,
+                    tickers=tickers,
+                    universes=pending,
+                    executor=executor,
+                    cache=cache,
+                    max_iterations=args.max_iterations,
+                    p=args.p,
+                    q=args.q,
+                    method=args.method,
+                    stopping_early=args.stopping_early,
+                    model=args.model,
+                    decay=args.decay,
+                    top_k=args.top_k,
+                    threshold=args.threshold,
+                    steps=args.pairs_steps,
+                )
+
+            for fit in fits:
+                print(' '.join(fit['tickers']), fit['ab'])
+
+                if 'pairs' in fit:
+                    for step, s1, s2, rho in named(fit['pairs'], fit['tickers']):
+                        print(f'  {step} {s1} {s2} {rho:+.6f}')
+
+                with stage('sink'):
+                    sink.write(t0=t0, t1=t1, **fit)
+    finally:
+        # Commit the windows fitted so far even if the run is interrupted.
+        sink.close()
+
+        logger.info(f'main(): {sink.stats}')
+
+        for slowest in sink.stats.to_dict()['slowest']:
+            logger.info(f'main(): slowest fit {slowest}')
+
+        if executor is not None:
+            executor.shutdown()
 
 
 
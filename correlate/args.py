@@ -1,16 +1,17 @@
 
 from argparse import (ArgumentParser, ArgumentTypeError)
 from datetime import (datetime, timedelta)
+from util.resample import (COARSE)
 
 import logging
 
 
 def is_weekend(date: datetime) -> bool:
     """
-    Checks if the given date is a weekend day (Saturaday or Sunday).
+    Checks if the given date is a weekend day (Saturday or Sunday).
     """
 
-    return 6 <= date.weekday() <= 7
+    return date.weekday() >= 5
 
 def verbosity(s: str):
     s = s.lower()
@@ -21,6 +22,36 @@ def verbosity(s: str):
     else:
         raise ArgumentTypeError(f"Invalid verbosity level: {s}. Must be 'debug' or 'info'.")
 
+def positive(s: str) -> int:
+    """
+    Parses a count that must be at least 1.
+    """
+
+    try:
+        n = int(s)
+    except ValueError as e:
+        raise ArgumentTypeError(f"Invalid count: {s}. Must be an integer.") from e
+
+    if n < 1:
+        raise ArgumentTypeError(f"Invalid count: {s}. Must be at least 1.")
+
+    return n
+
+def non_negative(s: str) -> int:
+    """
+    Parses a count that may be 0.
+    """
+
+    try:
+        n = int(s)
+    except ValueError as e:
+        raise ArgumentTypeError(f"Invalid count: {s}. Must be an integer.") from e
+
+    if n < 0:
+        raise ArgumentTypeError(f"Invalid count: {s}. Must be at least 0.")
+
+    return n
+
 def dateformat(s: str) -> datetime:
     """
     Parses a string in ISO-8601 format and returns a datetime object.
@@ -67,11 +98,12 @@ def parse_args() -> dict:
     parser.add_argument(
         '--start',
         help="""
-            (Required). The starting date and time for the query in ISO-8601
-            format, for example '2023-01-01T00:00:00Z'.
+            (Required unless --serve or --jobs is given). The starting date
+            and time for the query in ISO-8601 format, for example
+            '2023-01-01T00:00:00Z'.
         """,
         metavar='YYYY-mm-dd',
-        required=True,
+        required=False,
         type=dateformat,
     )
 
@@ -126,12 +158,80 @@ def parse_args() -> dict:
         choices=['COBYLA', 'COBYQA', 'SLSQP', 'trust-constr'],
     )
 
+    parser.add_argument(
+        '--model',
+        default='dcc',
+        help="""
+            (Optional). The correlation model: 'dcc' fits GARCH and DCC
+            models, and 'ewma' computes the exponentially weighted
+            correlations of the returns without any optimization, to screen
+            large universes cheaply. Defaults to 'dcc' if not specified.
+        """,
+        metavar='MODEL',
+        type=str,
+        required=False,
+        choices=['dcc', 'ewma'],
+    )
+
+    parser.add_argument(
+        '--decay',
+        default=0.94,
+        help="""
+            (Optional). The decay factor of the 'ewma' model, between 0 and 1.
+            Defaults to 0.94, as in RiskMetrics, if not specified.
+        """,
+        metavar='LAMBDA',
+        type=float,
+        required=False,
+    )
+
+    parser.add_argument(
+        '--top-k',
+        default=None,
+        help="""
+            (Optional). Output only the K most strongly correlated pairs of
+            each window, by absolute correlation, as (ticker, ticker, rho)
+            triplets instead of the dense correlation matrix. Defaults to
+            every pair if not specified.
+        """,
+        metavar='K',
+        type=int,
+        required=False,
+    )
+
+    parser.add_argument(
+        '--threshold',
+        default=None,
+        help="""
+            (Optional). Output only the pairs of each window with an absolute
+            correlation of at least RHO, as (ticker, ticker, rho) triplets
+            instead of the dense correlation matrix. Can be combined with
+            --top-k. Defaults to no threshold if not specified.
+        """,
+        metavar='RHO',
+        type=float,
+        required=False,
+    )
+
+    parser.add_argument(
+        '--pairs-steps',
+        action='store_true',
+        help="""
+            (Optional). Select the pairs of --top-k and --threshold from the
+            correlation matrix of every step of each window instead of only
+            its final one, streaming the matrices from the recursion.
+        """,
+    )
+
     parser.add_argument(
         '--timespan',
         default='hour',
         help="""
-            (Optional). The timespan to use for the aggregation. Defaults to 'day'
-            if not specified.
+            (Optional). The timespan to use for the aggregation. Bars over a
+            'day', 'week' or 'month' are derived locally from cached hourly
+            bars. A 'week' or 'month' is only accepted with --serve, as the
+            weekly windows of runs and jobs would hold at most one such bar.
+            Defaults to 'hour' if not specified.
         """,
         metavar='TIMESPAN',
         type=str,
@@ -139,6 +239,292 @@ def parse_args() -> dict:
         choices=['minute', 'hour', 'day', 'week', 'month'],
     )
 
+    parser.add_argument(
+        '--returns',
+        default='simple',
+        help="""
+            (Optional). The kind of returns to fit the models to, either
+            'simple' or 'log' returns. Defaults to 'simple' if not specified.
+        """,
+        metavar='KIND',
+        type=str,
+        required=False,
+        choices=['simple', 'log'],
+    )
+
+    parser.add_argument(
+        '--missing',
+        default='drop',
+        help="""
+            (Optional). How to handle bars that are missing for some tickers:
+            'drop' the timestamp, 'ffill' the last price, or 'mask' the
+            affected returns to zero. Defaults to 'drop' if not specified.
+        """,
+        metavar='POLICY',
+        type=str,
+        required=False,
+        choices=['drop', 'ffill', 'mask'],
+    )
+
+    parser.add_argument(
+        '--session',
+        default='all',
+        help="""
+            (Optional). Which intraday bars to keep: 'all' of them, those of
+            the 'regular' sessions of each ticker's exchange, or those of its
+            'extended' pre-market and after-hours sessions as well. Bars out
+            of session are handled like missing bars. Defaults to 'all' if
+            not specified.
+        """,
+        metavar='SESSION',
+        type=str,
+        required=False,
+        choices=['all', 'regular', 'extended'],
+    )
+
+    parser.add_argument(
+        '--calendar',
+        default='XNYS',
+        help="""
+            (Optional). The trading calendar of tickers without a market
+            prefix, used by '--session'. Crypto ('X:') and currency ('C:')
+            tickers always trade on their own calendars. Defaults to 'XNYS'
+            if not specified.
+        """,
+        metavar='CALENDAR',
+        type=str,
+        required=False,
+        choices=['XNYS', 'CRYPTO', 'FX'],
+    )
+
+    parser.add_argument(
+        '--prefetch',
+        default=2,
+        help="""
+            (Optional). The number of windows to fetch ahead of the window
+            being fitted, or 0 to fetch each window only when it is needed.
+            Defaults to 2 if not specified.
+        """,
+        metavar='N',
+        type=non_negative,
+        required=False,
+    )
+
+    parser.add_argument(
+        '--workers',
+        default=1,
+        help="""
+            (Optional). The number of worker processes used to fit the GARCH
+            models of the tickers in parallel. Defaults to 1 if not specified.
+        """,
+        metavar='N',
+        type=positive,
+        required=False,
+    )
+
+    parser.add_argument(
+        '--results',
+        default='results.db',
+        help="""
+            (Optional). The SQLite database that the fitted parameters and
+            correlation matrix of each window are appended to. Defaults to
+            'results.db' if not specified.
+        """,
+        metavar='PATH',
+        type=str,
+        required=False,
+    )
+
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help="""
+            (Optional). Skip the windows that are already stored in the
+            results database for the same tickers.
+        """,
+    )
+
+    parser.add_argument(
+        '--fit-cache',
+        default='.cache/fits',
+        help="""
+            (Optional). The directory caching fitted GARCH and DCC models, keyed
+            by their returns and settings. Defaults to '.cache/fits' if not
+            specified.
+        """,
+        metavar='DIR',
+        type=str,
+        required=False,
+    )
+
+    parser.add_argument(
+        '--fit-cache-size',
+        default=256,
+        help="""
+            (Optional). The size in MiB beyond which the least recently used
+            fits are evicted from the cache. Defaults to 256 if not specified.
+        """,
+        metavar='MIB',
+        type=int,
+        required=False,
+    )
+
+    parser.add_argument(
+        '--no-fit-cache',
+        action='store_true',
+        help="""
+            (Optional). Always fit the models, without reading or writing the
+            fit cache.
+        """,
+    )
+
+    parser.add_argument(
+        '--api-base',
+        default='https://api.polygon.io',
+        help="""
+            (Optional). The base URL of the Polygon API, for example that of a
+            local stand-in started with 'python correlate/replay.py'.
+            Defaults to 'https://api.polygon.io' if not specified.
+        """,
+        metavar='URL',
+        type=str,
+        required=False,
+    )
+
+    parser.add_argument(
+        '--serve',
+        default=None,
+        help="""
+            (Optional). Run as a long-lived service answering correlation
+            queries over HTTP on the given address, for example
+            '127.0.0.1:8750', instead of fitting the given tickers. Fitted
+            models are kept in memory between queries. Disabled if not
+            specified.
+        """,
+        metavar='HOST:PORT',
+        type=str,
+        required=False,
+    )
+
+    parser.add_argument(
+        '--batch-delay',
+        default=5.0,
+        help="""
+            (Optional). In service mode, the number of milliseconds to wait
+            for further queries once one arrives, so that concurrent queries
+            are answered as a single batch. Defaults to 5 if not specified.
+        """,
+        metavar='MS',
+        type=float,
+        required=False,
+    )
+
+    parser.add_argument(
+        '--jobs',
+        default=None,
+        help="""
+            (Optional). Run the correlation jobs described by a JSON or TOML
+            job file instead of fitting the given tickers. The jobs are
+            planned together, so shared data loads and model fits are only
+            done once, and each job's output is written to its own file.
+            Settings missing from the file are taken from the command line.
+            Disabled if not specified.
+        """,
+        metavar='FILE',
+        type=str,
+        required=False,
+    )
+
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help="""
+            (Optional). Time the stages of the run (API requests, storage
+            reads and writes, returns, GARCH and DCC fits) by ticker and
+            window, and print a breakdown once the run ends.
+        """,
+    )
+
+    parser.add_argument(
+        '--profile-dump',
+        default=None,
+        help="""
+            (Optional). With --profile, also profile the main thread with
+            cProfile and write its statistics to the given file, for 'pstats'
+            or 'snakeviz'. Disabled if not specified.
+        """,
+        metavar='FILE',
+        type=str,
+        required=False,
+    )
+
+    parser.add_argument(
+        '--profile-stacks',
+        default=None,
+        help="""
+            (Optional). With --profile, also sample the stacks of every thread
+            and write them to the given file in the collapsed-stack format
+            read by flame graph tools. Disabled if not specified.
+        """,
+        metavar='FILE',
+        type=str,
+        required=False,
+    )
+
+    parser.add_argument(
+        '--profile-interval',
+        default=5.0,
+        help="""
+            (Optional). The number of milliseconds between stack samples.
+            Defaults to 5 if not specified.
+        """,
+        metavar='MS',
+        type=float,
+        required=False,
+    )
+
+    parser.add_argument(
+        '--metrics',
+        default=None,
+        help="""
+            (Optional). Write the run's metrics (API requests and bytes, store
+            hits and misses, rows inserted and selected, bars processed and
+            fit durations) to the given file, as a JSON snapshot if it ends
+            in '.json' and in the Prometheus text format otherwise. The file
+            is rewritten every --metrics-interval seconds and when the run
+            ends. Disabled if not specified.
+        """,
+        metavar='FILE',
+        type=str,
+        required=False,
+    )
+
+    parser.add_argument(
+        '--metrics-interval',
+        default=15.0,
+        help="""
+            (Optional). The number of seconds between writes of the metrics
+            file. Defaults to 15 if not specified.
+        """,
+        metavar='SECONDS',
+        type=float,
+        required=False,
+    )
+
+    parser.add_argument(
+        '--store',
+        default='sqlite',
+        help="""
+            (Optional). The storage backend used to cache aggregates, either
+            the 'sqlite' database or the memory-mapped 'columnar' store.
+            Defaults to 'sqlite' if not specified.
+        """,
+        metavar='BACKEND',
+        type=str,
+        required=False,
+        choices=['sqlite', 'columnar'],
+    )
+
     parser.add_argument(
         '--verbosity',
         default='info',
@@ -189,11 +575,59 @@ def parse_args() -> dict:
     parser.add_argument(
         'tickers',
         help="""
-            (Required). One or more tickers for equities to use in the
-            calculation for correlation matrix calculation.
+            (Required unless --universe is given). One or more tickers for
+            equities to use in the calculation for correlation matrix
+            calculation.
         """,
-        nargs='+',
+        nargs='*',
         metavar='TICKER(S)',
     )
 
-    return parser.parse_args()
\ No newline at end of file
+    parser.add_argument(
+        '--universe',
+        action='append',
+        default=[],
+        help="""
+            (Optional). A space-separated list of tickers to fit a DCC model
+            to, for example 'BTC MSTR COIN'. May be given several times to fit
+            many overlapping universes in one run, in which case the GARCH
+            model of each ticker is only fitted once per window.
+        """,
+        metavar='TICKERS',
+        type=str,
+        required=False,
+    )
+
+    args = parser.parse_args()
+
+    if args.serve is None and args.jobs is None and args.start is None:
+        parser.error("the following arguments are required: --start")
+
+    if len(args.tickers) == 0 and len(args.universe) == 0 and args.serve is None and args.jobs is None:
+        parser.error("at least one ticker, --universe or --jobs is required")
+
+    if (args.profile_dump is not None or args.profile_stacks is not None) and not args.profile:
+        parser.error("--profile-dump and --profile-stacks require --profile")
+
+    if args.timespan in COARSE and args.serve is None:
+        parser.error(f"argument --timespan: invalid choice for weekly windows: '{args.timespan}'. Each window would hold at most one bar, so use 'day' or finer.")
+
+    if not 0 < args.decay < 1:
+        parser.error(f"argument --decay: invalid value: {args.decay}. Must be between 0 and 1.")
+
+    if args.top_k is not None and args.top_k < 1:
+        parser.error(f"argument --top-k: invalid value: {args.top_k}. Must be positive.")
+
+    if args.threshold is not None and not 0 <= args.threshold <= 1:
+        parser.error(f"argument --threshold: invalid value: {args.threshold}. Must be between 0 and 1.")
+
+    if args.pairs_steps and args.top_k is None and args.threshold is None:
+        parser.error("--pairs-steps requires --top-k or --threshold")
+
+    if args.metrics_interval <= 0:
+        parser.error(f"argument --metrics-interval: invalid value: {args.metrics_interval}. Must be positive.")
+
+    if args.profile_interval <= 0:
+        parser.error(f"argument --profile-interval: invalid value: {args.profile_interval}. Must be positive.")
+
+    return args
\ No newline at end of file
@@ -0,0 +1,198 @@
+
+from typing import (Dict, Final, List, Optional, Self, Tuple)
+
+import hashlib
+import json
+import numpy as np
+import os
+import tempfile
+
+from garch import (GARCH)
+from model import (FitReport, Minimize)
+from util.logs import (logger)
+
+# The fraction of 'max_bytes' the cache is trimmed to once it grows beyond
+# it, so that the scans of the cache directory are spread over many puts.
+TRIM: Final[float] = 0.75
+
+
+class FitCache:
+    """
+    A content-addressed cache of fitted GARCH and DCC models.
+
+    A fit is keyed by a hash of the training data, the model's settings (see
+    'Minimize.config') and its initial parameters, so refitting the same model
+    to the same data is answered from the cache. Each entry is an '.npz' file
+    holding the fitted parameters, the training losses, the 'FitReport' of the
+    fit as JSON and, for GARCH models, the volatility path. Entries are
+    evicted in least recently used order once the cache grows beyond
+    'max_bytes'.
+
+    The size of the cache is counted as entries are stored, and the cache
+    directory is only scanned to evict entries once that count is over
+    'max_bytes'. Entries stored by other processes sharing the directory are
+    counted at the next scan.
+    """
+
+    def __init__(self: Self, path: str = ".cache/fits", max_bytes: int = 256 * 2**20) -> None:
+        self._path = path
+        self._max_bytes = max_bytes
+
+        os.makedirs(path, exist_ok=True)
+
+        self._bytes = sum(size for _, size, _ in self._entries())
+
+    @property
+    def path(self: Self) -> str:
+        """
+        Get the directory holding the cache entries.
+        """
+
+        return self._path
+
+    def key(self: Self, model: Minimize, data: np.ndarray) -> str:
+        """
+        Returns the key of fitting 'model', from its current parameters, to
+        'data'.
+        """
+
+        data = np.ascontiguousarray(data, dtype=np.float64)
+        params = np.ascontiguousarray(self.params(model), dtype=np.float64)
+
+        digest = hashlib.sha256()
+        digest.update(json.dumps(model.config(), sort_keys=True).encode())
+        digest.update(str(data.shape).encode())
+        digest.update(data.tobytes())
+        digest.update(params.tobytes())
+
+        return digest.hexdigest()
+
+    @staticmethod
+    def params(model: Minimize) -> np.ndarray:
+        """
+        Returns the parameters of 'model', the 'theta' of a GARCH model or the
+        'ab' of a DCC model.
+        """
+
+        return model.theta if isinstance(model, GARCH) else model.ab
+
+    def get(self: Self, key: str) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Returns the entry stored under 'key', or None if there is none.
+        """
+
+        path = os.path.join(self._path, f"{key}.npz")
+
+        try:
+            with np.load(path) as entry:
+                arrays = dict(entry)
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+
+        # Mark the entry as recently used.
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+        return arrays
+
+    def put(self: Self, key: str, **arrays: np.ndarray) -> None:
+        """
+        Stores 'arrays' under 'key', and evicts the least recently used
+        entries if the cache is over its size limit.
+        """
+
+        fd, temp = tempfile.mkstemp(dir=self._path, suffix=".tmp")
+
+        with os.fdopen(fd, "wb") as file:
+            np.savez(file, **arrays)
+            self._bytes += file.tell()
+
+        os.replace(temp, os.path.join(self._path, f"{key}.npz"))
+
+        if self._bytes > self._max_bytes:
+            self.evict()
+
+    def _entries(self: Self) -> List[Tuple[float, int, str]]:
+        # The last use, size and path of every entry of the cache directory.
+        entries = []
+
+        for entry in os.scandir(self._path):
+            if entry.name.endswith(".npz"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        return entries
+
+    def evict(self: Self) -> None:
+        """
+        Removes the least recently used entries until the cache is within
+        'TRIM' of its size limit.
+        """
+
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, path in sorted(entries):
+            if total <= TRIM * self._max_bytes:
+                break
+
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+            total -= size
+
+        self._bytes = total
+
+    def fit(self: Self, model: Minimize, data: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Fits 'model' to 'data', or loads the result of an identical earlier
+        fit, and sets the fitted parameters and 'report' of 'model' either
+        way. The report of a loaded fit is that of the original fit, marked as
+        cached.
+
+        :return: The entry of the fit, with the fitted 'params', the training
+            'losses' and, for GARCH models, the volatility path 'sigma'.
+        """
+
+        key = self.key(model, data)
+        entry = self.get(key)
+
+        if entry is not None:
+            logger.debug(f'FitCache.fit(model={type(model).__name__}): hit {key[:12]}')
+
+            if isinstance(model, GARCH):
+                model.theta = entry['params']
+            else:
+                model.ab = entry['params']
+
+            if 'report' in entry:
+                model.report = FitReport.from_dict({**json.loads(str(entry['report'])), 'cached': True})
+            else:
+                model.report = FitReport(model=type(model).__name__, cached=True)
+
+            return entry
+
+        logger.debug(f'FitCache.fit(model={type(model).__name__}): miss {key[:12]}')
+
+        losses = model.fit(data)
+
+        entry = {
+            'params': np.asarray(self.params(model), dtype=np.float64),
+            'losses': np.asarray(losses, dtype=np.float64),
+            'report': np.array(json.dumps(model.report.to_dict())),
+        }
+
+        if isinstance(model, GARCH):
+            entry['sigma'] = model.sigma(data)
+
+        self.put(key, **entry)
+
+        return entry
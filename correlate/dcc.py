@@ -1,9 +1,8 @@
 
 import numpy as np
-import scipy.optimize
 
 from dcc_loss import dcc_loss_gen
-from model import (Minimize)
+from model import (FitReport, Minimize)
 from typing import (Callable, NoReturn, Self)
 
 
@@ -60,6 +59,8 @@ class DCC(Minimize):
         # ])
         tr: np.ndarray = train_data
 
+        self.report = FitReport(model=type(self).__name__)
+
         # Optimize using scipy and save theta
         tr_losses: list[float] = []
 
@@ -69,15 +70,7 @@ class DCC(Minimize):
         while j < self.max_iterations:
             j += 1
 
-            res: np.ndarray[float] = scipy.optimize.minimize(
-                self.loss(tr),
-                np.array(self.ab),
-                constraints=self.constraints,
-                method=self.method,
-                options={
-                    'disp': False
-                },
-            )
+            res: np.ndarray[float] = self.minimize(self.loss(tr), np.array(self.ab))
 
             ab = res.x
             self.ab = ab
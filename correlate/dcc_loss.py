@@ -45,6 +45,26 @@ def R_gen(tr, ab, p: int = 1, q: int = 1):
 
     return R_list
 
+def R_iter(tr, ab, p: int = 1, q: int = 1):
+    # yield R0,...,RT one at a time, as R_gen does in reverse, keeping only
+    # the current Q in memory
+
+    Q_int = Q_average(tr=tr, p=p, q=q)
+    Qt    = Q_int
+
+    T = tr.shape[1] - 1
+    a = ab[0]
+    b = ab[1]
+
+    for i in range(T + 1):
+        if i > 0:
+            et_1 = tr[:,T-i+1]
+            Qt   = (1.0-a-b)*Q_int + a*np.outer(et_1,et_1) + b*Qt
+
+        temp = 1.0/np.sqrt(np.abs(np.diagonal(Qt)))
+
+        yield (temp[:,None]*Qt)*temp[None,:]
+
 def dcc_loss(tr, ab, p: int = 1, q: int = 1):
     R = R_gen(tr=tr, ab=ab, p=p, q=q)
 
@@ -0,0 +1,204 @@
+
+import numpy as np
+import time
+
+from model import (FitReport)
+from typing import (Final, Iterator, Optional, Self)
+
+# The RiskMetrics decay factor of hourly and daily returns.
+DECAY: Final[float] = 0.94
+
+# The most covariance entries the recursion over every step holds at once,
+# which bounds each stack of covariances to 32 MiB.
+CHUNK: Final[int] = 1 << 22
+
+# The most steps of the recursion computed as one stack. Each covariance of a
+# stack is a matrix product over the returns of the stack, so longer stacks
+# take more arithmetic per step in exchange for fewer Python steps.
+BLOCK: Final[int] = 32
+
+
+def weights(T: int, decay: float = DECAY) -> np.ndarray:
+
+    """
+    Returns the weight of each of 'T' observations, newest first, in the last
+    EWMA covariance of a window. As in 'dcc_loss.Q_gen', the recursion starts
+    from the average outer product of the window on the oldest observation,
+    and the covariance on each observation only uses the ones before it.
+    """
+
+    w = np.zeros(T)
+
+    if T > 1:
+        w[1:] = (1.0 - decay) * decay ** np.arange(T - 1)
+
+    return w + decay ** (T - 1) / T
+
+def covariance(tr: np.ndarray, decay: float = DECAY) -> np.ndarray:
+
+    """
+    Returns the last (n, n) EWMA covariance of the (n, T) returns 'tr',
+    ordered from the newest to the oldest, as one weighted matrix product.
+    """
+
+    return (tr * weights(tr.shape[1], decay)) @ tr.T
+
+def covariances(tr: np.ndarray, decay: float = DECAY, size: int = CHUNK) -> Iterator[np.ndarray]:
+
+    """
+    Yields the EWMA covariances on each observation of the (n, T) returns
+    'tr', ordered from the newest to the oldest, from the oldest observation
+    on, as (k, n, n) stacks of at most 'BLOCK' steps and 'size' entries. The
+    recursion
+
+        S_t = decay * S_t-1 + (1 - decay) * e_t-1 e_t-1'
+
+    is unrolled over each stack, so that every covariance of a stack is the
+    last covariance of the previous stack, decayed, plus one weighted matrix
+    product of the returns of the stack, as in 'covariance'.
+    """
+
+    n, T = tr.shape
+
+    x = tr[:, ::-1].T
+    S = ((tr @ tr.T) / T)[None]
+
+    yield S
+
+    k = max(1, min(BLOCK, size // (n * n)))
+    lag = np.arange(k)[:, None] - np.arange(k)[None, :]
+    W = np.where(lag >= 0, (1.0 - decay) * decay ** np.maximum(lag, 0), 0.0)
+    D = decay ** np.arange(1, k + 1)
+
+    for t in range(0, T - 1, k):
+        e = x[t:t + k][:T - 1 - t]
+        m = len(e)
+
+        S = (W[:m, :m, None] * e[None]).transpose(0, 2, 1) @ e + D[:m, None, None] * S[-1]
+
+        yield S
+
+def covariance_iter(tr: np.ndarray, decay: float = DECAY) -> Iterator[np.ndarray]:
+
+    """
+    Yields the (n, n) EWMA covariances on each observation of the (n, T)
+    returns 'tr' one at a time, in the order of 'covariances'.
+    """
+
+    for S in covariances(tr, decay):
+        yield from S
+
+def correlation(S: np.ndarray) -> np.ndarray:
+
+    """
+    Returns the correlation matrices of the covariance matrices 'S', of shape
+    (n, n) or (k, n, n).
+    """
+
+    d = 1.0 / np.sqrt(np.abs(np.diagonal(S, axis1=-2, axis2=-1)))
+
+    return (d[..., :, None] * S) * d[..., None, :]
+
+def correlation_iter(tr: np.ndarray, decay: float = DECAY) -> Iterator[np.ndarray]:
+
+    """
+    Yields the (n, n) EWMA correlation matrices on each observation of the
+    (n, T) returns 'tr' one at a time, from the oldest observation on, as
+    'dcc_loss.R_iter' does for the equivalent DCC model.
+    """
+
+    for S in covariances(tr, decay):
+        yield from correlation(S)
+
+
+class EWMA(object):
+    """
+    Exponentially weighted moving average (EWMA) correlation model, as in
+    RiskMetrics. It is the DCC model with a = 1 - decay and b = decay, fitted
+    to the raw returns instead of GARCH residuals, so it needs no
+    optimization: the last correlation matrix of a window is one weighted
+    matrix product of its returns.
+
+    The Gaussian quasi-likelihood loss of the model takes a determinant and
+    a solve per observation, so it is only computed with 'loss', over the
+    covariances of the window in stacks of bounded size.
+    """
+
+    def __init__(self: Self, decay: float = DECAY, loss: bool = False) -> None:
+
+        if not 0.0 < decay < 1.0:
+            raise ValueError(f"Invalid decay: {decay}. Must be between 0 and 1.")
+
+        self._decay = decay
+        self._loss = loss
+        self._R: Optional[np.ndarray] = None
+        self._report: Optional[FitReport] = None
+
+    @property
+    def decay(self: Self) -> float:
+        """
+        Get the decay factor of the EWMA model.
+        """
+
+        return self._decay
+
+    @property
+    def ab(self: Self) -> np.ndarray[float]:
+        """
+        Get the parameters of the DCC model equivalent to the EWMA model.
+        """
+
+        return np.array([1.0 - self._decay, self._decay])
+
+    @property
+    def R(self: Self) -> Optional[np.ndarray]:
+        """
+        Get the last correlation matrix of the window the model was fitted to.
+        """
+
+        return self._R
+
+    @property
+    def report(self: Self) -> Optional[FitReport]:
+        """
+        Get the report of the last fit of the model.
+        """
+
+        return self._report
+
+    def fit(self: Self, train_data: np.ndarray) -> list[float]:
+        """
+        Fit the EWMA model to the training data.
+
+        :param train_data: The (n, T) returns, newest first.
+        :return: With 'loss', the Gaussian quasi-likelihood loss of the DCC
+            model of the returns standardized by their EWMA volatilities, as
+            a list of one loss for compatibility with 'DCC.fit', or else an
+            empty list.
+        """
+
+        t = time.perf_counter()
+
+        tr: np.ndarray = train_data
+
+        self._R = correlation(covariance(tr, self._decay))
+
+        losses = []
+
+        if self._loss:
+            loss = 0.0
+            x = tr[:, ::-1].T
+
+            for S in covariances(tr, self._decay):
+                e, x = x[:len(S)], x[len(S):]
+                e = e / np.sqrt(np.abs(np.diagonal(S, axis1=1, axis2=2)))
+                R = correlation(S)
+
+                _, logdet = np.linalg.slogdet(R)
+                loss += np.sum(logdet) + np.einsum('ti,ti->', e, np.linalg.solve(R, e[..., None])[..., 0])
+
+            losses.append(float(loss))
+
+        self._report = FitReport(model=type(self).__name__, seconds=time.perf_counter() - t)
+
+        return losses
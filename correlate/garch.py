@@ -1,10 +1,9 @@
 
-from typing import Callable, NoReturn, Self
+from typing import Any, Callable, Dict, NoReturn, Self
 import numpy as np
 
 from garch_loss import (garch_loss_gen, garch_process)
-from model import (Minimize)
-from scipy.optimize import minimize
+from model import (FitReport, Minimize)
 
 class GARCH(Minimize):
     """
@@ -87,9 +86,19 @@ class GARCH(Minimize):
         return self._q
 
 
+    def config(self: Self) -> Dict[str, Any]:
+        """
+        Get the settings of the GARCH model that determine the outcome of a
+        fit.
+        """
+
+        return {**super().config(), 'p': self.p, 'q': self.q}
+
     def fit(self: Self, train_data):  # train_data: [rT,...r0]
         tr = train_data
 
+        self.report = FitReport(model=type(self).__name__)
+
         # Optimize using scipy and save theta
         tr_losses = []
         j = 0
@@ -97,13 +106,7 @@ class GARCH(Minimize):
         while j < self.max_iterations:
             j += 1
 
-            res = minimize(
-                self.loss(tr),
-                self.theta,
-                method=self.method,
-                options={'disp': False},
-                constraints=self.constraints
-            )
+            res = self.minimize(self.loss(tr), self.theta)
 
             theta = res.x
             self.theta = theta
@@ -49,11 +49,12 @@ def garch_loss(r, theta, p, q):
     s = garch_process(r, theta, p, q)
 
     def garch_loss_helper(r=r, s=s):
+        r = np.asarray(r)
         s = np.array(s)
         loss = 0.0
 
         for i in range(len(r)):
-            loss += np.log(s[i] ** 2) + (r.iloc[i]/s[i])**2
+            loss += np.log(s[i] ** 2) + (r[i]/s[i])**2
 
         return loss
 
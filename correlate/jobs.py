@@ -0,0 +1,470 @@
+
+from concurrent.futures import (Executor)
+from datetime import (datetime)
+from typing import (Any, Dict, Final, Iterator, List, Optional, Self, TextIO, Tuple, Union)
+
+import json
+import numpy as np
+import os
+import tomllib
+
+from args import (dateformat)
+from cache import (FitCache)
+from pipeline import (Volatility, fit_volatility, fit_window, union)
+from util.client import (PolygonClient)
+from util.logs import (logger)
+from util.panel import (subset)
+from util.prefetch import (prefetch)
+from util.resample import (COARSE)
+from util.returns import (returns)
+from util.serialize import (encode)
+from util.session import (restrict)
+from util.time import (weekly)
+
+
+# The settings of a job that determine the returns it is fitted to.
+DATA_SETTINGS: Final[Tuple[str, ...]] = ('column', 'timespan', 'returns', 'missing', 'session', 'calendar')
+
+# The settings of a job that are passed to its correlation models, and that
+# select the pairs of their sparse output.
+MODEL_SETTINGS: Final[Tuple[str, ...]] = ('max_iterations', 'method', 'p', 'q', 'stopping_early', 'model', 'decay', 'top_k', 'threshold', 'steps')
+
+# The model settings of a job that are passed to its GARCH models, so jobs
+# that only differ in their other settings share their GARCH fits.
+GARCH_SETTINGS: Final[Tuple[str, ...]] = ('max_iterations', 'method', 'p', 'q', 'stopping_early')
+
+# The settings of a job that may be left unset.
+OPTIONAL_SETTINGS: Final[Tuple[str, ...]] = ('top_k', 'threshold')
+
+
+class Job:
+    """
+    A correlation job: the DCC model of the universe of 'tickers' fitted to
+    each week between 'start' and 'end', with its output written as JSON
+    lines to 'output'.
+    """
+
+    def __init__(
+            self: Self,
+            name: str,
+            tickers: List[str],
+            start: datetime,
+            end: datetime,
+            settings: Dict[str, Any],
+            output: str,
+        ) -> None:
+
+        self._name = name
+        self._tickers = tickers
+        self._start = start
+        self._end = end
+        self._settings = settings
+        self._output = output
+
+    def __repr__(self: Self) -> str:
+        return f"Job(name='{self.name}', tickers={self.tickers}, start={self.start}, end={self.end})"
+
+    @property
+    def name(self: Self) -> str:
+        """
+        Get the name of the job.
+        """
+
+        return self._name
+
+    @property
+    def tickers(self: Self) -> List[str]:
+        """
+        Get the tickers of the job's universe.
+        """
+
+        return self._tickers
+
+    @property
+    def start(self: Self) -> datetime:
+        """
+        Get the start of the job's date range.
+        """
+
+        return self._start
+
+    @property
+    def end(self: Self) -> datetime:
+        """
+        Get the end of the job's date range.
+        """
+
+        return self._end
+
+    @property
+    def settings(self: Self) -> Dict[str, Any]:
+        """
+        Get the data and model settings of the job.
+        """
+
+        return self._settings
+
+    @property
+    def output(self: Self) -> str:
+        """
+        Get the path of the job's output file.
+        """
+
+        return self._output
+
+    def data_key(self: Self) -> Tuple:
+        """
+        Returns the settings that determine the returns the job is fitted to.
+        """
+
+        return tuple(self._settings[key] for key in DATA_SETTINGS)
+
+    def model_key(self: Self) -> Tuple:
+        """
+        Returns the settings passed to the job's models.
+        """
+
+        return tuple(self._settings[key] for key in MODEL_SETTINGS)
+
+
+class Task:
+    """
+    The work shared by every job fitted to one week of the same returns: the
+    bars of the union of the jobs' tickers are loaded once, and the models of
+    each group of jobs with the same model settings are fitted once per
+    distinct universe. The returns of each universe are built from the bars
+    of its own tickers, so the bars of other universes never change them.
+    """
+
+    def __init__(self: Self, t0: datetime, t1: datetime, data: Tuple) -> None:
+        self._t0 = t0
+        self._t1 = t1
+        self._data = data
+        self._groups: Dict[Tuple, Dict[Tuple[str, ...], List[Job]]] = {}
+
+    @property
+    def window(self: Self) -> Tuple[datetime, datetime]:
+        """
+        Get the bounds of the task's week.
+        """
+
+        return (self._t0, self._t1)
+
+    @property
+    def settings(self: Self) -> Dict[str, Any]:
+        """
+        Get the data settings of the task.
+        """
+
+        return dict(zip(DATA_SETTINGS, self._data))
+
+    @property
+    def groups(self: Self) -> Dict[Tuple, Dict[Tuple[str, ...], List[Job]]]:
+        """
+        Get the jobs of the task by model settings, then by universe.
+        """
+
+        return self._groups
+
+    @property
+    def tickers(self: Self) -> List[str]:
+        """
+        Get the union of the tickers of the task's jobs.
+        """
+
+        return union(self.universes)
+
+    @property
+    def universes(self: Self) -> List[Tuple[str, ...]]:
+        """
+        Get the distinct universes of the task's jobs.
+        """
+
+        return list(dict.fromkeys(universe for universes in self._groups.values() for universe in universes))
+
+    def add(self: Self, job: Job) -> None:
+        """
+        Adds 'job' to the task.
+        """
+
+        self._groups.setdefault(job.model_key(), {}).setdefault(tuple(job.tickers), []).append(job)
+
+
+def load(path: str, defaults: Optional[Dict[str, Any]] = None) -> List[Job]:
+
+    """
+    Loads the jobs described by the JSON or TOML (by extension) job file at
+    'path'. The file holds a list of 'jobs', each with a 'name', its
+    'tickers', a 'start' and optional 'end' date, an optional 'output' path,
+    and any data or model settings, for example:
+
+        [defaults]
+        timespan = "hour"
+        max_iterations = 100
+
+        [[jobs]]
+        name = "crypto"
+        tickers = ["BTC", "MSTR", "COIN"]
+        start = "2024-01-01"
+        end = "2024-03-01"
+
+    Settings missing from a job are taken from the file's 'defaults' table,
+    then from 'defaults'. Outputs default to '<name>.jsonl' next to the job
+    file.
+    """
+
+    with open(path, 'rb') as file:
+        if path.endswith('.toml'):
+            spec = tomllib.load(file)
+        else:
+            spec = json.load(file)
+
+    base = {**(defaults or {}), **spec.get('defaults', {})}
+    directory = os.path.dirname(os.path.abspath(path))
+
+    jobs = []
+
+    for i, obj in enumerate(spec.get('jobs', [])):
+        name = obj.get('name', f'job{i}')
+        tickers = obj.get('tickers', [])
+
+        if isinstance(tickers, str):
+            tickers = tickers.split()
+
+        if len(tickers) < 2:
+            raise ValueError(f"Invalid tickers for job '{name}': {tickers}. Must be at least two tickers.")
+
+        if 'start' not in obj:
+            raise ValueError(f"Invalid job '{name}': missing 'start'.")
+
+        settings = {key: obj.get(key, base.get(key)) for key in DATA_SETTINGS + MODEL_SETTINGS}
+        missing = [key for key, value in settings.items() if value is None and key not in OPTIONAL_SETTINGS]
+
+        if len(missing) > 0:
+            raise ValueError(f"Invalid job '{name}': missing settings {missing}.")
+
+        if settings['timespan'] in COARSE:
+            raise ValueError(f"Invalid timespan for job '{name}': {settings['timespan']}. Must be 'day' or finer, as jobs are fitted to weekly windows.")
+
+        end = obj.get('end', base.get('end'))
+
+        jobs.append(Job(
+            name=name,
+            tickers=tickers,
+            start=dateformat(str(obj['start'])),
+            end=dateformat(str(end)) if end is not None else dateformat(datetime.now().isoformat()),
+            settings=settings,
+            output=os.path.join(directory, obj.get('output', f'{name}.jsonl')),
+        ))
+
+    return jobs
+
+def plan(jobs: List[Job]) -> List[Task]:
+
+    """
+    Splits 'jobs' into weekly tasks, merging the weeks of different jobs over
+    the same returns into one task, ordered by week.
+    """
+
+    tasks: Dict[Tuple, Task] = {}
+
+    for job in jobs:
+        for t0, t1 in weekly(t0=job.start, t1=job.end):
+            key = (t0, t1, job.data_key())
+
+            if key not in tasks:
+                tasks[key] = Task(t0=t0, t1=t1, data=job.data_key())
+
+            tasks[key].add(job)
+
+    return sorted(tasks.values(), key=lambda task: task.window)
+
+def volatilities(
+        task: Task,
+        series: Dict[Tuple[str, ...], Union[np.ndarray, Exception]],
+        executor: Optional[Executor] = None,
+        cache: Optional[FitCache] = None,
+    ) -> Dict[Tuple, Dict[Tuple[str, bytes], Union[Tuple, Exception]]]:
+
+    """
+    Fits the GARCH model of each ticker of the DCC jobs of 'task' once per
+    GARCH settings and distinct returns, given the returns of each universe
+    in 'series'. A ticker has the same returns in every universe unless the
+    missing bars of its other tickers differ.
+
+    :return: The parameters, final training loss, standardized residuals and
+        fit report of each ticker's returns, keyed by ticker and returns, or
+        the exception raised while fitting them, by GARCH settings.
+    """
+
+    rows: Dict[Tuple, Dict[Tuple[str, bytes], np.ndarray]] = {}
+
+    for model, universes in task.groups.items():
+        settings = dict(zip(MODEL_SETTINGS, model))
+
+        if settings['model'] == 'ewma':
+            continue
+
+        unique = rows.setdefault(tuple(settings[key] for key in GARCH_SETTINGS), {})
+
+        for universe in universes:
+            r = series[universe]
+
+            if not isinstance(r, Exception):
+                unique.update(((ticker, row.tobytes()), row) for ticker, row in zip(universe, r))
+
+    fits: Dict[Tuple, Dict[Tuple[str, bytes], Union[Tuple, Exception]]] = {}
+
+    for settings, unique in rows.items():
+        fits[settings] = {}
+
+        # Returns of different lengths are fitted in separate batches.
+        batches: Dict[int, List[Tuple[str, bytes]]] = {}
+
+        for key, row in unique.items():
+            batches.setdefault(len(row), []).append(key)
+
+        for keys in batches.values():
+            try:
+                garch = fit_volatility(
+                    np.array([unique[key] for key in keys]),
+                    tickers=[ticker for ticker, _ in keys],
+                    executor=executor,
+                    cache=cache,
+                    **dict(zip(GARCH_SETTINGS, settings)),
+                )
+            except Exception as e:
+                fits[settings].update((key, e) for key in keys)
+
+                continue
+
+            for i, key in enumerate(keys):
+                fits[settings][key] = tuple(part[i] for part in garch)
+
+    return fits
+
+def volatility(fits: Dict[Tuple[str, bytes], Union[Tuple, Exception]], universe: Tuple[str, ...], r: np.ndarray) -> Volatility:
+
+    """
+    Returns the GARCH fits of the rows of the returns 'r' of 'universe' among
+    'fits' (see 'volatilities'), raising the exception of a failed fit.
+    """
+
+    rows = [fits[(ticker, row.tobytes())] for ticker, row in zip(universe, r)]
+
+    for row in rows:
+        if isinstance(row, Exception):
+            raise row
+
+    thetas, losses, epsilon, reports = zip(*rows)
+
+    return np.array(thetas), np.array(losses), np.array(epsilon), list(reports)
+
+def run(
+        jobs: List[Job],
+        client: PolygonClient,
+        executor: Optional[Executor] = None,
+        cache: Optional[FitCache] = None,
+        depth: int = 2,
+    ) -> None:
+
+    """
+    Runs 'jobs' in one process. Each task's bars are loaded once, on a
+    background thread 'depth' tasks ahead, and split into the returns of
+    each of its universes. The GARCH models of its tickers are fitted once
+    per GARCH settings and distinct returns (see 'volatilities'), on
+    'executor' if there is one, and shared by the jobs of every model
+    settings. Every window fitted for a job is appended to its output as a
+    JSON line, or as its error if the window could not be fitted.
+    """
+
+    tasks = plan(jobs)
+
+    logger.info(f'run(): planned {len(tasks)} tasks for {len(jobs)} jobs')
+
+    def loads() -> Iterator[Tuple[Task, Any]]:
+        for task in tasks:
+            settings = task.settings
+
+            try:
+                panel = client.fetch_panel(
+                    tickers=task.tickers,
+                    t0=task.window[0],
+                    t1=task.window[1],
+                    column=settings['column'],
+                    timespan=settings['timespan'],
+                )
+
+                panel, mask = restrict(panel, session=settings['session'], timespan=settings['timespan'], default=settings['calendar'])
+            except Exception as e:
+                yield task, e
+
+                continue
+
+            series: Dict[Tuple[str, ...], Union[np.ndarray, Exception]] = {}
+
+            for universe in task.universes:
+                try:
+                    selected, selected_mask = subset(panel, list(universe), mask=mask)
+                    series[universe], _ = returns(selected, kind=settings['returns'], missing=settings['missing'], mask=selected_mask)
+                except Exception as e:
+                    series[universe] = e
+
+            yield task, series
+
+    outputs: Dict[str, TextIO] = {}
+
+    def write(job: Job, obj: Dict[str, Any]) -> None:
+        if job.output not in outputs:
+            os.makedirs(os.path.dirname(job.output), exist_ok=True)
+            outputs[job.output] = open(job.output, 'w')
+
+        outputs[job.output].write(json.dumps({'job': job.name, **obj}) + '\n')
+
+    try:
+        for task, series in prefetch(loads(), depth=depth):
+            t0, t1 = task.window
+
+            if isinstance(series, Exception):
+                series = dict.fromkeys(task.universes, series)
+
+            fits = volatilities(task, series, executor=executor, cache=cache)
+
+            for model, universes in task.groups.items():
+                settings = dict(zip(MODEL_SETTINGS, model))
+
+                for universe, group in universes.items():
+                    answer = series[universe]
+
+                    if not isinstance(answer, Exception):
+                        try:
+                            garch = None
+
+                            if settings['model'] != 'ewma':
+                                garch = volatility(fits[tuple(settings[key] for key in GARCH_SETTINGS)], universe, answer)
+
+                            answer, = fit_window(
+                                answer,
+                                tickers=list(universe),
+                                universes=[list(universe)],
+                                executor=executor,
+                                cache=cache,
+                                garch=garch,
+                                **settings,
+                            )
+                        except Exception as e:
+                            answer = e
+
+                    if isinstance(answer, Exception):
+                        logger.error(f'run(t0={t0}, t1={t1}, universe={" ".join(universe)}): {answer}')
+
+                    obj = encode((universe, t0, t1), answer)
+
+                    for job in group:
+                        write(job, obj)
+
+                        if 'ab' in obj:
+                            print(job.name, ' '.join(universe), obj['ab'])
+    finally:
+        for output in outputs.values():
+            output.close()
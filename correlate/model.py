@@ -1,7 +1,272 @@
 
 import numpy as np
-import scipy.optimize
-from typing import (Callable, NoReturn, Self)
+import time
+from collections import (Counter)
+from typing import (Any, Callable, Dict, List, NoReturn, Optional, Self, Tuple)
+from util.lazy import (lazy)
+
+# Imported on first use, as fits loaded from the cache never need it.
+scipy = lazy('scipy')
+
+# The number of slowest fits kept by 'FitStats'.
+SLOWEST: int = 5
+
+class FitReport(object):
+    """
+    The telemetry of one fit of a GARCH or DCC model: the function and
+    gradient evaluations and iterations of the optimizer, summed over the
+    calls to 'scipy.optimize.minimize' the fit made, its wall time, and the
+    termination status, message and constraint violation of the last call.
+    Fits answered from the fit cache carry the report of the original fit,
+    marked as 'cached'.
+    """
+
+    def __init__(
+            self: Self,
+            model: str,
+            calls: int = 0,
+            nfev: int = 0,
+            njev: int = 0,
+            nit: int = 0,
+            seconds: float = 0.0,
+            success: bool = True,
+            status: int = 0,
+            message: str = '',
+            violation: float = 0.0,
+            cached: bool = False,
+        ) -> None:
+
+        self._model = model
+        self._calls = calls
+        self._nfev = nfev
+        self._njev = njev
+        self._nit = nit
+        self._seconds = seconds
+        self._success = success
+        self._status = status
+        self._message = message
+        self._violation = violation
+        self._cached = cached
+
+    @property
+    def model(self: Self) -> str:
+        """
+        Get the name of the fitted model.
+        """
+
+        return self._model
+
+    @property
+    def calls(self: Self) -> int:
+        """
+        Get the number of calls the fit made to the optimizer.
+        """
+
+        return self._calls
+
+    @property
+    def nfev(self: Self) -> int:
+        """
+        Get the number of loss evaluations of the fit.
+        """
+
+        return self._nfev
+
+    @property
+    def njev(self: Self) -> int:
+        """
+        Get the number of gradient evaluations of the fit.
+        """
+
+        return self._njev
+
+    @property
+    def nit(self: Self) -> int:
+        """
+        Get the number of optimizer iterations of the fit.
+        """
+
+        return self._nit
+
+    @property
+    def seconds(self: Self) -> float:
+        """
+        Get the wall time spent in the optimizer, in seconds.
+        """
+
+        return self._seconds
+
+    @property
+    def success(self: Self) -> bool:
+        """
+        Get whether every call to the optimizer converged.
+        """
+
+        return self._success
+
+    @property
+    def status(self: Self) -> int:
+        """
+        Get the termination status of the last call to the optimizer.
+        """
+
+        return self._status
+
+    @property
+    def message(self: Self) -> str:
+        """
+        Get the termination message of the last call to the optimizer.
+        """
+
+        return self._message
+
+    @property
+    def violation(self: Self) -> float:
+        """
+        Get the largest constraint violation of the fitted parameters, zero
+        if they satisfy every constraint.
+        """
+
+        return self._violation
+
+    @property
+    def cached(self: Self) -> bool:
+        """
+        Get whether the fit was loaded from the fit cache.
+        """
+
+        return self._cached
+
+    def add(self: Self, res: Any, seconds: float, violation: float) -> None:
+        """
+        Adds the result 'res' of a call to the optimizer that took 'seconds'
+        and left the constraints violated by 'violation'.
+        """
+
+        self._calls += 1
+        self._nfev += int(res.get('nfev', 0))
+        self._njev += int(res.get('njev', 0))
+        self._nit += int(res.get('nit', 0))
+        self._seconds += seconds
+        self._success = self._success and bool(res.get('success', True))
+        self._status = int(res.get('status', 0))
+        self._message = str(res.get('message', ''))
+        self._violation = violation
+
+    def to_dict(self: Self) -> Dict[str, Any]:
+        """
+        Returns the report as a JSON-serializable dictionary.
+        """
+
+        return {
+            'model': self._model,
+            'calls': self._calls,
+            'nfev': self._nfev,
+            'njev': self._njev,
+            'nit': self._nit,
+            'seconds': self._seconds,
+            'success': self._success,
+            'status': self._status,
+            'message': self._message,
+            'violation': self._violation,
+            'cached': self._cached,
+        }
+
+    @classmethod
+    def from_dict(cls, obj: Dict[str, Any]) -> 'FitReport':
+        """
+        Returns the report serialized by 'to_dict'.
+        """
+
+        return cls(**obj)
+
+    def __repr__(self: Self) -> str:
+        return f"FitReport({', '.join(f'{k}={v!r}' for k, v in self.to_dict().items())})"
+
+class FitStats(object):
+    """
+    Aggregates the 'FitReport's of a run: the number of fits, cached fits and
+    fits that did not converge, the total evaluations, iterations and wall
+    time of the fits that ran, the count of each termination message, and
+    the 'SLOWEST' fits along with the keys (ticker, window, ...) they were
+    added with.
+    """
+
+    def __init__(self: Self) -> None:
+        self._fits = 0
+        self._cached = 0
+        self._failed = 0
+        self._totals = Counter()
+        self._messages = Counter()
+        self._slowest: List[Tuple[float, Dict[str, Any]]] = []
+
+    @property
+    def fits(self: Self) -> int:
+        """
+        Get the number of fits added.
+        """
+
+        return self._fits
+
+    @property
+    def cached(self: Self) -> int:
+        """
+        Get the number of fits loaded from the fit cache.
+        """
+
+        return self._cached
+
+    @property
+    def failed(self: Self) -> int:
+        """
+        Get the number of fits whose optimizer did not converge.
+        """
+
+        return self._failed
+
+    def add(self: Self, report: FitReport, **keys: Any) -> None:
+        """
+        Adds 'report' to the totals, identified by 'keys' among the slowest
+        fits.
+        """
+
+        self._fits += 1
+
+        if report.cached:
+            self._cached += 1
+            return
+
+        if not report.success:
+            self._failed += 1
+
+        self._totals.update(nfev=report.nfev, njev=report.njev, nit=report.nit, calls=report.calls)
+        self._totals['seconds'] += report.seconds
+        self._messages[report.message] += 1
+
+        self._slowest.append((report.seconds, {'model': report.model, **keys, 'nfev': report.nfev}))
+        self._slowest = sorted(self._slowest, key=lambda x: -x[0])[:SLOWEST]
+
+    def to_dict(self: Self) -> Dict[str, Any]:
+        """
+        Returns the totals as a JSON-serializable dictionary.
+        """
+
+        return {
+            'fits': self._fits,
+            'cached': self._cached,
+            'failed': self._failed,
+            **{k: self._totals[k] for k in ('calls', 'nfev', 'njev', 'nit', 'seconds')},
+            'messages': dict(self._messages),
+            'slowest': [{**keys, 'seconds': seconds} for seconds, keys in self._slowest],
+        }
+
+    def __str__(self: Self) -> str:
+        totals = self._totals
+
+        return (
+            f"{self._fits} fits ({self._cached} cached, {self._failed} not converged): "
+            f"{totals['nfev']} nfev, {totals['njev']} njev, {totals['nit']} nit, {totals['seconds']:.3f} s"
+        )
 
 class Minimize(object):
     """
@@ -20,6 +285,8 @@ class Minimize(object):
         self._max_iterations = max_iterations
         self._method = method
         self._stopping_early = stopping_early
+        self._report: Optional[FitReport] = None
+        self.constraints: List[Dict[str, Any]] = []
 
 
     @property
@@ -92,3 +359,72 @@ class Minimize(object):
 
         self._stopping_early = x
 
+
+    def config(self: Self) -> Dict[str, Any]:
+        """
+        Get the settings of the model that determine the outcome of a fit.
+        """
+
+        return {
+            'model': type(self).__name__,
+            'max_iterations': self.max_iterations,
+            'method': self.method,
+            'stopping_early': self.stopping_early,
+        }
+
+    @property
+    def report(self: Self) -> Optional[FitReport]:
+        """
+        Get the report of the last fit of the model, or None if it has not
+        been fitted.
+        """
+
+        return self._report
+
+    @report.setter
+    def report(self: Self, report: FitReport) -> NoReturn:
+        """
+        Set the report of the last fit of the model.
+        """
+
+        self._report = report
+
+    def violation(self: Self, x: np.ndarray) -> float:
+        """
+        Returns the largest violation of the model's constraints by the
+        parameters 'x', zero if 'x' satisfies all of them.
+        """
+
+        violations = [0.0]
+
+        for constraint in self.constraints:
+            value = np.min(constraint['fun'](x))
+            violations.append(abs(value) if constraint['type'] == 'eq' else -value)
+
+        return float(max(violations))
+
+    def minimize(self: Self, f: Callable[[np.ndarray], float], x0: np.ndarray) -> Any:
+        """
+        Minimizes 'f' from 'x0' under the model's constraints with its
+        optimization method, and adds the call to the report of the fit in
+        progress.
+
+        :return: The 'OptimizeResult' of the call.
+        """
+
+        if self._report is None:
+            self._report = FitReport(model=type(self).__name__)
+
+        t = time.perf_counter()
+
+        res = scipy.optimize.minimize(
+            f,
+            x0,
+            method=self.method,
+            options={'disp': False},
+            constraints=self.constraints,
+        )
+
+        self._report.add(res, time.perf_counter() - t, self.violation(res.x))
+
+        return res
@@ -0,0 +1,112 @@
+
+from concurrent.futures import (Executor)
+from typing import (Any, Dict, List, Optional, Tuple)
+
+import numpy as np
+
+from cache import (FitCache)
+from garch import (GARCH)
+from model import (FitReport)
+from util.profile import (stage)
+from util.shm import (SharedArray, SharedArrays, attach)
+
+
+def _fit(
+        returns: np.ndarray,
+        cache: Optional[FitCache],
+        kwargs: Dict[str, Any],
+    ) -> Tuple[np.ndarray, float, np.ndarray, FitReport]:
+
+    """
+    Fits a GARCH model to 'returns', through 'cache' if there is one, and
+    returns its parameters, final training loss, volatility path and fit
+    report.
+    """
+
+    model = GARCH(**kwargs)
+
+    if cache is not None:
+        entry = cache.fit(model, returns)
+
+        return entry['params'], entry['losses'][-1], entry['sigma'], model.report
+
+    losses = model.fit(returns)
+
+    return model.theta, losses[-1], model.sigma(returns), model.report
+
+def _fit_garch(
+        returns: SharedArray,
+        epsilon: SharedArray,
+        i: int,
+        cache: Optional[FitCache],
+        kwargs: Dict[str, Any],
+    ) -> Tuple[np.ndarray, float, FitReport]:
+
+    """
+    Fits the GARCH model for row 'i' of the shared returns, and writes its
+    standardized residuals into row 'i' of the shared 'epsilon' array.
+    Returns the fitted parameters, the final training loss and the fit
+    report.
+    """
+
+    with attach(returns) as r, attach(epsilon) as e:
+        theta, loss, sigma, report = _fit(r[i], cache, kwargs)
+
+        e[i] = r[i] / sigma
+
+    return theta, loss, report
+
+def fit_garch(
+        returns: np.ndarray,
+        executor: Optional[Executor] = None,
+        cache: Optional[FitCache] = None,
+        tickers: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, List[FitReport]]:
+
+    """
+    Fits a GARCH model to every row of the (n, T) 'returns' array, passing
+    'kwargs' to each 'GARCH'. With a process pool 'executor' the rows are
+    fitted in parallel: the returns are published to shared memory once, and
+    the workers write the standardized residuals straight back into a shared
+    array, so neither is pickled per task. With a 'cache', fits of the same
+    returns and settings are loaded from it instead of being repeated.
+    'tickers' name the rows of 'returns' in the profiler's stage timings;
+    with an 'executor', the fits are only timed as a whole.
+
+    :return: The (n, k) fitted parameters, the (n,) final training losses,
+        the (n, T) standardized residuals and the n fit reports.
+    """
+
+    n = len(returns)
+
+    if executor is None:
+        thetas, losses, reports, epsilon = [], [], [], np.empty(returns.shape)
+
+        for i in range(n):
+            with stage('garch', ticker=i if tickers is None else tickers[i]):
+                theta, loss, sigma, report = _fit(returns[i], cache, kwargs)
+
+            thetas.append(theta)
+            losses.append(loss)
+            reports.append(report)
+            epsilon[i] = returns[i] / sigma
+
+        return np.array(thetas), np.array(losses), epsilon, reports
+
+    with stage('garch'), SharedArrays() as shared:
+        r = shared.publish(np.ascontiguousarray(returns, dtype=np.float64))
+        e, view = shared.empty(returns.shape)
+
+        futures = [executor.submit(_fit_garch, r, e, i, cache, kwargs) for i in range(n)]
+        results = [future.result() for future in futures]
+
+        epsilon = np.array(view)
+
+        del view
+
+    thetas = np.array([theta for theta, _, _ in results])
+    losses = np.array([loss for _, loss, _ in results])
+    reports = [report for _, _, report in results]
+
+    return thetas, losses, epsilon, reports
@@ -0,0 +1,269 @@
+
+from collections import (deque)
+from concurrent.futures import (Executor)
+from typing import (Any, Dict, Final, List, Optional, Tuple)
+
+import numpy as np
+import time
+
+from cache import (FitCache)
+from dcc import (DCC)
+from dcc_loss import (R_iter)
+from ewma import (DECAY, EWMA, correlation_iter)
+from model import (FitReport)
+from parallel import (fit_garch)
+from util.metrics import (Counter, Gauge, Histogram, counter, gauge, histogram)
+from util.pairs import (Pairs, collect, stream)
+from util.profile import (stage)
+
+# The correlation models: the GARCH residuals' 'dcc', or the 'ewma' of the
+# raw returns, which needs no optimization.
+MODELS: Final[Tuple[str, ...]] = ('dcc', 'ewma')
+
+# The GARCH fits of the rows of a window's returns: their parameters, final
+# training losses, standardized residuals and fit reports.
+Volatility = Tuple[np.ndarray, np.ndarray, np.ndarray, List[FitReport]]
+
+# The fits of the models, and the returns they were fitted to.
+FITS: Final[Counter] = counter('correlate_fits_total', 'The GARCH and DCC fits, by model and whether they were loaded from the fit cache.')
+FIT_SECONDS: Final[Histogram] = histogram('correlate_fit_seconds', 'The optimizer wall time of the fits that ran, by model.')
+FIT_EVALUATIONS: Final[Counter] = counter('correlate_fit_evaluations_total', 'The loss evaluations of the fits that ran, by model.')
+BARS: Final[Counter] = counter('correlate_bars_processed_total', 'The returns the models were fitted to, over every ticker.')
+BUSY: Final[Counter] = counter('correlate_fit_window_seconds_total', 'The wall time spent fitting windows.')
+BARS_PER_SECOND: Final[Gauge] = gauge(
+    'correlate_bars_per_second',
+    'The returns processed per second of fitting.',
+    lambda: BARS.value() / max(BUSY.value(), 1e-9),
+)
+
+
+def union(universes: List[List[str]]) -> List[str]:
+
+    """
+    Returns the tickers of all 'universes' without duplicates, in order of
+    first appearance.
+    """
+
+    return list(dict.fromkeys(ticker for universe in universes for ticker in universe))
+
+def count(reports: List[FitReport]) -> None:
+
+    """
+    Counts the fits of 'reports' in the fit metrics.
+    """
+
+    for report in reports:
+        FITS.inc(model=report.model, cached=str(report.cached).lower())
+
+        if not report.cached:
+            FIT_SECONDS.observe(report.seconds, model=report.model)
+            FIT_EVALUATIONS.inc(report.nfev, model=report.model)
+
+def fit_volatility(
+        returns: np.ndarray,
+        tickers: List[str],
+        executor: Optional[Executor] = None,
+        cache: Optional[FitCache] = None,
+        p: int = 1,
+        q: int = 1,
+        **kwargs: Any,
+    ) -> Volatility:
+
+    """
+    Fits the GARCH model of every row of the (n, T) 'returns', one per ticker
+    of 'tickers', on 'executor' and through 'cache' if there are any (see
+    'parallel.fit_garch'), and counts the fits.
+    """
+
+    garch = fit_garch(returns, executor=executor, cache=cache, tickers=tickers, p=p, q=q, **kwargs)
+
+    count(garch[3])
+
+    return garch
+
+def fit_dcc(
+        epsilon: np.ndarray,
+        cache: Optional[FitCache] = None,
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
+
+    """
+    Fits a DCC model to the (n, T) standardized residuals 'epsilon', through
+    'cache' if there is one, passing 'kwargs' to the 'DCC'.
+
+    :return: The fitted parameters 'ab', the final correlation matrix 'R',
+        the final training 'loss', the number of 'iterations', the number of
+        observations 'nobs' and the fit 'report'.
+    """
+
+    model = DCC(n=len(epsilon), **kwargs)
+
+    if cache is not None:
+        losses = cache.fit(model, epsilon)['losses']
+    else:
+        losses = model.fit(epsilon)
+
+    return {
+        'ab': model.ab,
+        'R': deque(R_iter(tr=epsilon, ab=model.ab), maxlen=1)[0],
+        'loss': losses[-1],
+        'iterations': len(losses),
+        'nobs': epsilon.shape[1],
+        'report': model.report,
+    }
+
+def fit_ewma(returns: np.ndarray, decay: float = DECAY) -> Dict[str, Any]:
+
+    """
+    Fits an EWMA model with 'decay' to the (n, T) 'returns'.
+
+    :return: The same output as 'fit_dcc', with the 'ab' of the DCC model
+        equivalent to the EWMA model, no optimizer iterations and no loss.
+    """
+
+    model = EWMA(decay=decay)
+    model.fit(returns)
+
+    return {
+        'ab': model.ab,
+        'R': model.R,
+        'loss': None,
+        'iterations': 0,
+        'nobs': returns.shape[1],
+        'report': model.report,
+    }
+
+def fit_pairs(
+        x: np.ndarray,
+        fit: Dict[str, Any],
+        top_k: Optional[int] = None,
+        threshold: Optional[float] = None,
+        steps: bool = False,
+        model: str = 'dcc',
+    ) -> Pairs:
+
+    """
+    Returns the sparse triplets of the pairs selected by 'top_k' and
+    'threshold' (see 'util.pairs.select') from the final correlation matrix
+    of 'fit', or with 'steps' from the correlation matrix of every step of
+    the recursion of 'model' over the (n, T) series 'x' the model was fitted
+    to, which are streamed one at a time. Steps are numbered from the
+    oldest, so the final matrix is step T - 1.
+    """
+
+    if steps:
+        Rs = correlation_iter(tr=x, decay=fit['ab'][1]) if model == 'ewma' else R_iter(tr=x, ab=fit['ab'])
+
+        return collect(stream(Rs, k=top_k, threshold=threshold))
+
+    return collect(stream([fit['R']], k=top_k, threshold=threshold, start=fit['nobs'] - 1))
+
+def fit_window(
+        returns: np.ndarray,
+        tickers: List[str],
+        universes: List[List[str]],
+        executor: Optional[Executor] = None,
+        cache: Optional[FitCache] = None,
+        p: int = 1,
+        q: int = 1,
+        model: str = 'dcc',
+        decay: float = DECAY,
+        top_k: Optional[int] = None,
+        threshold: Optional[float] = None,
+        steps: bool = False,
+        garch: Optional[Volatility] = None,
+        **kwargs: Any,
+    ) -> List[Dict[str, Any]]:
+
+    """
+    Fits the models of one window for every universe in 'universes'. The
+    (n, T) 'returns' hold one row per ticker of 'tickers', which must include
+    every ticker of the universes. Each ticker's GARCH model is fitted once,
+    and only the DCC model is fitted per universe, to the rows of the
+    standardized residuals of its tickers. Tickers in none of the universes
+    are not fitted. 'kwargs' are passed to both models. The GARCH models
+    already fitted to every row of 'returns' may be given as 'garch' (see
+    'fit_volatility'), and are then not refitted.
+
+    With the 'ewma' model, no GARCH model is fitted and the EWMA model with
+    'decay' is computed per universe on the rows of its tickers' returns, so
+    the output has no GARCH parameters, losses or reports.
+
+    With a 'top_k' or a 'threshold', the output of each universe also holds
+    the sparse 'pairs' of its strongest correlations (see 'fit_pairs').
+
+    :return: The output of each universe, as the keyword arguments of
+        'ResultSink.write' other than the window bounds.
+    """
+
+    if model not in MODELS:
+        raise ValueError(f"Invalid model: {model}. Must be one of {', '.join(MODELS)}.")
+
+    sparse = top_k is not None or threshold is not None
+
+    t = time.perf_counter()
+
+    if model == 'ewma':
+        fits = []
+
+        for universe in universes:
+            rows = [tickers.index(ticker) for ticker in universe]
+
+            with stage('ewma', universe=' '.join(universe)):
+                fit = fit_ewma(returns[rows], decay=decay)
+
+                if sparse:
+                    fit['pairs'] = fit_pairs(returns[rows], fit, top_k=top_k, threshold=threshold, steps=steps, model=model)
+
+            fits.append({
+                'tickers': universe,
+                'thetas': np.empty((0, 0)),
+                'garch_losses': np.empty(0),
+                'garch_reports': [],
+                **fit,
+            })
+
+        count([fit['report'] for fit in fits])
+
+        BARS.inc(returns.size)
+        BUSY.inc(time.perf_counter() - t)
+
+        return fits
+
+    # Only the tickers of the given universes are fitted, so on a partial
+    # resume the tickers of the universes already stored are skipped.
+    fitted = union(universes) if garch is None else tickers
+
+    if fitted != tickers:
+        returns = returns[[tickers.index(ticker) for ticker in fitted]]
+
+    if garch is None:
+        garch = fit_volatility(returns, tickers=fitted, executor=executor, cache=cache, p=p, q=q, **kwargs)
+
+    thetas, garch_losses, epsilon, garch_reports = garch
+
+    fits = []
+
+    for universe in universes:
+        rows = [fitted.index(ticker) for ticker in universe]
+
+        with stage('dcc', universe=' '.join(universe)):
+            fit = fit_dcc(epsilon[rows], cache=cache, **kwargs)
+
+            if sparse:
+                fit['pairs'] = fit_pairs(epsilon[rows], fit, top_k=top_k, threshold=threshold, steps=steps)
+
+        fits.append({
+            'tickers': universe,
+            'thetas': thetas[rows],
+            'garch_losses': garch_losses[rows],
+            'garch_reports': [garch_reports[row] for row in rows],
+            **fit,
+        })
+
+    count([fit['report'] for fit in fits])
+
+    BARS.inc(returns.size)
+    BUSY.inc(time.perf_counter() - t)
+
+    return fits
@@ -0,0 +1,587 @@
+
+from argparse import (ArgumentParser)
+from datetime import (datetime, timezone)
+from http.server import (BaseHTTPRequestHandler, ThreadingHTTPServer)
+from typing import (Any, Dict, Final, List, Optional, Self, Tuple, Type)
+from urllib.parse import (parse_qsl, urlencode, urlsplit)
+
+import hashlib
+import json
+import numpy as np
+import os
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+import zlib
+
+from util.logs import (logger)
+
+
+# The length of a bar over each timespan served, in seconds.
+STEPS: Final[Dict[str, int]] = {
+    'minute': 60,
+    'hour': 3600,
+    'day': 86400,
+}
+
+# The number of days from the UNIX epoch for which synthetic prices exist.
+DAYS: Final[int] = 36525
+
+# The default and largest number of bars per page, as in the Polygon API.
+LIMIT: Final[Tuple[int, int]] = (5000, 50000)
+
+# The path of an aggregates request.
+AGGS: Final[re.Pattern] = re.compile(r'^/v2/aggs/ticker/([^/]+)/range/(\d+)/(\w+)/([^/]+)/([^/]+)$')
+
+
+def timestamp(s: str, end: bool = False) -> int:
+
+    """
+    Returns the epoch second of a 'from' or 'to' bound of an aggregates
+    request, given either as epoch milliseconds or as a date. A date as an
+    'end' bound covers the whole day.
+    """
+
+    if s.isdigit():
+        return int(s) // 1000
+
+    t = int(datetime.strptime(s, '%Y-%m-%d').replace(tzinfo=timezone.utc).timestamp())
+
+    return t + 86399 if end else t
+
+
+class SyntheticSource:
+    """
+    Serves deterministic synthetic aggregates for any ticker.
+
+    Each ticker's log price follows a daily random walk seeded by its name,
+    and the bars within a day follow a Brownian bridge between consecutive
+    daily levels, seeded by the ticker and the day. Any range of bars can
+    therefore be generated on its own, and overlapping requests always agree.
+    """
+
+    def __init__(self: Self, volatility: float = 0.02) -> None:
+        self._volatility = volatility
+        self._levels: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def levels(self: Self, ticker: str) -> np.ndarray:
+        """
+        Returns the log price of 'ticker' at the start of each day from the
+        UNIX epoch.
+        """
+
+        with self._lock:
+            if ticker not in self._levels:
+                rng = np.random.default_rng(zlib.crc32(ticker.encode()))
+                self._levels[ticker] = np.log(100.0) + np.concatenate([[0.0], np.cumsum(rng.normal(0.0, self._volatility, DAYS))])
+
+            return self._levels[ticker]
+
+    def aggs(self: Self, ticker: str, multiplier: int, timespan: str, t0: int, t1: int) -> List[Dict[str, Any]]:
+        """
+        Returns the aggregates of 'ticker' over 'multiplier' x 'timespan'
+        starting between the epoch seconds 't0' and 't1', in the format of the
+        Polygon API.
+        """
+
+        if timespan not in STEPS:
+            raise ValueError(f"Invalid timespan: {timespan}. Must be one of {', '.join(STEPS)}.")
+
+        step = STEPS[timespan] * multiplier
+
+        if 86400 % step != 0:
+            raise ValueError(f"Invalid multiplier: {multiplier}. Must divide a day into whole bars.")
+
+        levels = self.levels(ticker)
+        m = 86400 // step
+        d0, d1 = max(t0 // 86400, 0), min(t1 // 86400, DAYS - 1)
+
+        columns: Dict[str, List[np.ndarray]] = {key: [] for key in 'tohlcv'}
+
+        for d in range(d0, d1 + 1):
+            rng = np.random.default_rng([zlib.crc32(ticker.encode()), d, step])
+            z, spread, volume = rng.standard_normal((3, m))
+            sigma = self._volatility / np.sqrt(m)
+
+            # A random walk from the day's level, bent to end on the next one.
+            k = np.arange(1, m + 1) / m
+            walk = np.cumsum(z) * sigma
+            path = levels[d] + walk - k * walk[-1] + k * (levels[d + 1] - levels[d])
+
+            c = np.exp(path)
+            o = np.exp(np.concatenate([[levels[d]], path[:-1]]))
+            width = np.exp(np.abs(spread) * sigma * 0.5)
+
+            columns['t'].append(d * 86400 + step * np.arange(m, dtype=np.int64))
+            columns['o'].append(o)
+            columns['h'].append(np.maximum(o, c) * width)
+            columns['l'].append(np.minimum(o, c) / width)
+            columns['c'].append(c)
+            columns['v'].append(np.round(np.exp(10.0 + volume)))
+
+        if len(columns['t']) == 0:
+            return []
+
+        arrays = {key: np.concatenate(values) for key, values in columns.items()}
+        keep = (arrays['t'] >= t0) & (arrays['t'] <= t1)
+        arrays = {key: values[keep] for key, values in arrays.items()}
+
+        return [
+            {'v': v, 'vw': (h + l + c) / 3, 'o': o, 'c': c, 'h': h, 'l': l, 't': t * 1000, 'n': int(v // 100)}
+            for t, o, h, l, c, v in zip(*(arrays[key].tolist() for key in 'tohlcv'))
+        ]
+
+
+class Faults:
+    """
+    The faults injected into the responses of the stand-in server: a fixed
+    'latency' plus uniform 'jitter' in seconds, a token bucket rate limit of
+    'rate' requests per second with bursts of up to 'burst' requests answered
+    with 429 responses, and random server errors for 'error_rate' of the
+    requests.
+    """
+
+    def __init__(
+            self: Self,
+            latency: float = 0.0,
+            jitter: float = 0.0,
+            rate: Optional[float] = None,
+            burst: int = 1,
+            error_rate: float = 0.0,
+            retry_after: int = 0,
+            seed: int = 0,
+        ) -> None:
+
+        self._latency = latency
+        self._jitter = jitter
+        self._rate = rate
+        self._burst = burst
+        self._error_rate = error_rate
+        self._retry_after = retry_after
+        self._rng = np.random.default_rng(seed)
+        self._tokens = float(burst)
+        self._refilled = time.monotonic()
+        self._lock = threading.Lock()
+
+    def delay(self: Self) -> None:
+        """
+        Sleeps for the latency of a response.
+        """
+
+        with self._lock:
+            delay = self._latency + self._jitter * self._rng.random()
+
+        if delay > 0:
+            time.sleep(delay)
+
+    def admit(self: Self) -> Optional[Tuple[int, Dict[str, str]]]:
+        """
+        Returns None if a request may be served, or the status and headers of
+        the error response it gets instead.
+        """
+
+        with self._lock:
+            if self._rate is not None:
+                now = time.monotonic()
+                self._tokens = min(self._burst, self._tokens + (now - self._refilled) * self._rate)
+                self._refilled = now
+
+                if self._tokens < 1:
+                    return 429, {'Retry-After': str(self._retry_after)}
+
+                self._tokens -= 1
+
+            if self._error_rate > 0 and self._rng.random() < self._error_rate:
+                return int(self._rng.choice([500, 502, 503])), {}
+
+        return None
+
+
+class ReplayServer:
+    """
+    A local stand-in for the aggregates endpoint of the Polygon API
+    ('/v2/aggs/ticker/...'), for running and benchmarking the fetch path
+    without network access or an API key. Point 'PolygonClient' at it with
+    'base=server.url' (or '--api-base').
+
+    Aggregates are paginated by the request's 'limit' (and at most
+    'page_size') with 'next_url' links, as by the real API, and 'faults' are
+    injected into the responses. By default the aggregates come from a
+    'SyntheticSource'. With 'record' set to a directory, requests are
+    forwarded to 'upstream' and the responses are saved there; with 'replay'
+    set to such a directory, the saved responses are served instead.
+    Counters of the traffic served are available from '/stats'.
+    """
+
+    def __init__(
+            self: Self,
+            host: str = '127.0.0.1',
+            port: int = 0,
+            source: Optional[SyntheticSource] = None,
+            faults: Optional[Faults] = None,
+            page_size: int = LIMIT[1],
+            record: Optional[str] = None,
+            replay: Optional[str] = None,
+            upstream: str = 'https://api.polygon.io',
+        ) -> None:
+
+        if record is not None and replay is not None:
+            raise ValueError("Invalid mode: cannot both record and replay.")
+
+        self._source = source or SyntheticSource()
+        self._faults = faults or Faults()
+        self._page_size = page_size
+        self._record = record
+        self._replay = replay
+        self._upstream = upstream.rstrip('/')
+
+        self._stats: Dict[str, int] = {key: 0 for key in ('requests', 'served', 'rate_limited', 'errors', 'bars', 'bytes')}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+        for directory in (record, replay):
+            if directory is not None:
+                os.makedirs(directory, exist_ok=True)
+
+        self._server = ThreadingHTTPServer((host, port), _handler(self))
+
+    def __enter__(self: Self) -> Self:
+        return self.start()
+
+    def __exit__(self: Self, *args: Any) -> None:
+        self.stop()
+
+    @property
+    def url(self: Self) -> str:
+        """
+        Get the base URL of the server.
+        """
+
+        host, port = self._server.server_address[:2]
+
+        return f'http://{host}:{port}'
+
+    def stats(self: Self) -> Dict[str, int]:
+        """
+        Returns the counters of the traffic served so far.
+        """
+
+        with self._lock:
+            return dict(self._stats)
+
+    def count(self: Self, **increments: int) -> None:
+        """
+        Adds 'increments' to the traffic counters.
+        """
+
+        with self._lock:
+            for key, increment in increments.items():
+                self._stats[key] += increment
+
+    def handle(
+            self: Self,
+            path: str,
+            query: List[Tuple[str, str]],
+            authorization: Optional[str] = None,
+        ) -> Tuple[int, Dict[str, Any], Dict[str, str]]:
+
+        """
+        Returns the status, JSON body and extra headers of the response to a
+        request, after its latency and with any injected fault.
+        """
+
+        self.count(requests=1)
+        self._faults.delay()
+
+        fault = self._faults.admit()
+
+        if fault is not None:
+            status, headers = fault
+            self.count(**{'rate_limited' if status == 429 else 'errors': 1})
+
+            return status, {'status': 'ERROR', 'error': f'injected {status}'}, headers
+
+        status, body = self.respond(path, query, authorization)
+
+        if status == 200:
+            self.count(served=1, bars=len(body.get('results', [])))
+
+        return status, body, {}
+
+    def start(self: Self) -> Self:
+        """
+        Serves requests on a background thread.
+        """
+
+        self._thread = threading.Thread(target=self._server.serve_forever, name='replay', daemon=True)
+        self._thread.start()
+
+        logger.info(f'ReplayServer.start(): serving aggregates on {self.url}')
+
+        return self
+
+    def serve_forever(self: Self) -> None:
+        """
+        Serves requests on the calling thread until interrupted.
+        """
+
+        logger.info(f'ReplayServer.serve_forever(): serving aggregates on {self.url}')
+
+        try:
+            self._server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._server.server_close()
+
+    def stop(self: Self) -> None:
+        """
+        Stops serving requests.
+        """
+
+        self._server.shutdown()
+        self._server.server_close()
+
+        if self._thread is not None:
+            self._thread.join()
+
+    def _key(self: Self, path: str, query: List[Tuple[str, str]]) -> str:
+        """
+        Returns the name of the file holding the recorded response to a
+        request, ignoring its API key.
+        """
+
+        query = sorted((key, value) for key, value in query if key != 'apiKey')
+
+        return hashlib.sha256(f'{path}?{urlencode(query)}'.encode()).hexdigest()[:32] + '.json'
+
+    def respond(self: Self, path: str, query: List[Tuple[str, str]], authorization: Optional[str]) -> Tuple[int, Dict[str, Any]]:
+        """
+        Returns the status and JSON body of the response to an aggregates
+        request.
+        """
+
+        if self._replay is not None:
+            try:
+                with open(os.path.join(self._replay, self._key(path, query)), 'r') as file:
+                    return 200, self._rebase(json.load(file))
+            except FileNotFoundError:
+                return 404, {'status': 'NOT_FOUND', 'error': f'no recorded response for {path}'}
+
+        if self._record is not None:
+            return self._forward(path, query, authorization)
+
+        match = AGGS.match(path)
+
+        if match is None:
+            return 404, {'status': 'NOT_FOUND', 'error': f'unknown path {path}'}
+
+        ticker, multiplier, timespan, from_, to = match.groups()
+        params = dict(query)
+
+        try:
+            t0 = timestamp(from_)
+            t1 = timestamp(to, end=True)
+            limit = min(int(params.get('limit', LIMIT[0])), LIMIT[1], self._page_size)
+            results = self._source.aggs(ticker, int(multiplier), timespan, t0, t1)
+        except ValueError as e:
+            return 400, {'status': 'ERROR', 'error': str(e)}
+
+        if params.get('sort') == 'desc':
+            results.reverse()
+
+        page = results[:limit]
+
+        body = {
+            'ticker': ticker,
+            'queryCount': len(page),
+            'resultsCount': len(page),
+            'adjusted': params.get('adjusted', 'true') == 'true',
+            'results': page,
+            'status': 'OK',
+            'request_id': hashlib.md5(f'{path}?{urlencode(query)}'.encode()).hexdigest(),
+            'count': len(page),
+        }
+
+        if len(results) > limit:
+            # Continue from the first bar not on this page.
+            t = results[limit]['t']
+            bounds = (str(t), to) if params.get('sort') != 'desc' else (from_, str(t))
+            rest = [(key, value) for key, value in query if key != 'apiKey']
+
+            body['next_url'] = f'{self.url}/v2/aggs/ticker/{ticker}/range/{multiplier}/{timespan}/{bounds[0]}/{bounds[1]}?{urlencode(rest)}'
+
+        return 200, body
+
+    def _forward(self: Self, path: str, query: List[Tuple[str, str]], authorization: Optional[str]) -> Tuple[int, Dict[str, Any]]:
+        """
+        Forwards a request to the upstream API, and records its response.
+        """
+
+        request = urllib.request.Request(f'{self._upstream}{path}?{urlencode(query)}')
+
+        if authorization is not None:
+            request.add_header('Authorization', authorization)
+
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                body = json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, {'status': 'ERROR', 'error': e.reason}
+
+        with open(os.path.join(self._record, self._key(path, query)), 'w') as file:
+            json.dump(body, file)
+
+        return 200, self._rebase(body)
+
+    def _rebase(self: Self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Points the 'next_url' of an upstream response at this server.
+        """
+
+        if 'next_url' in body:
+            url = urlsplit(body['next_url'])
+            body['next_url'] = f'{self.url}{url.path}' + (f'?{url.query}' if url.query else '')
+
+        return body
+
+
+def _handler(server: ReplayServer) -> Type[BaseHTTPRequestHandler]:
+
+    """
+    Returns the HTTP request handler of 'server'.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def _send(self: Self, status: int, obj: Any, headers: Optional[Dict[str, str]] = None) -> None:
+            body = json.dumps(obj).encode()
+
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+
+            self.end_headers()
+            self.wfile.write(body)
+
+            server.count(bytes=len(body))
+
+        def do_GET(self: Self) -> None:
+            url = urlsplit(self.path)
+
+            if url.path == '/stats':
+                return self._send(200, server.stats())
+
+            self._send(*server.handle(url.path, parse_qsl(url.query), self.headers.get('Authorization')))
+
+        def log_message(self: Self, format: str, *args: Any) -> None:
+            logger.debug(f'{self.address_string()} {format % args}')
+
+    return Handler
+
+
+def main() -> None:
+    parser = ArgumentParser(
+        prog='replay',
+        description="""
+            Serve synthetic, recorded or proxied Polygon aggregates locally,
+            with configurable latency, rate limits and errors. Point
+            'correlate' at it with --api-base.
+        """,
+        allow_abbrev=False,
+    )
+
+    parser.add_argument('--host', default='127.0.0.1', type=str, metavar='HOST', help="""
+        (Optional). The address to listen on. Defaults to 127.0.0.1 if not
+        specified.
+    """)
+
+    parser.add_argument('--port', default=8700, type=int, metavar='PORT', help="""
+        (Optional). The port to listen on. Defaults to 8700 if not specified.
+    """)
+
+    parser.add_argument('--latency', default=0.0, type=float, metavar='MS', help="""
+        (Optional). The latency added to every response, in milliseconds.
+        Defaults to 0 if not specified.
+    """)
+
+    parser.add_argument('--jitter', default=0.0, type=float, metavar='MS', help="""
+        (Optional). The largest random latency added on top of --latency, in
+        milliseconds. Defaults to 0 if not specified.
+    """)
+
+    parser.add_argument('--rate', default=None, type=float, metavar='N', help="""
+        (Optional). The number of requests per second served before
+        answering with 429 responses. Unlimited if not specified.
+    """)
+
+    parser.add_argument('--burst', default=5, type=int, metavar='N', help="""
+        (Optional). The number of requests that may exceed --rate in a burst.
+        Defaults to 5 if not specified.
+    """)
+
+    parser.add_argument('--retry-after', default=0, type=int, metavar='SECONDS', help="""
+        (Optional). The Retry-After header of 429 responses. Defaults to 0 if
+        not specified.
+    """)
+
+    parser.add_argument('--error-rate', default=0.0, type=float, metavar='FRACTION', help="""
+        (Optional). The fraction of requests answered with a random 5xx
+        error. Defaults to 0 if not specified.
+    """)
+
+    parser.add_argument('--page-size', default=LIMIT[1], type=int, metavar='N', help=f"""
+        (Optional). The largest number of bars per page. Defaults to
+        {LIMIT[1]} if not specified.
+    """)
+
+    parser.add_argument('--record', default=None, type=str, metavar='DIR', help="""
+        (Optional). Forward requests to --upstream and record the responses
+        in this directory.
+    """)
+
+    parser.add_argument('--replay', default=None, type=str, metavar='DIR', help="""
+        (Optional). Serve the responses recorded in this directory instead of
+        synthetic aggregates.
+    """)
+
+    parser.add_argument('--upstream', default='https://api.polygon.io', type=str, metavar='URL', help="""
+        (Optional). The API requests are forwarded to with --record. Defaults
+        to https://api.polygon.io if not specified.
+    """)
+
+    parser.add_argument('--seed', default=0, type=int, metavar='N', help="""
+        (Optional). The seed of the injected faults. Defaults to 0 if not
+        specified.
+    """)
+
+    args = parser.parse_args()
+
+    faults = Faults(
+        latency=args.latency / 1000,
+        jitter=args.jitter / 1000,
+        rate=args.rate,
+        burst=args.burst,
+        error_rate=args.error_rate,
+        retry_after=args.retry_after,
+        seed=args.seed,
+    )
+
+    ReplayServer(
+        host=args.host,
+        port=args.port,
+        faults=faults,
+        page_size=args.page_size,
+        record=args.record,
+        replay=args.replay,
+        upstream=args.upstream,
+    ).serve_forever()
+
+if __name__ == '__main__':
+    main()
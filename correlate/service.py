@@ -0,0 +1,441 @@
+
+from collections import (OrderedDict)
+from concurrent.futures import (Executor, Future)
+from datetime import (datetime)
+from http.server import (BaseHTTPRequestHandler, ThreadingHTTPServer)
+from typing import (Any, Dict, Final, List, Optional, Self, Tuple, Type, Union)
+from urllib.parse import (parse_qs, urlsplit)
+
+import json
+import numpy as np
+import queue
+import threading
+import time
+
+from args import (dateformat)
+from cache import (FitCache)
+from ewma import (DECAY)
+from pipeline import (fit_window, union)
+from streaming import (StreamingFit)
+from util.client import (PolygonClient)
+from util.logs import (logger)
+from util.metrics import (Counter, counter, prometheus)
+from util.pairs import (collect, stream)
+from util.returns import (returns)
+from util.serialize import (Query, encode)
+from util.session import (restrict)
+
+
+# The queries answered by the service, by whether their output was memoized,
+# advanced from the state of an earlier fit, or fitted.
+QUERIES: Final[Counter] = counter('correlate_service_queries_total', 'The queries answered by the service, by result (hit, warm or miss).')
+
+
+class CorrelationService:
+    """
+    Answers queries for the correlation matrix of a universe of tickers over
+    a window, keeping the fitted models of recent queries in memory.
+
+    Queries are answered in batches: the queries of a batch that share a
+    window are fitted together, so the returns of the union of their tickers
+    are loaded once and each ticker's GARCH model is fitted once (see
+    'pipeline.fit_window'). The output of windows that have already ended is
+    kept in a least recently used map of up to 'max_fits' entries, so
+    repeated queries are answered without touching the store or refitting.
+
+    Windows that are still open keep the state of the GARCH and DCC
+    recursions at their newest return instead (see 'StreamingFit'), in a
+    second map of up to 'max_fits' entries. A repeated query loads the
+    window's returns from the store and only advances the recursions over
+    the returns added since, with the fitted parameters frozen, until enough
+    returns were added that the window is refitted.
+    """
+
+    def __init__(
+            self: Self,
+            client: PolygonClient,
+            executor: Optional[Executor] = None,
+            cache: Optional[FitCache] = None,
+            column: str = 'close',
+            timespan: str = 'hour',
+            kind: str = 'simple',
+            missing: str = 'drop',
+            session: str = 'all',
+            calendar: str = 'XNYS',
+            max_fits: int = 4096,
+            **kwargs: Any,
+        ) -> None:
+
+        self._client = client
+        self._executor = executor
+        self._cache = cache
+        self._column = column
+        self._timespan = timespan
+        self._kind = kind
+        self._missing = missing
+        self._session = session
+        self._calendar = calendar
+        self._max_fits = max_fits
+        self._kwargs = kwargs
+
+        self._fits: OrderedDict[Query, Dict[str, Any]] = OrderedDict()
+        self._warm: OrderedDict[Query, StreamingFit] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self: Self) -> int:
+        return len(self._fits)
+
+    def _get(self: Self, query: Query) -> Optional[Dict[str, Any]]:
+        """
+        Returns the memoized output of 'query', or None if there is none.
+        """
+
+        fit = self._fits.get(query)
+
+        if fit is not None:
+            self._fits.move_to_end(query)
+
+        return fit
+
+    def _put(self: Self, query: Query, fit: Dict[str, Any], r: np.ndarray) -> None:
+        """
+        Memoizes the output of 'query' if its window has ended, or else keeps
+        the state of its models over the returns 'r' they were fitted to,
+        evicting the least recently used entry if either map is full.
+        """
+
+        if query[2].timestamp() > time.time():
+            # Bars may still be added to the window. The correlations of
+            # every step are only known by refitting.
+            if self._kwargs.get('steps', False):
+                return
+
+            self._warm[query] = StreamingFit(
+                fit,
+                r,
+                model=self._kwargs.get('model', 'dcc'),
+                p=self._kwargs.get('p', 1),
+                q=self._kwargs.get('q', 1),
+                decay=self._kwargs.get('decay', DECAY),
+            )
+
+            while len(self._warm) > self._max_fits:
+                self._warm.popitem(last=False)
+
+            return
+
+        self._warm.pop(query, None)
+        self._fits[query] = fit
+
+        while len(self._fits) > self._max_fits:
+            self._fits.popitem(last=False)
+
+    def _advance(self: Self, query: Query, r: np.ndarray) -> Optional[Dict[str, Any]]:
+        """
+        Returns the output of 'query' advanced over the new returns of 'r',
+        the returns of its window, or None if it has no state to advance or
+        must be refitted.
+        """
+
+        warm = self._warm.get(query)
+
+        if warm is None or not warm.advance(r):
+            return None
+
+        self._warm.move_to_end(query)
+
+        fit = warm.output()
+
+        top_k = self._kwargs.get('top_k')
+        threshold = self._kwargs.get('threshold')
+
+        if top_k is not None or threshold is not None:
+            fit['pairs'] = collect(stream([fit['R']], k=top_k, threshold=threshold, start=fit['nobs'] - 1))
+
+        return fit
+
+    def query(self: Self, queries: List[Query]) -> List[Union[Dict[str, Any], Exception]]:
+        """
+        Answers a batch of 'queries'.
+
+        :return: The output of each query in the order given, as the fitted
+            DCC parameters 'ab', the final correlation matrix 'R' and the fit
+            diagnostics, or the exception raised while fitting its window.
+        """
+
+        with self._lock:
+            answers: Dict[Query, Union[Dict[str, Any], Exception]] = {}
+            pending: Dict[Tuple[datetime, datetime], List[Tuple[str, ...]]] = {}
+
+            for query in dict.fromkeys(queries):
+                fit = self._get(query)
+
+                if fit is not None:
+                    QUERIES.inc(result='hit')
+
+                    answers[query] = fit
+                else:
+                    pending.setdefault(query[1:], []).append(query[0])
+
+            for (t0, t1), universes in pending.items():
+                tickers = union(universes)
+
+                try:
+                    panel = self._client.fetch_panel(
+                        tickers=tickers,
+                        t0=t0,
+                        t1=t1,
+                        column=self._column,
+                        timespan=self._timespan,
+                    )
+
+                    panel, mask = restrict(panel, session=self._session, timespan=self._timespan, default=self._calendar)
+                    r, _ = returns(panel, kind=self._kind, missing=self._missing, mask=mask)
+
+                    cold = []
+
+                    for universe in universes:
+                        fit = self._advance((universe, t0, t1), r[[tickers.index(ticker) for ticker in universe]])
+
+                        QUERIES.inc(result='miss' if fit is None else 'warm')
+
+                        if fit is not None:
+                            answers[(universe, t0, t1)] = fit
+                        else:
+                            cold.append(universe)
+
+                    fits = fit_window(
+                        r,
+                        tickers=tickers,
+                        universes=[list(universe) for universe in cold],
+                        executor=self._executor,
+                        cache=self._cache,
+                        **self._kwargs,
+                    ) if len(cold) > 0 else []
+                except Exception as e:
+                    logger.exception(f'CorrelationService.query(t0={t0}, t1={t1}): {e}')
+
+                    for universe in universes:
+                        answers.setdefault((universe, t0, t1), e)
+
+                    continue
+
+                for universe, fit in zip(cold, fits):
+                    self._put((universe, t0, t1), fit, r[[tickers.index(ticker) for ticker in universe]])
+                    answers[(universe, t0, t1)] = fit
+
+            return [answers[query] for query in queries]
+
+
+class Batcher:
+    """
+    Collects the queries submitted by concurrent requests and answers them
+    together. Once a query arrives, the batcher waits up to 'delay' seconds
+    for more, up to 'max_size' queries, before passing the batch to the
+    service on its own thread.
+    """
+
+    def __init__(self: Self, service: CorrelationService, delay: float = 0.005, max_size: int = 256) -> None:
+        self._service = service
+        self._delay = delay
+        self._max_size = max_size
+
+        self._queue: queue.Queue[Tuple[List[Query], Future]] = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='batcher', daemon=True)
+        self._thread.start()
+
+    @property
+    def service(self: Self) -> CorrelationService:
+        """
+        Get the service answering the batches.
+        """
+
+        return self._service
+
+    def submit(self: Self, queries: List[Query]) -> Future:
+        """
+        Queues 'queries' for the next batch, and returns a future of their
+        output (see 'CorrelationService.query').
+        """
+
+        future = Future()
+
+        self._queue.put((queries, future))
+
+        return future
+
+    def _run(self: Self) -> None:
+        while not self._stop.is_set():
+            try:
+                batch = [self._queue.get(timeout=0.1)]
+            except queue.Empty:
+                continue
+
+            size = len(batch[0][0])
+            deadline = time.monotonic() + self._delay
+
+            while size < self._max_size:
+                timeout = deadline - time.monotonic()
+
+                if timeout <= 0:
+                    break
+
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+
+                batch.append(item)
+                size += len(item[0])
+
+            logger.debug(f'Batcher._run(): answering {size} queries from {len(batch)} requests')
+
+            queries = [query for qs, _ in batch for query in qs]
+
+            try:
+                answers = self._service.query(queries)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+
+                continue
+
+            i = 0
+
+            for qs, future in batch:
+                future.set_result(answers[i:i + len(qs)])
+                i += len(qs)
+
+    def close(self: Self) -> None:
+        """
+        Stops the batching thread once the current batch is answered.
+        """
+
+        self._stop.set()
+        self._thread.join()
+
+
+def decode(obj: Dict[str, Any]) -> Query:
+
+    """
+    Returns the query described by the JSON object 'obj', with the 'tickers'
+    of the universe and the 'start' and 'end' of the window.
+    """
+
+    tickers = obj['tickers']
+
+    if isinstance(tickers, str):
+        tickers = tickers.replace(',', ' ').split()
+
+    if len(tickers) < 2:
+        raise ValueError(f"Invalid tickers: {tickers}. Must be at least two tickers.")
+
+    return (tuple(tickers), dateformat(obj['start']), dateformat(obj['end']))
+
+def handler(batcher: Batcher) -> Type[BaseHTTPRequestHandler]:
+
+    """
+    Returns the HTTP request handler answering queries through 'batcher'.
+
+    The handler serves:
+
+        GET  /health                                     the service status
+        GET  /metrics                                    the metrics, in the
+                                                         Prometheus text format
+        GET  /correlation?tickers=A,B&start=...&end=...  a single query
+        POST /correlation                                a JSON list of queries,
+                                                         or {"queries": [...]}
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def _send(self: Self, status: int, obj: Any) -> None:
+            body = json.dumps(obj).encode()
+
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _answer(self: Self, queries: List[Query]) -> List[Dict[str, Any]]:
+            answers = batcher.submit(queries).result()
+
+            return [encode(query, answer) for query, answer in zip(queries, answers)]
+
+        def do_GET(self: Self) -> None:
+            url = urlsplit(self.path)
+
+            if url.path == '/health':
+                return self._send(200, {'status': 'ok', 'fits': len(batcher.service)})
+
+            if url.path == '/metrics':
+                body = prometheus().encode()
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+                return
+
+            if url.path != '/correlation':
+                return self._send(404, {'error': f'unknown path {url.path}'})
+
+            try:
+                params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                query = decode(params)
+            except (KeyError, ValueError) as e:
+                return self._send(400, {'error': f'invalid query: {e}'})
+
+            self._send(200, self._answer([query])[0])
+
+        def do_POST(self: Self) -> None:
+            url = urlsplit(self.path)
+
+            if url.path != '/correlation':
+                return self._send(404, {'error': f'unknown path {url.path}'})
+
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+
+                if isinstance(body, dict):
+                    body = body['queries']
+
+                queries = [decode(obj) for obj in body]
+            except (KeyError, TypeError, ValueError) as e:
+                return self._send(400, {'error': f'invalid query: {e}'})
+
+            self._send(200, self._answer(queries))
+
+        def log_message(self: Self, format: str, *args: Any) -> None:
+            logger.debug(f'{self.address_string()} {format % args}')
+
+    return Handler
+
+def serve(address: str, service: CorrelationService, delay: float = 0.005) -> None:
+
+    """
+    Serves 'service' over HTTP on 'address', given as 'HOST:PORT', until
+    interrupted.
+    """
+
+    host, _, port = address.rpartition(':')
+
+    if not port.isdigit():
+        raise ValueError(f"Invalid address: {address}. Must be 'HOST:PORT'.")
+
+    batcher = Batcher(service, delay=delay)
+    server = ThreadingHTTPServer((host or '127.0.0.1', int(port)), handler(batcher))
+
+    logger.info(f'serve(address={address}): listening on http://{server.server_address[0]}:{server.server_address[1]}')
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.close()
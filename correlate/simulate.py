@@ -0,0 +1,343 @@
+
+from argparse import (ArgumentParser)
+from datetime import (datetime, timezone)
+from typing import (Dict, Final, Iterator, List, Optional, Self, Tuple)
+
+import numpy as np
+import time
+
+from args import (dateformat)
+from util.logs import (logger)
+from util.ohlcv import (OHLCVBatch)
+
+import util.storage as storage
+
+
+# The length of a bar over each timespan the simulator can write, in seconds.
+STEPS: Final[Dict[str, int]] = {
+    'minute': 60,
+    'hour': 3600,
+    'day': 86400,
+}
+
+# The largest number of assets whose correlations are simulated exactly. The
+# exact recursion factors an (n, n) matrix per bar, so larger universes are
+# driven by 'DEFAULT_FACTORS' latent factors instead.
+EXACT_MAX: Final[int] = 64
+
+# The number of latent factors driving the correlations of large universes.
+DEFAULT_FACTORS: Final[int] = 8
+
+
+class Simulator:
+    """
+    Simulates the returns of 'n' assets whose volatilities follow GJR-GARCH(1,
+    1) processes and whose correlations follow DCC(1, 1) dynamics.
+
+    Each asset's GARCH parameters are given as rows of 'theta', in the layout
+    of 'GARCH.theta' ([w, alpha, gamma, beta]), or drawn at random. With
+    'factors' set, or for more than 'EXACT_MAX' assets by default, the DCC
+    recursion drives 'factors' latent factors, and each asset's standardized
+    residual is its loadings on the factors plus idiosyncratic noise, so the
+    work per bar grows linearly in 'n'. Otherwise the recursion runs on the
+    assets themselves.
+
+    Every operation is vectorized across assets; only the recursions loop
+    over time. Returns are generated in chunks of bars, so memory stays
+    bounded however many bars are simulated, and the state of the recursions
+    is carried from one chunk to the next.
+    """
+
+    def __init__(
+            self: Self,
+            n: int,
+            theta: Optional[np.ndarray] = None,
+            ab: Tuple[float, float] = (0.05, 0.90),
+            factors: Optional[int] = None,
+            seed: int = 0,
+        ) -> None:
+
+        if ab[0] < 0 or ab[1] < 0 or ab[0] + ab[1] >= 1:
+            raise ValueError(f"Invalid DCC parameters: {ab}. Must be non-negative with a + b < 1.")
+
+        self._n = n
+        self._ab = ab
+        self._rng = np.random.default_rng(seed)
+
+        if theta is None:
+            alpha = self._rng.uniform(0.02, 0.08, n)
+            gamma = self._rng.uniform(0.00, 0.10, n)
+            persistence = self._rng.uniform(0.90, 0.98, n)
+            beta = persistence - alpha - 0.5 * gamma
+            w = (1.0 - persistence) * self._rng.uniform(0.5, 2.0, n) * 1e-4
+            theta = np.column_stack([w, alpha, gamma, beta])
+
+        self._theta = np.asarray(theta, dtype=np.float64).reshape(n, 4)
+
+        if factors is None and n > EXACT_MAX:
+            factors = DEFAULT_FACTORS
+
+        self._factors = factors
+        k = n if factors is None else factors
+
+        # The unconditional correlation of the series driven by the DCC
+        # recursion, from a random three-factor structure.
+        B = self._rng.uniform(-0.5, 0.8, (k, min(3, k)))
+        C = B @ B.T + np.diag(self._rng.uniform(0.2, 1.0, k))
+        d = np.sqrt(np.diag(C))
+        self._Qbar = C / np.outer(d, d)
+
+        if factors is not None:
+            # Loadings with row norms below one, so residuals have unit
+            # variance once the idiosyncratic noise is added.
+            loadings = self._rng.normal(0.0, 1.0, (n, k))
+            loadings *= (self._rng.uniform(0.3, 0.9, n) / np.linalg.norm(loadings, axis=1))[:, None]
+            self._loadings = loadings
+            self._idiosyncratic = np.sqrt(1.0 - np.sum(loadings ** 2, axis=1))
+
+        # The state of the recursions.
+        w, alpha, gamma, beta = self._theta.T
+
+        self._Q = self._Qbar.copy()
+        self._e = np.zeros(k)
+        self._r = np.zeros(n)
+        self._sigma2 = w / (1.0 - alpha - 0.5 * gamma - beta)
+
+    @property
+    def n(self: Self) -> int:
+        """
+        Get the number of simulated assets.
+        """
+
+        return self._n
+
+    @property
+    def theta(self: Self) -> np.ndarray:
+        """
+        Get the (n, 4) GARCH parameters of the assets.
+        """
+
+        return self._theta
+
+    @property
+    def ab(self: Self) -> Tuple[float, float]:
+        """
+        Get the DCC parameters of the correlation dynamics.
+        """
+
+        return self._ab
+
+    def correlation(self: Self) -> np.ndarray:
+        """
+        Returns the current conditional correlation matrix of the series
+        driven by the DCC recursion: the assets themselves, or the latent
+        factors.
+        """
+
+        d = np.sqrt(np.diag(self._Q))
+
+        return self._Q / np.outer(d, d)
+
+    def _residuals(self: Self, size: int) -> np.ndarray:
+        """
+        Advances the DCC recursion by 'size' bars, and returns the (size, n)
+        standardized residuals of the assets.
+        """
+
+        a, b = self._ab
+        c = (1.0 - a - b) * self._Qbar
+        u = self._rng.standard_normal((size, len(self._e)))
+        e = np.empty_like(u)
+
+        Q, e_prev = self._Q, self._e
+
+        for t in range(size):
+            Q = c + a * np.outer(e_prev, e_prev) + b * Q
+            d = np.sqrt(np.diag(Q))
+            L = np.linalg.cholesky(Q / np.outer(d, d))
+            e_prev = e[t] = L @ u[t]
+
+        self._Q, self._e = Q, e_prev
+
+        if self._factors is None:
+            return e
+
+        return e @ self._loadings.T + self._idiosyncratic * self._rng.standard_normal((size, self._n))
+
+    def returns(self: Self, T: int, chunk: int = 65536) -> Iterator[np.ndarray]:
+        """
+        Simulates 'T' bars, yielding their returns in chunks of up to 'chunk'
+        bars, as (n, size) arrays ordered from the oldest to the newest bar.
+        """
+
+        w, alpha, gamma, beta = self._theta.T
+
+        for start in range(0, T, chunk):
+            size = min(chunk, T - start)
+            epsilon = self._residuals(size)
+            r = np.empty((size, self._n))
+
+            r_prev, sigma2 = self._r, self._sigma2
+
+            for t in range(size):
+                sigma2 = w + (alpha + gamma * (r_prev < 0)) * r_prev ** 2 + beta * sigma2
+                r_prev = r[t] = np.sqrt(sigma2) * epsilon[t]
+
+            self._r, self._sigma2 = r_prev, sigma2
+
+            yield np.ascontiguousarray(r.T)
+
+    def bars(
+            self: Self,
+            tickers: List[str],
+            T: int,
+            t0: int,
+            timespan: str = 'hour',
+            chunk: int = 65536,
+            price: float = 100.0,
+        ) -> Iterator[List[OHLCVBatch]]:
+
+        """
+        Simulates 'T' bars over 'timespan' starting at the epoch second 't0',
+        yielding each chunk as one 'OHLCVBatch' per ticker of 'tickers'. The
+        returns are log returns of the close, bars open at the previous close
+        and their ranges grow with the volatility of the asset.
+        """
+
+        if timespan not in STEPS:
+            raise ValueError(f"Invalid timespan: {timespan}. Must be one of {', '.join(STEPS)}.")
+
+        if len(tickers) != self._n:
+            raise ValueError(f"Invalid tickers: {len(tickers)} tickers for {self._n} assets.")
+
+        step = STEPS[timespan]
+        close = np.full(self._n, price)
+        start = 0
+
+        for r in self.returns(T, chunk=chunk):
+            size = r.shape[1]
+
+            c = close[:, None] * np.exp(np.cumsum(r, axis=1))
+            o = np.concatenate([close[:, None], c[:, :-1]], axis=1)
+            spread = np.exp(np.abs(self._rng.normal(0.0, 0.5, (self._n, size))) * np.abs(r))
+            h = np.maximum(o, c) * spread
+            l = np.minimum(o, c) / spread
+            v = np.round(self._rng.lognormal(10.0, 1.0, (self._n, size)))
+            t = t0 + step * (start + np.arange(size, dtype=np.int64))
+
+            yield [
+                OHLCVBatch(symbol=ticker, t=t, open=o[i], high=h[i], low=l[i], close=c[i], volume=v[i])
+                for i, ticker in enumerate(tickers)
+            ]
+
+            close = c[:, -1]
+            start += size
+
+
+def write(
+        simulator: Simulator,
+        tickers: List[str],
+        T: int,
+        t0: datetime,
+        timespan: str = 'hour',
+        chunk: int = 65536,
+    ) -> int:
+
+    """
+    Simulates 'T' bars for 'tickers' starting at 't0', and writes them to the
+    selected storage backend as aggregates over 'timespan', one chunk at a
+    time, along with the range each chunk covers, so that the client reads
+    them instead of fetching them. Returns the number of bars written.
+    """
+
+    written = 0
+    start = time.perf_counter()
+
+    for batches in simulator.bars(tickers, T, int(t0.timestamp()), timespan=timespan, chunk=chunk):
+        for batch in batches:
+            c0 = datetime.fromtimestamp(int(batch.t[0]), timezone.utc)
+            c1 = datetime.fromtimestamp(int(batch.t[-1]) + STEPS[timespan] - 1, timezone.utc)
+
+            storage.backend().insert_bars(batch=batch, t0=c0, t1=c1, timespan=timespan)
+
+        written += sum(len(batch) for batch in batches)
+
+        logger.info(f'write(T={T}): {written} bars written, {written / (time.perf_counter() - start):.0f} bars/s')
+
+    return written
+
+def main() -> None:
+    parser = ArgumentParser(
+        prog='simulate',
+        description="""
+            Simulate GJR-GARCH returns with DCC correlation dynamics, and
+            write them as OHLCV bars to the local store, so that 'correlate'
+            can run against them offline.
+        """,
+        allow_abbrev=False,
+    )
+
+    parser.add_argument('--tickers', default=10, type=int, metavar='N', help="""
+        (Optional). The number of simulated tickers, named with '--prefix'.
+        Defaults to 10 if not specified.
+    """)
+
+    parser.add_argument('--prefix', default='SIM', type=str, metavar='PREFIX', help="""
+        (Optional). The prefix of the simulated tickers' names. Defaults to
+        'SIM' if not specified.
+    """)
+
+    parser.add_argument('--bars', default=10000, type=int, metavar='T', help="""
+        (Optional). The number of bars to simulate per ticker. Defaults to
+        10000 if not specified.
+    """)
+
+    parser.add_argument('--start', default='2024-01-01', type=dateformat, metavar='YYYY-mm-dd', help="""
+        (Optional). The date of the first bar in ISO-8601 format. Defaults to
+        2024-01-01 if not specified.
+    """)
+
+    parser.add_argument('--timespan', default='hour', type=str, metavar='TIMESPAN', choices=list(STEPS), help="""
+        (Optional). The timespan of the bars. Defaults to 'hour' if not
+        specified.
+    """)
+
+    parser.add_argument('--factors', default=None, type=int, metavar='K', help=f"""
+        (Optional). The number of latent factors driving the correlations.
+        Defaults to exact correlations for up to {EXACT_MAX} tickers, and to
+        {DEFAULT_FACTORS} factors otherwise.
+    """)
+
+    parser.add_argument('--ab', default=(0.05, 0.90), type=float, nargs=2, metavar=('A', 'B'), help="""
+        (Optional). The DCC parameters of the correlation dynamics. Defaults
+        to 0.05 0.90 if not specified.
+    """)
+
+    parser.add_argument('--chunk', default=65536, type=int, metavar='N', help="""
+        (Optional). The number of bars simulated at a time. Defaults to 65536
+        if not specified.
+    """)
+
+    parser.add_argument('--seed', default=0, type=int, metavar='N', help="""
+        (Optional). The seed of the random number generator. Defaults to 0 if
+        not specified.
+    """)
+
+    parser.add_argument('--store', default='sqlite', type=str, metavar='BACKEND', choices=list(storage.BACKENDS), help="""
+        (Optional). The storage backend the bars are written to. Defaults to
+        'sqlite' if not specified.
+    """)
+
+    args = parser.parse_args()
+
+    storage.use(args.store).init()
+
+    tickers = [f"{args.prefix}{i:04d}" for i in range(args.tickers)]
+    simulator = Simulator(n=args.tickers, ab=tuple(args.ab), factors=args.factors, seed=args.seed)
+
+    written = write(simulator, tickers, args.bars, args.start, timespan=args.timespan, chunk=args.chunk)
+
+    print(f"{written} bars written for {' '.join(tickers[:5])}{' ...' if len(tickers) > 5 else ''}")
+
+if __name__ == '__main__':
+    main()
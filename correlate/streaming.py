@@ -0,0 +1,163 @@
+
+from typing import (Any, Dict, Final, Self)
+
+import numpy as np
+
+from dcc_loss import (Q_average)
+from ewma import (DECAY)
+from garch_loss import (garch_process)
+
+# The share of new returns, relative to those a model was fitted to, beyond
+# which a streaming fit is refitted instead of advanced, as its parameters
+# are frozen at the fit.
+REFIT: Final[float] = 0.25
+
+
+class StreamingFit(object):
+    """
+    The state of the GARCH and DCC recursions at the end of a fitted window,
+    advanced by the returns added to the window since the fit, with the
+    parameters of the fit frozen.
+
+    Each ticker's volatility follows the GARCH recursion of 'garch_process'
+    from its last 'p' volatilities and 'q' returns, and the correlations
+    follow the DCC recursion of 'dcc_loss.R_iter' from the last 'Q' and
+    standardized residual. The average 'Q' of the recursion stays that of the
+    window the models were fitted to. The 'ewma' model is the same recursion
+    on the raw returns, with a = 1 - decay and b = decay.
+
+    Advancing over the new returns of an open window costs O(n^2) per return,
+    instead of refitting every model of the window.
+    """
+
+    def __init__(
+            self: Self,
+            fit: Dict[str, Any],
+            returns: np.ndarray,
+            model: str = 'dcc',
+            p: int = 1,
+            q: int = 1,
+            decay: float = DECAY,
+        ) -> None:
+
+        """
+        Runs the recursions of the models of 'fit', the output of
+        'pipeline.fit_window' for one universe, over the (n, T) 'returns' they
+        were fitted to, newest first.
+        """
+
+        self._fit = fit
+        self._returns = returns
+        self._garch = model != 'ewma'
+        self._p = p
+        self._q = q
+
+        if self._garch:
+            self._thetas = np.asarray(fit['thetas'])
+            self._ab = np.asarray(fit['ab'])
+
+            sigma = np.array([garch_process(r, theta, p, q) for r, theta in zip(returns, self._thetas)])
+        else:
+            self._thetas = None
+            self._ab = np.array([1.0 - decay, decay])
+
+            sigma = np.ones_like(returns)
+
+        # The last volatilities and returns, newest first, that the GARCH
+        # recursion of the next return depends on.
+        self._sigma = sigma[:, :p]
+        self._r = returns[:, :q]
+
+        e = returns / sigma
+        a, b = self._ab
+
+        self._Q_int = Q_average(e)
+        self._Q = self._Q_int
+
+        for t in range(e.shape[1] - 1, 0, -1):
+            self._Q = (1.0 - a - b) * self._Q_int + a * np.outer(e[:, t], e[:, t]) + b * self._Q
+
+        self._e = e[:, 0]
+
+    @property
+    def nobs(self: Self) -> int:
+        """
+        Get the number of returns the recursions have run over.
+        """
+
+        return self._returns.shape[1]
+
+    @property
+    def R(self: Self) -> np.ndarray:
+        """
+        Get the correlation matrix on the newest return.
+        """
+
+        d = 1.0 / np.sqrt(np.abs(np.diagonal(self._Q)))
+
+        return (d[:, None] * self._Q) * d[None, :]
+
+    def _step(self: Self, r: np.ndarray) -> None:
+        # Advances the recursions by the (n,) returns 'r' that follow the
+        # newest return.
+        if self._garch:
+            p, q = self._p, self._q
+
+            w = self._thetas[:, 0]
+            alpha = self._thetas[:, 1:1 + p]
+            gamma = self._thetas[:, 1 + p:1 + p + q]
+            beta = self._thetas[:, 1 + p + q:]
+
+            r_squared = self._r ** 2
+            sigma = np.sqrt(np.abs(
+                np.sum(beta * self._sigma ** 2, axis=1)
+                + np.sum(alpha * r_squared, axis=1)
+                + np.sum(gamma * r_squared * (self._r < 0), axis=1)
+                + w
+            ))
+
+            self._sigma = np.concatenate([sigma[:, None], self._sigma[:, :p - 1]], axis=1)
+            self._r = np.concatenate([r[:, None], self._r[:, :q - 1]], axis=1)
+
+            e = r / sigma
+        else:
+            e = r
+
+        a, b = self._ab
+
+        self._Q = (1.0 - a - b) * self._Q_int + a * np.outer(self._e, self._e) + b * self._Q
+        self._e = e
+
+    def advance(self: Self, returns: np.ndarray) -> bool:
+        """
+        Advances the recursions over the (n, T) 'returns' of the window,
+        newest first, that were added since they last ran.
+
+        :return: Whether the recursions were advanced. They are not if the
+            older returns differ from those they ran over, or if more than
+            'REFIT' new returns per return fitted were added, and the window
+            must then be refitted.
+        """
+
+        new = returns.shape[1] - self.nobs
+
+        if new < 0 or new > REFIT * self._fit['nobs']:
+            return False
+
+        if not np.array_equal(returns[:, new:], self._returns):
+            return False
+
+        for t in range(new - 1, -1, -1):
+            self._step(returns[:, t])
+
+        self._returns = returns
+
+        return True
+
+    def output(self: Self) -> Dict[str, Any]:
+        """
+        Returns the output of the fit with the correlation matrix 'R' and the
+        number of returns 'nobs' on the newest return.
+        """
+
+        return {**self._fit, 'R': self.R, 'nobs': self.nobs}
@@ -1,6 +1,41 @@
 
-from .client import *
-from .fetch import *
-from .logs import *
-from .ohlcv import *
-from .time import *
\ No newline at end of file
+from importlib import (import_module)
+from typing import (Any, Dict, Final, List)
+
+"""
+The utility modules are imported on first use of one of their names, so that
+importing 'util' or one of its lightweight submodules does not pull in the
+Polygon client or pandas.
+"""
+
+# The submodule defining each name exported by the package.
+EXPORTS: Final[Dict[str, str]] = {
+    'PolygonClient': 'client',
+    'logger': 'logs',
+    'handler': 'logs',
+    'formatter': 'logs',
+    'OHLCV_DTYPE': 'ohlcv',
+    'Model': 'ohlcv',
+    'OHLCV': 'ohlcv',
+    'OHLCVBatch': 'ohlcv',
+    'weekly': 'time',
+    'Calendar': 'calendar',
+    'CALENDARS': 'calendar',
+    'NYSE': 'calendar',
+    'restrict': 'session',
+    'encode': 'serialize',
+}
+
+__all__: List[str] = list(EXPORTS)
+
+def __getattr__(name: str) -> Any:
+    if name not in EXPORTS:
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+
+    value = getattr(import_module(f".{EXPORTS[name]}", __name__), name)
+    globals()[name] = value
+
+    return value
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,454 @@
+
+from datetime import (datetime, timezone)
+from typing import (Callable, Dict, Final, Iterator, Optional, Self, Tuple, Union)
+
+import numpy as np
+
+"""
+Vectorized trading calendars.
+
+A 'Calendar' computes the trading sessions of an exchange over any range of
+dates as NumPy 'datetime64[D]' arrays, from its weekmask and holiday rules,
+along with the UTC open and close of each session and the boundaries of
+daily, weekly, monthly, quarterly, yearly or custom windows of sessions.
+Holiday rules, Easter and daylight saving time are computed for whole arrays
+of years at once, so calendars over decades take microseconds to build.
+
+Window boundaries are naive datetimes in the same local time as the rest of
+the pipeline (see 'datetime.timestamp'), from the start of the first session
+day of the window to the last second of its last session day. Bars are split
+into windows with 'split', by binary search over their sorted timestamps.
+"""
+
+# The window frequencies accepted by 'Calendar.windows', besides a number of
+# sessions.
+FREQUENCIES: Final[Tuple[str, ...]] = ('day', 'week', 'month', 'quarter', 'year')
+
+# Days on which the NYSE closed outside of its regular holiday rules.
+NYSE_CLOSURES: Final[np.ndarray] = np.array([
+    '1972-12-28', # President Truman's funeral.
+    '1973-01-25', # President Johnson's funeral.
+    '1977-07-14', # New York City blackout.
+    '1985-09-27', # Hurricane Gloria.
+    '1994-04-27', # President Nixon's funeral.
+    '2001-09-11', # The attacks of September 11th.
+    '2001-09-12',
+    '2001-09-13',
+    '2001-09-14',
+    '2004-06-11', # President Reagan's funeral.
+    '2007-01-02', # President Ford's funeral.
+    '2012-10-29', # Hurricane Sandy.
+    '2012-10-30',
+    '2018-12-05', # President George H. W. Bush's funeral.
+    '2025-01-09', # President Carter's funeral.
+], dtype='datetime64[D]')
+
+
+def date(years: np.ndarray, months: Union[np.ndarray, int], days: Union[np.ndarray, int] = 1) -> np.ndarray:
+
+    """
+    Returns the dates of the given 'years', 'months' and 'days' of the month
+    as a 'datetime64[D]' array. Months beyond December roll over into the
+    following years.
+    """
+
+    years = np.asarray(years, dtype=np.int64)
+    months = np.asarray(months, dtype=np.int64)
+
+    month = (years - 1970) * 12 + (months - 1)
+
+    return month.astype('datetime64[M]').astype('datetime64[D]') + (np.asarray(days, dtype=np.int64) - 1)
+
+def weekday(dates: np.ndarray) -> np.ndarray:
+
+    """
+    Returns the day of the week of each of 'dates', from 0 for Monday to 6 for
+    Sunday.
+    """
+
+    return (np.asarray(dates, dtype='datetime64[D]').astype(np.int64) + 3) % 7
+
+def nth_weekday(years: np.ndarray, month: int, day: int, n: int) -> np.ndarray:
+
+    """
+    Returns the 'n'-th weekday 'day' (0 for Monday) of 'month' in each of
+    'years', or the last one if 'n' is negative.
+    """
+
+    if n > 0:
+        first = date(years, month)
+
+        return first + (day - weekday(first)) % 7 + 7 * (n - 1)
+
+    last = date(years, month + 1) - 1
+
+    return last - (weekday(last) - day) % 7 + 7 * (n + 1)
+
+def easter(years: np.ndarray) -> np.ndarray:
+
+    """
+    Returns the date of Easter Sunday in each of 'years' of the Gregorian
+    calendar, by the anonymous Gregorian algorithm.
+    """
+
+    y = np.asarray(years, dtype=np.int64)
+
+    a = y % 19
+    b, c = y // 100, y % 100
+    d, e = b // 4, b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    n = h + l - 7 * m + 114
+
+    return date(y, n // 31, n % 31 + 1)
+
+def observed(dates: np.ndarray) -> np.ndarray:
+
+    """
+    Returns the days on which holidays falling on 'dates' are observed: the
+    preceding Friday for a Saturday, and the following Monday for a Sunday.
+    """
+
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    day = weekday(dates)
+
+    return dates - (day == 5) + (day == 6)
+
+def nyse_holidays(years: np.ndarray) -> np.ndarray:
+
+    """
+    Returns the sorted full-day holidays of the New York Stock Exchange in
+    'years', by the rules in force since 1971 along with the years each rule
+    was introduced, and its unscheduled closures.
+    """
+
+    y = np.asarray(years, dtype=np.int64)
+
+    # New Year's Day is not observed on the preceding Friday when it falls
+    # on a Saturday.
+    new_year = date(y, 1, 1)
+    new_year = observed(new_year[weekday(new_year) != 5])
+
+    juneteenth = y[y >= 2022]
+
+    days = np.concatenate([
+        new_year,
+        nth_weekday(y[y >= 1998], 1, 0, 3), # Martin Luther King Jr. Day.
+        nth_weekday(y, 2, 0, 3),            # Washington's Birthday.
+        easter(y) - 2,                      # Good Friday.
+        nth_weekday(y, 5, 0, -1),           # Memorial Day.
+        observed(date(juneteenth, 6, 19)),  # Juneteenth.
+        observed(date(y, 7, 4)),            # Independence Day.
+        nth_weekday(y, 9, 0, 1),            # Labor Day.
+        nth_weekday(y, 11, 3, 4),           # Thanksgiving Day.
+        observed(date(y, 12, 25)),          # Christmas Day.
+        NYSE_CLOSURES[np.isin(NYSE_CLOSURES.astype('datetime64[Y]').astype(np.int64) + 1970, y)],
+    ])
+
+    return np.unique(days)
+
+def nyse_early_closes(years: np.ndarray) -> np.ndarray:
+
+    """
+    Returns the candidate early-close days of the New York Stock Exchange in
+    'years': the eve of Independence Day, the day after Thanksgiving and
+    Christmas Eve. Those that are not sessions are dropped by the calendar.
+    """
+
+    y = np.asarray(years, dtype=np.int64)
+
+    return np.unique(np.concatenate([
+        date(y, 7, 3),
+        nth_weekday(y, 11, 3, 4) + 1,
+        date(y, 12, 24),
+    ]))
+
+def us_dst(years: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+
+    """
+    Returns the first and last days of daylight saving time in the United
+    States in each of 'years', by the rules of 1967, 1987 and 2007.
+    """
+
+    y = np.asarray(years, dtype=np.int64)
+
+    start = np.where(y >= 2007, nth_weekday(y, 3, 6, 2), np.where(y >= 1987, nth_weekday(y, 4, 6, 1), nth_weekday(y, 4, 6, -1)))
+    end = np.where(y >= 2007, nth_weekday(y, 11, 6, 1), nth_weekday(y, 10, 6, -1))
+
+    return start, end - 1
+
+def split(t: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+
+    """
+    Returns the index bounds [i0, i1) of the bars of each window [start, end]
+    in the sorted epoch-second timestamps 't', so that the bars of window k
+    are 't[i0[k]:i1[k]]'. Bounds are epoch seconds, or 'datetime64' arrays
+    read as UTC.
+    """
+
+    t = np.asarray(t, dtype=np.int64)
+
+    def seconds(x: np.ndarray) -> np.ndarray:
+        x = np.asarray(x)
+
+        return x.astype('datetime64[s]').astype(np.int64) if np.issubdtype(x.dtype, np.datetime64) else x.astype(np.int64)
+
+    return np.searchsorted(t, seconds(starts), side='left'), np.searchsorted(t, seconds(ends), side='right')
+
+class Calendar:
+    """
+    The trading calendar of an exchange: its trading days by 'weekmask' (as
+    for 'numpy.busday_offset', Monday first) and 'holidays', the local 'open'
+    and 'close' times of its sessions in minutes after midnight, an earlier
+    close on the days given by 'early_closes', the 'extended' (pre-market and
+    after-hours) session around the regular one, and its time zone as a
+    standard 'utc_offset' in minutes with an optional 'dst' rule moving it an
+    hour forward.
+    """
+
+    def __init__(
+            self: Self,
+            name: str,
+            holidays: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+            weekmask: str = '1111100',
+            open: int = 0,
+            close: int = 24 * 60,
+            early_close: Optional[int] = None,
+            early_closes: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+            extended: Optional[Tuple[int, int]] = None,
+            utc_offset: int = 0,
+            dst: Optional[Callable[[np.ndarray], Tuple[np.ndarray, np.ndarray]]] = None,
+        ) -> None:
+
+        if not 0 <= open < close <= 24 * 60:
+            raise ValueError(f"Invalid session: {open}-{close}. Must be within a day, in minutes after midnight.")
+
+        if extended is not None and not 0 <= extended[0] <= open < close <= extended[1] <= 24 * 60:
+            raise ValueError(f"Invalid extended session: {extended[0]}-{extended[1]}. Must be within a day and contain {open}-{close}.")
+
+        self._name = name
+        self._holidays = holidays
+        self._weekmask = weekmask
+        self._open = open
+        self._close = close
+        self._early_close = early_close
+        self._early_closes = early_closes
+        self._extended = extended
+        self._utc_offset = utc_offset
+        self._dst = dst
+
+    def __repr__(self: Self) -> str:
+        return f"Calendar(name={self._name})"
+
+    @property
+    def name(self: Self) -> str:
+        """
+        Get the name of the calendar.
+        """
+
+        return self._name
+
+    @staticmethod
+    def _years(start: np.datetime64, end: np.datetime64) -> np.ndarray:
+        y0, y1 = (np.datetime64(x, 'Y').astype(np.int64) + 1970 for x in (start, end))
+
+        return np.arange(y0, y1 + 1)
+
+    @staticmethod
+    def _naive(t: datetime) -> datetime:
+        # NumPy has no time zones, so aware datetimes are taken in UTC.
+        return t.astimezone(timezone.utc).replace(tzinfo=None) if t.tzinfo is not None else t
+
+    @staticmethod
+    def _days(t: Union[datetime, np.datetime64, str]) -> np.datetime64:
+        return np.datetime64(t, 'D') if not isinstance(t, datetime) else np.datetime64(t.date(), 'D')
+
+    def holidays(self: Self, start: Union[datetime, np.datetime64, str], end: Union[datetime, np.datetime64, str]) -> np.ndarray:
+
+        """
+        Returns the holidays between the days of 'start' and 'end', inclusive.
+        """
+
+        start, end = self._days(start), self._days(end)
+
+        if self._holidays is None:
+            return np.array([], dtype='datetime64[D]')
+
+        days = self._holidays(self._years(start, end))
+
+        return days[(days >= start) & (days <= end)]
+
+    def sessions(self: Self, start: Union[datetime, np.datetime64, str], end: Union[datetime, np.datetime64, str]) -> np.ndarray:
+
+        """
+        Returns the trading days between the days of 'start' and 'end',
+        inclusive, as a 'datetime64[D]' array.
+        """
+
+        start, end = self._days(start), self._days(end)
+
+        if end < start:
+            return np.array([], dtype='datetime64[D]')
+
+        days = np.arange(start, end + 1, dtype='datetime64[D]')
+
+        return days[np.is_busday(days, weekmask=self._weekmask, holidays=self.holidays(start, end))]
+
+    def utc_offsets(self: Self, days: np.ndarray) -> np.ndarray:
+
+        """
+        Returns the offset of local time from UTC in minutes on each of
+        'days', at the open of their sessions.
+        """
+
+        days = np.asarray(days, dtype='datetime64[D]')
+        offsets = np.full(days.shape, self._utc_offset, dtype=np.int64)
+
+        if self._dst is not None and days.size > 0:
+            years = days.astype('datetime64[Y]').astype(np.int64) + 1970
+            first = years.min()
+            start, end = self._dst(np.arange(first, years.max() + 1))
+
+            i = years - first
+            offsets += 60 * ((days >= start[i]) & (days <= end[i]))
+
+        return offsets
+
+    def opens_closes(self: Self, days: np.ndarray, extended: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+
+        """
+        Returns the UTC open and close of the sessions on 'days' as
+        'datetime64[s]' arrays, of the regular sessions or of the 'extended'
+        ones, which are the regular sessions for calendars without extended
+        hours. On early-close days the extended session closes as much later
+        than the early close as it usually does after the regular close.
+        """
+
+        days = np.asarray(days, dtype='datetime64[D]')
+
+        open, close = self._open, self._close
+
+        if extended and self._extended is not None:
+            open, close = self._extended
+
+        closes = np.full(days.shape, close, dtype=np.int64)
+
+        if self._early_closes is not None and self._early_close is not None and days.size > 0:
+            early = self._early_closes(self._years(days.min(), days.max()))
+            closes[np.isin(days, early)] = self._early_close + (close - self._close)
+
+        midnight = days.astype('datetime64[s]') - self.utc_offsets(days).astype('timedelta64[m]')
+
+        return midnight + np.timedelta64(open, 'm'), midnight + closes.astype('timedelta64[m]')
+
+    def windows(
+            self: Self,
+            t0: datetime,
+            t1: datetime,
+            every: Union[str, int] = 'week',
+        ) -> Tuple[np.ndarray, np.ndarray]:
+
+        """
+        Returns the bounds of the windows of sessions between 't0' and 't1',
+        as 'datetime64[s]' arrays of local starts and inclusive ends clipped
+        to [t0, t1]. Sessions are grouped by calendar day, week (starting on
+        Monday), month, quarter or year, or every 'every' sessions if it is a
+        number. Windows with no time in [t0, t1] are dropped. Aware 't0' and
+        't1' are converted to naive UTC first.
+        """
+
+        t0, t1 = self._naive(t0), self._naive(t1)
+
+        days = self.sessions(t0, t1)
+
+        if len(days) == 0:
+            empty = np.array([], dtype='datetime64[s]')
+            return empty, empty
+
+        if isinstance(every, int):
+            if every < 1:
+                raise ValueError(f"Invalid window: {every} sessions. Must be at least 1.")
+
+            key = np.arange(len(days)) // every
+        elif every == 'day':
+            key = days.astype(np.int64)
+        elif every == 'week':
+            key = days.astype(np.int64) - weekday(days)
+        elif every == 'month':
+            key = days.astype('datetime64[M]').astype(np.int64)
+        elif every == 'quarter':
+            key = days.astype('datetime64[M]').astype(np.int64) // 3
+        elif every == 'year':
+            key = days.astype('datetime64[Y]').astype(np.int64)
+        else:
+            raise ValueError(f"Invalid window: {every}. Must be a number of sessions or one of {', '.join(FREQUENCIES)}.")
+
+        first = np.flatnonzero(np.concatenate(([True], key[1:] != key[:-1])))
+        last = np.append(first[1:], len(days)) - 1
+
+        lo, hi = np.datetime64(t0, 's'), np.datetime64(t1, 's')
+
+        starts = np.maximum(days[first].astype('datetime64[s]'), lo)
+        ends = np.minimum((days[last] + 1).astype('datetime64[s]') - 1, hi)
+
+        keep = starts < ends
+
+        return starts[keep], ends[keep]
+
+    def iter_windows(self: Self, t0: datetime, t1: datetime, every: Union[str, int] = 'week') -> Iterator[Tuple[datetime, datetime]]:
+
+        """
+        Yields the bounds of the windows of 'windows' as pairs of datetimes.
+        """
+
+        starts, ends = self.windows(t0, t1, every=every)
+
+        yield from zip(starts.tolist(), ends.tolist())
+
+# The New York Stock Exchange, whose regular sessions run from 9:30 to 16:00
+# Eastern time, closing at 13:00 on early-close days.
+NYSE: Final[Calendar] = Calendar(
+    name='XNYS',
+    holidays=nyse_holidays,
+    open=9 * 60 + 30,
+    close=16 * 60,
+    early_close=13 * 60,
+    early_closes=nyse_early_closes,
+    extended=(4 * 60, 20 * 60),
+    utc_offset=-5 * 60,
+    dst=us_dst,
+)
+
+# Crypto markets, which trade around the clock every day.
+CRYPTO: Final[Calendar] = Calendar(name='CRYPTO', weekmask='1111111')
+
+# Currency markets, approximated as trading around the clock on weekdays in
+# UTC.
+FX: Final[Calendar] = Calendar(name='FX')
+
+# The calendars of the supported exchanges, by name.
+CALENDARS: Final[Dict[str, Calendar]] = {
+    'XNYS': NYSE,
+    'CRYPTO': CRYPTO,
+    'FX': FX,
+}
+
+# The calendars of Polygon tickers by their market prefix, such as 'X:' in
+# 'X:BTCUSD'. Tickers without a prefix trade on the default calendar.
+PREFIXES: Final[Dict[str, Calendar]] = {
+    'X:': CRYPTO,
+    'C:': FX,
+}
+
+def calendar_of(ticker: str, default: Calendar = NYSE) -> Calendar:
+
+    """
+    Returns the calendar that 'ticker' trades on, by its market prefix, or
+    'default' for tickers without one.
+    """
+
+    return PREFIXES.get(ticker[:2], default)
@@ -1,15 +1,62 @@
 
-from datetime import (datetime)
+from datetime import (datetime, timezone)
 from polygon import RESTClient
-from typing import (Any, Iterator, List, Self, Union)
+from typing import (Any, Callable, Final, Iterator, List, Optional, Self, Tuple, Union)
 import polygon
-from util.ohlcv import (OHLCV)
+from polygon.exceptions import (BadResponse)
+from util.lazy import (lazy)
+from util.metrics import (Counter, Histogram, counter, histogram)
+from util.ohlcv import (OHLCV, OHLCVBatch)
+from util.panel import (Panel)
+from util.profile import (stage)
+from util.resample import (DERIVED, ceil, floor, resample)
+from util.returns import (returns)
+from util.session import (restrict)
+from util.interval import (uncovered)
 from util.logs import (logger)
 from util.time import (weekly)
 from urllib3 import HTTPResponse
 
-import pandas as pd
-import util.database as database
+import numpy as np
+import time
+import util.storage as storage
+
+# Imported on first use, as only the DataFrame helpers need it.
+pd = lazy('pandas')
+
+# The requests made to the Polygon API, and the bytes and time they took.
+API_REQUESTS: Final[Counter] = counter('correlate_api_requests_total', 'The requests made to the Polygon API, by status.')
+API_BYTES: Final[Counter] = counter('correlate_api_bytes_total', 'The bytes of the response bodies of the Polygon API.')
+API_SECONDS: Final[Histogram] = histogram('correlate_api_request_seconds', 'The duration of requests to the Polygon API.')
+
+# The lookups of aggregates in the store, and the rows read and written.
+STORE_LOOKUPS: Final[Counter] = counter('correlate_store_lookups_total', 'The lookups of aggregates in the store, by result (hit, miss or derived).')
+ROWS_SELECTED: Final[Counter] = counter('correlate_rows_selected_total', 'The bars read from the store, by query.')
+ROWS_INSERTED: Final[Counter] = counter('correlate_rows_inserted_total', 'The bars written to the store, by timespan.')
+
+def utc(t: int) -> datetime:
+
+    """
+    Returns the epoch seconds 't' as an aware UTC datetime.
+    """
+
+    return datetime.fromtimestamp(t, timezone.utc)
+
+def span(t0: datetime, t1: datetime, timespan: str) -> Tuple[int, int]:
+
+    """
+    Returns the epoch-second range of the bars over 'timespan' between 't0'
+    and 't1'. Derived bars are stamped with the start of their bucket, so
+    the range starts at the bucket containing 't0', to include every bucket
+    that overlaps [t0, t1].
+    """
+
+    s0, s1 = int(t0.timestamp()), int(t1.timestamp())
+
+    if timespan in DERIVED:
+        s0 = int(floor(s0, timespan))
+
+    return s0, s1
 
 class PolygonClient(RESTClient):
     """
@@ -17,82 +64,266 @@ class PolygonClient(RESTClient):
     Inherits from RESTClient to provide additional functionality specific to Polygon.
     """
 
+    def _get(self: Self, *args: Any, **kwargs: Any) -> Any:
+        t = time.perf_counter()
+
+        try:
+            result = super()._get(*args, **kwargs)
+        except BadResponse:
+            API_REQUESTS.inc(status='error')
+            raise
+        finally:
+            API_SECONDS.observe(time.perf_counter() - t)
+
+        API_REQUESTS.inc(status='ok')
+
+        return result
+
+    def _decode(self: Self, resp: HTTPResponse) -> Any:
+        API_BYTES.inc(len(resp.data))
+
+        return super()._decode(resp)
+
     def list_aggs(
             self: Self,
             ticker: str,
             t0: datetime,
             t1: datetime,
             *args: Any,
+            timespan: str = 'hour',
             **kwargs: Any,
-        ) -> Iterator[OHLCV]:
+        ) -> OHLCVBatch:
+
+        """
+        Returns the aggregates for 'ticker' over 'timespan' between 't0' and
+        't1', fetching or deriving the parts of the range that have not been
+        stored in full yet (see 'cover'). Derived bars are returned for every
+        bucket that overlaps [t0, t1] and has ended.
+        """
 
-        logger.info(f'fetching {ticker} aggregates {t0} - {t1}')
+        logger.info(f'fetching {ticker} {timespan} aggregates {t0} - {t1}')
 
         if t0 >= t1:
             raise ValueError(f'polygon_aggregates(t0={t0}, t1={t1}, ...): t0 must be before t1')
 
-        data = database.select_ohlcv(ticker=ticker, t0=t0, t1=t1)
-
-        if len(data) > 0:
-            logger.info(f'fetch(ticker={ticker}, t0={t0}, t1={t1}): found {len(data)} records in database')
-            return data
-        else:
-            def to_ohlcv(agg: polygon.rest.aggs.Agg) -> OHLCV:
-                return OHLCV(
-                    timestamp=agg.timestamp,
-                    symbol=ticker,
-                    open=agg.open,
-                    high=agg.high,
-                    low=agg.low,
-                    close=agg.close,
-                    volume=agg.volume
-                )
+        s0, s1 = span(t0, t1, timespan)
+
+        self.cover(ticker=ticker, t0=s0, t1=s1, timespan=timespan, **kwargs)
+
+        with stage('store.select', ticker=ticker):
+            data = storage.backend().select_ohlcv_batch(ticker=ticker, t0=utc(s0), t1=utc(s1), timespan=timespan)
+
+        ROWS_SELECTED.inc(len(data), query='batch')
+
+        return data
+
+    def cover(
+            self: Self,
+            ticker: str,
+            t0: int,
+            t1: int,
+            timespan: str = 'hour',
+            ranges: Optional[List[Tuple[int, int]]] = None,
+            **kwargs: Any,
+        ) -> bool:
+
+        """
+        Fetches, or derives from hourly bars, the bars of 'ticker' over
+        'timespan' in the parts of the epoch-second range [t0, t1] outside
+        the stored 'ranges' (by default, those recorded in the store), and
+        returns whether any part was missing. A store hit is only counted
+        when the whole range is covered, so a range that was fetched in part
+        is completed instead of being returned short.
+        """
+
+        if ranges is None:
+            ranges = storage.backend().select_coverage(tickers=[ticker], t0=utc(t0), t1=utc(t1), timespan=timespan)[ticker]
+
+        gaps = uncovered(ranges, t0, t1)
+
+        if len(gaps) == 0:
+            logger.info(f'cover(ticker={ticker}, timespan={timespan}): range is stored')
+            STORE_LOOKUPS.inc(result='hit')
+            return False
+
+        for g0, g1 in gaps:
+            if timespan in DERIVED:
+                STORE_LOOKUPS.inc(result='derived')
+                self.resample_aggs(ticker=ticker, t0=utc(g0), t1=utc(g1), timespan=timespan)
+            else:
+                STORE_LOOKUPS.inc(result='miss')
+                self.fetch_aggs(ticker=ticker, t0=g0, t1=g1, timespan=timespan, **kwargs)
+
+        return True
+
+    def fetch_aggs(
+            self: Self,
+            ticker: str,
+            t0: int,
+            t1: int,
+            timespan: str = 'hour',
+            **kwargs: Any,
+        ) -> OHLCVBatch:
+
+        """
+        Fetches the aggregates for 'ticker' over 'timespan' in the
+        epoch-second range [t0, t1] from the API and stores them, replacing
+        bars stored while they were still in progress. The range is recorded
+        as stored up to the last bar that has ended.
+        """
 
+        # The aggregates are paged in lazily, so the API is timed until
+        # the batch is built.
+        with stage('api', ticker=ticker):
             aggs = super().list_aggs(
                 ticker=ticker,
-                from_=t0,
-                to=t1,
+                from_=utc(t0),
+                to=utc(t1),
                 adjusted=True,
                 multiplier=1,
                 sort='asc',
-                timespan='hour',
+                timespan=timespan,
                 **kwargs
             )
 
-            ohlvcs = map(to_ohlcv, aggs)
+            batch = OHLCVBatch.from_aggs(ticker, aggs)
+
+        with stage('store.insert', ticker=ticker):
+            end = min(t1, int(floor(int(time.time()), timespan)) - 1)
+
+            storage.backend().insert_bars(batch=batch, t0=utc(t0), t1=utc(end), timespan=timespan, replace=True)
 
-            database.insert_ohlcv(objs=aggs)
+        ROWS_INSERTED.inc(len(batch), timespan=timespan)
 
-            return map(to_ohlcv, aggs)
+        return batch
 
-    def fetch(self: Self, tickers: List[str], t0: datetime, t1: datetime) -> Iterator[pd.DataFrame]:
+    def resample_aggs(
+            self: Self,
+            ticker: str,
+            t0: datetime,
+            t1: datetime,
+            timespan: str,
+        ) -> OHLCVBatch:
 
         """
-        TODO: docs
+        Derives the aggregates for 'ticker' over 'timespan' in every bucket
+        overlapping 't0' to 't1' from its hourly aggregates, fetching the
+        hours of those buckets that are not stored yet. Only the buckets that
+        have ended are stored under 'timespan', along with the range they
+        cover, as every hour of an ended bucket is then stored in full.
         """
 
-        for i in iter(weekly(t0=t0, t1=t1)):
-            dataframes = []
+        b0, b1 = int(floor(int(t0.timestamp()), timespan)), int(ceil(int(t1.timestamp()), timespan))
+
+        hourly = self.list_aggs(ticker=ticker, t0=utc(b0), t1=utc(b1 - 1), timespan='hour')
+
+        batch = resample(hourly, timespan)
+
+        # Buckets that start before the current one have ended.
+        done = int(floor(int(time.time()), timespan))
+        complete = batch[:int(np.searchsorted(batch.t, done, side='left'))]
+
+        logger.info(f'resample(ticker={ticker}, timespan={timespan}): derived {len(batch)} records from {len(hourly)} hourly records')
+
+        # Buckets stored before their hours were complete are replaced.
+        storage.backend().insert_bars(batch=complete, t0=utc(b0), t1=utc(min(b1, done) - 1), timespan=timespan, replace=True)
+
+        ROWS_INSERTED.inc(len(complete), timespan=timespan)
+
+        return batch
+
+    def list_aggs_frame(
+            self: Self,
+            ticker: str,
+            t0: datetime,
+            t1: datetime,
+            timespan: str = 'hour',
+        ) -> 'pd.DataFrame':
+
+        """
+        Returns the aggregates for 'ticker' between 't0' and 't1' as a
+        DataFrame indexed by timestamp, built from the columns of the
+        'OHLCVBatch' returned by 'list_aggs'.
+        """
+
+        return self.list_aggs(ticker=ticker, t0=t0, t1=t1, timespan=timespan).to_frame()
+
+    def fetch_panel(
+            self: Self,
+            tickers: List[str],
+            t0: datetime,
+            t1: datetime,
+            column: str = 'close',
+            timespan: str = 'hour',
+        ) -> Panel:
 
-            for ticker in tickers:
-                dataframe = pd.DataFrame.from_records(
-                    data=self.list_aggs(ticker=ticker, t0=i[0], t1=i[1]),
-                    index='t',
-                    columns=['t', 'o', 'h', 'l', 'c', 'v']
-                )
+        """
+        Returns one OHLCV field for all of 'tickers' between 't0' and 't1' as
+        an aligned 'Panel'. The parts of the range not yet stored for each
+        ticker are fetched or derived first; the panel itself is then loaded
+        with a single query. Derived bars are selected by the overlap of
+        their bucket with [t0, t1].
+        """
+
+        s0, s1 = span(t0, t1, timespan)
+
+        with stage('store.count'):
+            ranges = storage.backend().select_coverage(tickers=tickers, t0=utc(s0), t1=utc(s1), timespan=timespan)
+
+        for ticker in tickers:
+            self.cover(ticker=ticker, t0=s0, t1=s1, timespan=timespan, ranges=ranges[ticker])
 
-                dc = dataframe['c'].diff()
-                d0 = dataframe['c'].shift(-1)
+        with stage('store.panel'):
+            panel = storage.backend().select_panel(tickers=tickers, t0=utc(s0), t1=utc(s1), column=column, timespan=timespan)
+
+        ROWS_SELECTED.inc(panel.mask.size - panel.missing, query='panel')
+
+        return panel
+
+    def fetch(
+            self: Self,
+            tickers: List[str],
+            t0: datetime,
+            t1: datetime,
+            column: str = 'close',
+            timespan: str = 'hour',
+            kind: str = 'simple',
+            missing: str = 'drop',
+            skip: Optional[Callable[[datetime, datetime], bool]] = None,
+            session: str = 'all',
+            calendar: str = 'XNYS',
+        ) -> Iterator[Tuple[Tuple[datetime, datetime], np.ndarray]]:
+
+        """
+        Yields each week between 't0' and 't1' along with the returns of
+        'tickers' over it, as a contiguous (n, T) array with one row per
+        ticker ordered from the newest to the oldest bar (see
+        'util.returns'). Weeks for which 'skip' returns True are not fetched.
+        Intraday bars outside the 'session' of the 'calendar' each ticker
+        trades on are left out of the returns (see 'util.session').
+        """
+
+        for i in iter(weekly(t0=t0, t1=t1)):
+            if skip is not None and skip(*i):
+                logger.info(f'fetch(t0={i[0]}, t1={i[1]}): skipping window')
+                continue
 
-                returns = dc / d0
-                returns.dropna(inplace=True)
+            with stage('fetch', window=f'{i[0]:%Y-%m-%d}'):
+                panel = self.fetch_panel(tickers=tickers, t0=i[0], t1=i[1], column=column, timespan=timespan)
 
-                dataframes.append(returns)
+                with stage('returns'):
+                    panel, mask = restrict(panel, session=session, timespan=timespan, default=calendar)
+                    r, _ = returns(panel, kind=kind, missing=missing, mask=mask)
 
-            yield pd.concat(dataframes, axis=1, keys=tickers)
+            # A window may have no bars in session, such as one that ends at
+            # the midnight before its only trading day.
+            if r.shape[1] == 0:
+                logger.warning(f'fetch(t0={i[0]}, t1={i[1]}): no returns in window')
+                continue
 
+            yield i, r
 
-    def fetch_all(self: Self, tickers: List[str], t0: datetime, t1: datetime) -> Iterator[pd.DataFrame]:
+    def fetch_all(self: Self, tickers: List[str], t0: datetime, t1: datetime) -> Iterator['pd.DataFrame']:
 
         """
         TODO: docs
@@ -108,12 +339,12 @@ class PolygonClient(RESTClient):
             objs = self.fetch(ticker=ticker, t0=t0, t1=t1)
             yield pd.concat(objs=objs, join='outer')
 
-    def fetch_series(self: Self, ticker: str, t0: datetime, t1: datetime) -> pd.DataFrame:
+    def fetch_series(self: Self, ticker: str, t0: datetime, t1: datetime) -> 'pd.DataFrame':
         """
         TODO: docs
         """
 
-        dataframes: Iterator[pd.DataFrame] = self.fetch(ticker=ticker, t0=t0, t1=t1)
+        dataframes: Iterator['pd.DataFrame'] = self.fetch(ticker=ticker, t0=t0, t1=t1)
 
         # Concatenate all series into a single DataFrame.
         returns = pd.concat(map(returns, dataframes), keys=tickers, axis=1)
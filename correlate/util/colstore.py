@@ -0,0 +1,285 @@
+
+from datetime import datetime
+from typing import (Dict, Final, List, Optional, Tuple, Union)
+from util.lazy import (lazy)
+from util.ohlcv import (OHLCV, OHLCVBatch, OHLCV_DTYPE)
+from util.panel import (FIELDS, Panel, pivot)
+
+import numpy as np
+import os
+
+"""
+A columnar on-disk bar store with the same interface as 'util.database'.
+
+Each ticker's bars over each timespan are kept in a directory
+('<PATH>/<timespan>/<ticker>') of raw, append-only column files
+('t.bin', 'o.bin', ..., 'v.bin'), one per field of 'OHLCV_DTYPE'. The 't'
+column is always sorted, so it doubles as the time index: a range lookup is a
+binary search over the memory-mapped timestamps, and readers get 'OHLCVBatch'
+objects whose columns are views of the mapped files.
+"""
+
+# Imported on first use, as only 'select_ohlcv_frame' needs it.
+pd = lazy('pandas')
+
+# The directory holding one sub-directory of column files per ticker.
+PATH: str = "bars"
+
+# The names of the column files, in the order of 'OHLCV_DTYPE'.
+COLUMNS: Final[Tuple[str, ...]] = OHLCV_DTYPE.names
+
+def _directory(ticker: str, timespan: str) -> str:
+    return os.path.join(PATH, timespan, ticker)
+
+def _column_path(ticker: str, timespan: str, column: str) -> str:
+    return os.path.join(_directory(ticker, timespan), f"{column}.bin")
+
+def _map(ticker: str, timespan: str) -> Optional[Dict[str, np.ndarray]]:
+
+    """
+    Memory-maps the column files of 'ticker' over 'timespan' read-only.
+    Returns None if the ticker has no bars. If a previous append was
+    interrupted, the columns are truncated to their common length.
+    """
+
+    if not os.path.isdir(_directory(ticker, timespan)):
+        return None
+
+    sizes = []
+
+    for column in COLUMNS:
+        path = _column_path(ticker, timespan, column)
+        sizes.append(os.path.getsize(path) // OHLCV_DTYPE[column].itemsize if os.path.exists(path) else 0)
+
+    n = min(sizes)
+
+    if n == 0:
+        return None
+
+    return {
+        column: np.memmap(_column_path(ticker, timespan, column), dtype=OHLCV_DTYPE[column], mode='r', shape=(n,))
+        for column in COLUMNS
+    }
+
+def _write(ticker: str, timespan: str, columns: Dict[str, np.ndarray], mode: str) -> None:
+
+    """
+    Appends ('ab') or rewrites ('wb') the column files of 'ticker'. Rewritten
+    files are replaced atomically, so readers holding maps of the previous
+    files are unaffected.
+    """
+
+    os.makedirs(_directory(ticker, timespan), exist_ok=True)
+
+    for column in COLUMNS:
+        path = _column_path(ticker, timespan, column)
+        temp = path + ".tmp" if mode == 'wb' else path
+
+        with open(temp, mode) as file:
+            np.ascontiguousarray(columns[column], dtype=OHLCV_DTYPE[column]).tofile(file)
+
+        if temp != path:
+            os.replace(temp, path)
+
+def _coverage_path(ticker: str, timespan: str) -> str:
+    return os.path.join(_directory(ticker, timespan), "coverage.bin")
+
+def _insert_batch(batch: OHLCVBatch, timespan: str, replace: bool = False) -> None:
+
+    """
+    Stores the bars of 'batch', ignoring timestamps that are already present
+    unless 'replace' is set. Bars newer than everything stored are appended
+    in place; otherwise the ticker's columns are merged and rewritten.
+    """
+
+    order = np.argsort(batch.t, kind='stable')
+    t, first = np.unique(batch.t[order], return_index=True)
+    columns = {name: x[order][first] for name, x in batch.columns().items()}
+
+    if len(t) == 0:
+        return
+
+    stored = _map(batch.symbol, timespan)
+
+    if stored is None:
+        _write(batch.symbol, timespan, columns, 'wb')
+    elif t[0] > stored['t'][-1]:
+        _write(batch.symbol, timespan, columns, 'ab')
+    else:
+        parts = (columns, stored) if replace else (stored, columns)
+        merged = {name: np.concatenate([parts[0][name], parts[1][name]]) for name in COLUMNS}
+
+        # Keep the stored bar when a timestamp is duplicated, or the new one
+        # with 'replace', which matches the 'INSERT OR IGNORE' and 'INSERT OR
+        # REPLACE' semantics of the SQLite store.
+        order = np.argsort(merged['t'], kind='stable')
+        _, first = np.unique(merged['t'][order], return_index=True)
+        merged = {name: x[order][first] for name, x in merged.items()}
+
+        del stored
+
+        _write(batch.symbol, timespan, merged, 'wb')
+
+def init() -> None:
+
+    """
+    Initializes the columnar store for storing OHLCV data.
+    """
+
+    os.makedirs(PATH, exist_ok=True)
+
+def insert_ohlcv(aggs: Union[OHLCV, List[OHLCV], OHLCVBatch], timespan: str = 'hour', replace: bool = False) -> None:
+
+    """
+    Inserts an Agg, a list of Agg objects, or an 'OHLCVBatch' into the
+    columnar store, recorded as aggregates over 'timespan'. Bars already
+    stored are kept, unless 'replace' is set.
+    """
+
+    if isinstance(aggs, OHLCV):
+        aggs = [aggs]
+
+    if isinstance(aggs, OHLCVBatch):
+        _insert_batch(aggs, timespan, replace=replace)
+        return
+
+    rows: Dict[str, List[Tuple]] = {}
+
+    for agg in aggs:
+        row = agg.to_tuple()
+        rows.setdefault(row[1], []).append((row[0],) + row[2:])
+
+    for symbol, values in rows.items():
+        _insert_batch(OHLCVBatch.from_rows(symbol, values), timespan, replace=replace)
+
+def insert_coverage(ticker: str, t0: datetime, t1: datetime, timespan: str = 'hour') -> None:
+
+    """
+    Records that every bar of 'ticker' over 'timespan' from 't0' to 't1',
+    inclusive, has been stored, by appending the range to the ticker's
+    coverage file.
+    """
+
+    os.makedirs(_directory(ticker, timespan), exist_ok=True)
+
+    with open(_coverage_path(ticker, timespan), 'ab') as file:
+        np.array([int(t0.timestamp()), int(t1.timestamp())], dtype=np.int64).tofile(file)
+
+def insert_bars(batch: OHLCVBatch, t0: datetime, t1: datetime, timespan: str = 'hour', replace: bool = False) -> None:
+
+    """
+    Inserts the 'OHLCVBatch' 'batch' and records that every bar of its symbol
+    over 'timespan' from 't0' to 't1', inclusive, has been stored. The range
+    is appended only once the bars are written, and not at all if 't1' is
+    before 't0'. Bars already stored are kept, unless 'replace' is set.
+    """
+
+    _insert_batch(batch, timespan, replace=replace)
+
+    if t1 >= t0:
+        insert_coverage(batch.symbol, t0, t1, timespan)
+
+def select_coverage(tickers: List[str], t0: datetime, t1: datetime, timespan: str = 'hour') -> Dict[str, List[Tuple[int, int]]]:
+
+    """
+    Selects the stored ranges of each of the given symbols, as inclusive
+    (t0, t1) pairs of epoch seconds, that overlap the time range.
+    """
+
+    ranges: Dict[str, List[Tuple[int, int]]] = {}
+
+    for ticker in tickers:
+        path = _coverage_path(ticker, timespan)
+        stored = np.fromfile(path, dtype=np.int64) if os.path.exists(path) else np.empty(0, dtype=np.int64)
+
+        # An interrupted append may leave half a range, which is ignored.
+        stored = stored[:len(stored) // 2 * 2].reshape(-1, 2)
+        stored = stored[(stored[:, 0] <= int(t1.timestamp())) & (stored[:, 1] >= int(t0.timestamp()))]
+
+        ranges[ticker] = [(int(r0), int(r1)) for r0, r1 in stored]
+
+    return ranges
+
+def select_ohlcv(ticker: str, t0: datetime, t1: datetime, timespan: str = 'hour') -> List[OHLCV]:
+
+    """
+    Selects the OHLCV objects for the given symbol and time range.
+    """
+
+    return list(select_ohlcv_batch(ticker=ticker, t0=t0, t1=t1, timespan=timespan))
+
+def select_ohlcv_batch(ticker: str, t0: datetime, t1: datetime, timespan: str = 'hour') -> OHLCVBatch:
+
+    """
+    Selects the bars for the given symbol and time range as an 'OHLCVBatch'
+    whose columns are zero-copy views of the memory-mapped column files.
+    """
+
+    columns = _map(ticker, timespan)
+
+    if columns is None:
+        return OHLCVBatch.from_records(ticker, np.empty(0, dtype=OHLCV_DTYPE))
+
+    batch = OHLCVBatch(
+        symbol=ticker,
+        t=columns['t'],
+        open=columns['o'],
+        high=columns['h'],
+        low=columns['l'],
+        close=columns['c'],
+        volume=columns['v'],
+    )
+
+    return batch.between(t0, t1)
+
+def select_ohlcv_arrays(ticker: str, t0: datetime, t1: datetime, timespan: str = 'hour') -> Dict[str, np.ndarray]:
+
+    """
+    Selects the bars for the given symbol and time range as a dictionary of
+    NumPy columns keyed by 't', 'o', 'h', 'l', 'c' and 'v'.
+    """
+
+    return select_ohlcv_batch(ticker=ticker, t0=t0, t1=t1, timespan=timespan).columns()
+
+def select_ohlcv_frame(ticker: str, t0: datetime, t1: datetime, timespan: str = 'hour') -> 'pd.DataFrame':
+
+    """
+    Selects the bars for the given symbol and time range as a DataFrame
+    indexed by timestamp.
+    """
+
+    return select_ohlcv_batch(ticker=ticker, t0=t0, t1=t1, timespan=timespan).to_frame()
+
+def count_ohlcv(tickers: List[str], t0: datetime, t1: datetime, timespan: str = 'hour') -> Dict[str, int]:
+
+    """
+    Counts the bars stored for each of the given symbols in the time range.
+    """
+
+    return {ticker: len(select_ohlcv_batch(ticker=ticker, t0=t0, t1=t1, timespan=timespan)) for ticker in tickers}
+
+def select_panel(
+        tickers: List[str],
+        t0: datetime,
+        t1: datetime,
+        column: str = 'close',
+        timespan: str = 'hour',
+    ) -> Panel:
+
+    """
+    Selects one OHLCV field for all of the given symbols and time range, and
+    aligns them into a 'Panel' with one column per symbol.
+    """
+
+    if column not in FIELDS:
+        raise ValueError(f"Invalid column: {column}. Must be one of {', '.join(FIELDS)}.")
+
+    columns = [select_ohlcv_batch(ticker=ticker, t0=t0, t1=t1, timespan=timespan).columns() for ticker in tickers]
+
+    t = np.concatenate([c['t'] for c in columns] + [np.empty(0, dtype=np.int64)])
+    i = np.repeat(np.arange(len(tickers)), [len(c['t']) for c in columns])
+    x = np.concatenate([c[FIELDS[column]] for c in columns] + [np.empty(0)])
+
+    order = np.argsort(t, kind='stable')
+
+    return pivot(t=t[order], i=i[order], x=x[order], symbols=tickers)
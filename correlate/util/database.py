@@ -1,74 +1,146 @@
 
 from datetime import datetime
 from sqlite3 import (Connection, Cursor)
-from typing import (Any, Iterator, List, Union)
-from util.ohlcv import (OHLCV)
+from typing import (Any, Dict, Iterator, List, Tuple, Union)
+from util.lazy import (lazy)
+from util.migrations import (migrate)
+from util.ohlcv import (OHLCV, OHLCVBatch)
+from util.panel import (FIELDS, Panel, pivot)
 
+import numpy as np
 import sqlite3
 
+# Imported on first use, as only 'select_ohlcv_frame' needs it.
+pd = lazy('pandas')
+
+# The path of the SQLite database file holding the OHLCV table.
+PATH: str = "olhcv.db"
+
 def init() -> None:
 
     """
-    Initializes the SQLite database for storing OHLCV data.
+    Initializes the SQLite database for storing OHLCV data, applying any
+    pending schema migrations to an existing database in place.
     """
 
-    con: Connection = sqlite3.connect("olhcv.db")
-    cur: Cursor = con.cursor()
+    migrate(PATH)
+
+def _insert_rows(con: Connection, rows: Iterator[Tuple], timespan: str, replace: bool) -> None:
+    # Inserts the (t, s, o, h, l, c, v) 'rows' into the OHLCV table over
+    # 'timespan', in the transaction of 'con'.
+    con.executemany(f"""
+        INSERT OR {'REPLACE' if replace else 'IGNORE'} INTO ohlcv (
+            t, -- timestamp as a UNIX epoch in seconds
+            s, -- symbol
+            o, -- open
+            h, -- high
+            l, -- low
+            c, -- close
+            v, -- volume
+            timespan -- aggregation period
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, (row + (timespan,) for row in rows))
+
+def insert_ohlcv(aggs: Union[OHLCV, List[OHLCV], OHLCVBatch], timespan: str = 'hour', replace: bool = False) -> None:
+
+    """
+    Inserts an Agg, a list of Agg objects, or an 'OHLCVBatch' as rows into the
+    OHLCV database, recorded as aggregates over 'timespan'. Rows already
+    stored are kept, unless 'replace' is set.
+    """
 
-    with open("sql/create_table_ohlcv.sql", "r") as file:
-        try:
-            sql_script: str = file.read()
-        except Exception as e:
-            con.close()
+    if isinstance(aggs, OHLCV):
+        aggs = [aggs]
 
-            raise e
+    if isinstance(aggs, OHLCVBatch):
+        rows = aggs.to_rows()
+    else:
+        rows = map(OHLCV.to_tuple, aggs)
 
-        cur.executescript(sql_script)
-        con.commit()
+    con: Connection = sqlite3.connect(PATH)
+
+    with con:
+        _insert_rows(con, rows, timespan, replace)
 
-    file.close()
     con.close()
 
-def insert_ohlcv(aggs: Union[OHLCV, List[OHLCV]]) -> None:
+def insert_coverage(ticker: str, t0: datetime, t1: datetime, timespan: str = 'hour') -> None:
 
     """
-    Inserts an Agg, or a list of Agg objects as rows into the OHLCV database.
+    Records that every bar of 'ticker' over 'timespan' from 't0' to 't1',
+    inclusive, has been stored.
     """
 
-    if isinstance(aggs, OHLCV):
-        aggs = [aggs]
+    con: Connection = sqlite3.connect(PATH)
+
+    with con:
+        con.execute(
+            'INSERT OR IGNORE INTO coverage (s, timespan, t0, t1) VALUES (?, ?, ?, ?)',
+            (ticker, timespan, int(t0.timestamp()), int(t1.timestamp()))
+        )
+
+    con.close()
+
+def insert_bars(batch: OHLCVBatch, t0: datetime, t1: datetime, timespan: str = 'hour', replace: bool = False) -> None:
+
+    """
+    Inserts the 'OHLCVBatch' 'batch' and records that every bar of its symbol
+    over 'timespan' from 't0' to 't1', inclusive, has been stored, in one
+    transaction. No range is recorded if 't1' is before 't0'. Rows already
+    stored are kept, unless 'replace' is set.
+    """
+
+    con: Connection = sqlite3.connect(PATH)
 
-    con: Connection = sqlite3.connect("olhcv.db")
+    with con:
+        _insert_rows(con, batch.to_rows(), timespan, replace)
+
+        if t1 >= t0:
+            con.execute(
+                'INSERT OR IGNORE INTO coverage (s, timespan, t0, t1) VALUES (?, ?, ?, ?)',
+                (batch.symbol, timespan, int(t0.timestamp()), int(t1.timestamp()))
+            )
+
+    con.close()
+
+def select_coverage(tickers: List[str], t0: datetime, t1: datetime, timespan: str = 'hour') -> Dict[str, List[Tuple[int, int]]]:
+
+    """
+    Selects the stored ranges of each of the given symbols, as inclusive
+    (t0, t1) pairs of epoch seconds, that overlap the time range with a
+    single query.
+    """
+
+    con: Connection = sqlite3.connect(PATH)
     cur: Cursor = con.cursor()
 
-    for agg in aggs:
-        cur.execute("""
-            INSERT OR IGNORE INTO ohlcv (
-                t, -- timestamp as a UNIX epoch in minutes
-                s, -- symbol
-                o, -- open
-                h, -- high
-                l, -- low
-                c, -- close
-                v  -- volume
-            ) VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, agg.to_tuple())
-
-    con.commit()
+    cur.execute(
+        f'SELECT s, t0, t1 FROM coverage WHERE s IN ({", ".join("?" * len(tickers))}) AND timespan = ? AND t0 <= ? AND t1 >= ?',
+        (*tickers, timespan, int(t1.timestamp()), int(t0.timestamp()))
+    )
+
+    ranges: Dict[str, List[Tuple[int, int]]] = {ticker: [] for ticker in tickers}
+
+    for s, r0, r1 in cur.fetchall():
+        ranges[s].append((r0, r1))
+
     con.close()
 
-def select_ohlcv(ticker: str, t0: datetime, t1: datetime) -> List[OHLCV]:
+    return ranges
+
+def select_ohlcv(ticker: str, t0: datetime, t1: datetime, timespan: str = 'hour') -> List[OHLCV]:
 
     """
-    Selects an Agg object from the database for the given symbol and timestamp.
+    Selects the OHLCV objects from the database for the given symbol, time
+    range and timespan.
     """
 
-    con: Connection = sqlite3.connect("olhcv.db")
+    con: Connection = sqlite3.connect(PATH)
     cur: Cursor = con.cursor()
 
     cur.execute(
-        'SELECT * FROM ohlcv WHERE s = ? AND t >= ? AND t <= ?',
-        (ticker, t0.timestamp(), t1.timestamp())
+        'SELECT t, s, o, h, l, c, v FROM ohlcv WHERE s = ? AND timespan = ? AND t >= ? AND t <= ? ORDER BY t',
+        (ticker, timespan, t0.timestamp(), t1.timestamp())
     )
 
     rows = list(map(OHLCV.from_tuple, cur.fetchall()))
@@ -77,10 +149,102 @@ def select_ohlcv(ticker: str, t0: datetime, t1: datetime) -> List[OHLCV]:
 
     return rows
 
+def select_ohlcv_batch(ticker: str, t0: datetime, t1: datetime, timespan: str = 'hour') -> OHLCVBatch:
+
+    """
+    Selects the OHLCV rows for the given symbol and time range as an
+    'OHLCVBatch' ordered by timestamp. Rows are streamed from the cursor
+    straight into NumPy columns, so no 'OHLCV' object is created per row.
+    """
+
+    con: Connection = sqlite3.connect(PATH)
+    cur: Cursor = con.cursor()
+
+    cur.execute(
+        'SELECT t, o, h, l, c, v FROM ohlcv WHERE s = ? AND timespan = ? AND t >= ? AND t <= ? ORDER BY t',
+        (ticker, timespan, t0.timestamp(), t1.timestamp())
+    )
+
+    batch: OHLCVBatch = OHLCVBatch.from_rows(ticker, cur)
 
+    con.close()
+
+    return batch
+
+def select_ohlcv_arrays(ticker: str, t0: datetime, t1: datetime, timespan: str = 'hour') -> Dict[str, np.ndarray]:
 
+    """
+    Selects the OHLCV rows for the given symbol and time range as a dictionary
+    of typed NumPy columns keyed by 't', 'o', 'h', 'l', 'c' and 'v', ordered by
+    timestamp.
+    """
 
+    return select_ohlcv_batch(ticker=ticker, t0=t0, t1=t1, timespan=timespan).columns()
 
+def select_ohlcv_frame(ticker: str, t0: datetime, t1: datetime, timespan: str = 'hour') -> 'pd.DataFrame':
 
+    """
+    Selects the OHLCV rows for the given symbol and time range as a DataFrame
+    indexed by timestamp, built directly from the columns of
+    'select_ohlcv_batch'.
+    """
+
+    return select_ohlcv_batch(ticker=ticker, t0=t0, t1=t1, timespan=timespan).to_frame()
+
+def count_ohlcv(tickers: List[str], t0: datetime, t1: datetime, timespan: str = 'hour') -> Dict[str, int]:
+
+    """
+    Counts the OHLCV rows stored for each of the given symbols in the time
+    range with a single query. Symbols without rows are counted as zero.
+    """
+
+    con: Connection = sqlite3.connect(PATH)
+    cur: Cursor = con.cursor()
 
+    cur.execute(
+        f'SELECT s, COUNT(*) FROM ohlcv WHERE s IN ({", ".join("?" * len(tickers))}) AND timespan = ? AND t >= ? AND t <= ? GROUP BY s',
+        (*tickers, timespan, t0.timestamp(), t1.timestamp())
+    )
+
+    counts: Dict[str, int] = dict.fromkeys(tickers, 0)
+    counts.update(cur.fetchall())
+
+    con.close()
+
+    return counts
+
+def select_panel(
+        tickers: List[str],
+        t0: datetime,
+        t1: datetime,
+        column: str = 'close',
+        timespan: str = 'hour',
+    ) -> Panel:
+
+    """
+    Selects one OHLCV field for all of the given symbols and time range with a
+    single query ordered by (t, s), and pivots the rows into an aligned
+    'Panel' with one column per symbol.
+    """
+
+    if column not in FIELDS:
+        raise ValueError(f"Invalid column: {column}. Must be one of {', '.join(FIELDS)}.")
+
+    symbols: str = ", ".join("(?, ?)" for _ in tickers)
+
+    con: Connection = sqlite3.connect(PATH)
+    cur: Cursor = con.cursor()
+
+    cur.execute(f"""
+        WITH symbols(i, s) AS (VALUES {symbols})
+        SELECT ohlcv.t, symbols.i, ohlcv.{FIELDS[column]}
+        FROM ohlcv JOIN symbols ON ohlcv.s = symbols.s
+        WHERE ohlcv.timespan = ? AND ohlcv.t >= ? AND ohlcv.t <= ?
+        ORDER BY ohlcv.t, ohlcv.s
+    """, (*(x for i, ticker in enumerate(tickers) for x in (i, ticker)), timespan, t0.timestamp(), t1.timestamp()))
+
+    rows: np.ndarray = np.fromiter(cur, dtype=[('t', np.int64), ('i', np.intp), ('x', np.float64)])
+
+    con.close()
 
+    return pivot(t=rows['t'], i=rows['i'], x=rows['x'], symbols=tickers)
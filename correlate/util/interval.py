@@ -1,7 +1,7 @@
 
 from datetime import (datetime, timedelta)
 from functools import cached_property
-from typing import Self
+from typing import (List, Self, Tuple)
 
 
 class TimeInterval():
@@ -32,3 +32,32 @@ class TimeInterval():
 
         return self._end
 
+def uncovered(ranges: List[Tuple[int, int]], t0: int, t1: int) -> List[Tuple[int, int]]:
+    """
+    Returns the parts of the inclusive range of integers [t0, t1] that are
+    outside every inclusive range of 'ranges', as inclusive (start, end)
+    pairs in ascending order.
+    """
+
+    gaps = []
+    start = t0
+
+    for r0, r1 in sorted(ranges):
+        if r1 < start:
+            continue
+
+        if r0 > t1:
+            break
+
+        if r0 > start:
+            gaps.append((start, r0 - 1))
+
+        start = max(start, r1 + 1)
+
+        if start > t1:
+            return gaps
+
+    if start <= t1:
+        gaps.append((start, t1))
+
+    return gaps
@@ -0,0 +1,40 @@
+
+from importlib import (util as importlib_util)
+from types import (ModuleType)
+
+import sys
+
+"""
+Deferred imports of heavy dependencies.
+
+'lazy' returns a module whose import is deferred until one of its attributes
+is first accessed, so modules that only need pandas or SciPy on some code
+paths do not pay for importing them at startup. Annotations naming such a
+module must be quoted, or they would trigger the import when the function is
+defined.
+"""
+
+
+def lazy(name: str) -> ModuleType:
+
+    """
+    Returns the module 'name', to be imported on first attribute access. If
+    the module is already imported it is returned as is.
+    """
+
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib_util.find_spec(name)
+
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+
+    loader = importlib_util.LazyLoader(spec.loader)
+    spec.loader = loader
+
+    module = importlib_util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+
+    return module
@@ -0,0 +1,352 @@
+
+from bisect import (bisect_left)
+from typing import (Any, Callable, Dict, Final, List, Optional, Self, Tuple)
+
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+
+"""
+Counters, gauges and histograms of a run, exported as a Prometheus text file
+or a JSON snapshot.
+
+Metrics are created once per name with 'counter', 'gauge' or 'histogram',
+and updated with labels given as keyword arguments:
+
+    REQUESTS = counter('correlate_api_requests_total', 'The API requests made.')
+    REQUESTS.inc(status='ok')
+
+Updates take a lock and a dictionary lookup, so metrics are always collected
+and only exporting them is optional (see 'write' and 'Exporter').
+"""
+
+# The default bucket upper bounds of histograms of durations, in seconds.
+BUCKETS: Final[Tuple[float, ...]] = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# The labels of a sample, as sorted (name, value) pairs.
+Labels = Tuple[Tuple[str, str], ...]
+
+# The time the process started collecting metrics.
+START: Final[float] = time.time()
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _format(name: str, labels: Labels, value: float) -> str:
+    """
+    Returns the Prometheus text-format line of one sample.
+    """
+
+    if len(labels) > 0:
+        pairs = (k + '="' + v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"' for k, v in labels)
+        name = f"{name}{{{','.join(pairs)}}}"
+
+    if math.isinf(value):
+        return f"{name} {'+Inf' if value > 0 else '-Inf'}"
+
+    return f"{name} {value:.17g}"
+
+class Metric:
+    """
+    The samples of one metric, by labels.
+    """
+
+    kind: str = 'untyped'
+
+    def __init__(self: Self, name: str, help: str) -> None:
+        self._name = name
+        self._help = help
+        self._lock = threading.Lock()
+        self._values: Dict[Labels, Any] = {}
+
+    @property
+    def name(self: Self) -> str:
+        """
+        Get the name of the metric.
+        """
+
+        return self._name
+
+    @property
+    def help(self: Self) -> str:
+        """
+        Get the description of the metric.
+        """
+
+        return self._help
+
+    def samples(self: Self) -> List[Tuple[str, Labels, float]]:
+        """
+        Returns the (name, labels, value) samples of the metric.
+        """
+
+        with self._lock:
+            return [(self._name, labels, value) for labels, value in self._values.items()]
+
+    def snapshot(self: Self) -> List[Dict[str, Any]]:
+        """
+        Returns the samples of the metric as JSON-serializable objects.
+        """
+
+        with self._lock:
+            return [{'labels': dict(labels), 'value': value} for labels, value in self._values.items()]
+
+class Counter(Metric):
+    """
+    A monotonically increasing count.
+    """
+
+    kind: str = 'counter'
+
+    def inc(self: Self, amount: float = 1, **labels: Any) -> None:
+        """
+        Increments the count of 'labels' by 'amount'.
+        """
+
+        key = _labels(labels)
+
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self: Self, **labels: Any) -> float:
+        """
+        Returns the count of 'labels'.
+        """
+
+        with self._lock:
+            return self._values.get(_labels(labels), 0)
+
+class Gauge(Metric):
+    """
+    A value that can go up and down, either set explicitly or computed by a
+    function when the metric is exported.
+    """
+
+    kind: str = 'gauge'
+
+    def __init__(self: Self, name: str, help: str, function: Optional[Callable[[], float]] = None) -> None:
+        super().__init__(name, help)
+        self._function = function
+
+    def set(self: Self, value: float, **labels: Any) -> None:
+        """
+        Sets the value of 'labels' to 'value'.
+        """
+
+        with self._lock:
+            self._values[_labels(labels)] = value
+
+    def samples(self: Self) -> List[Tuple[str, Labels, float]]:
+        if self._function is not None:
+            self.set(self._function())
+
+        return super().samples()
+
+    def snapshot(self: Self) -> List[Dict[str, Any]]:
+        if self._function is not None:
+            self.set(self._function())
+
+        return super().snapshot()
+
+class Histogram(Metric):
+    """
+    The distribution of observed values over fixed buckets, along with their
+    count and sum.
+    """
+
+    kind: str = 'histogram'
+
+    def __init__(self: Self, name: str, help: str, buckets: Tuple[float, ...] = BUCKETS) -> None:
+        super().__init__(name, help)
+        self._buckets = tuple(sorted(buckets))
+
+    def observe(self: Self, value: float, **labels: Any) -> None:
+        """
+        Adds the observation 'value' to the distribution of 'labels'.
+        """
+
+        key = _labels(labels)
+        i = bisect_left(self._buckets, value)
+
+        with self._lock:
+            entry = self._values.get(key)
+
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self._buckets) + 1), 0, 0.0]
+
+            entry[0][i] += 1
+            entry[1] += 1
+            entry[2] += value
+
+    def samples(self: Self) -> List[Tuple[str, Labels, float]]:
+        samples = []
+        bounds = [*(f'{bound:g}' for bound in self._buckets), '+Inf']
+
+        with self._lock:
+            for labels, (counts, count, total) in self._values.items():
+                cumulative = 0
+
+                # Each bucket counts the observations up to its bound 'le'.
+                for bound, n in zip(bounds, counts):
+                    cumulative += n
+                    samples.append((f"{self._name}_bucket", (*labels, ('le', bound)), cumulative))
+
+                samples.append((f"{self._name}_count", labels, count))
+                samples.append((f"{self._name}_sum", labels, total))
+
+        return samples
+
+    def snapshot(self: Self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [{
+                'labels': dict(labels),
+                'buckets': dict(zip([*(f'{bound:g}' for bound in self._buckets), '+Inf'], counts)),
+                'count': count,
+                'sum': total,
+            } for labels, (counts, count, total) in self._values.items()]
+
+_lock = threading.Lock()
+_metrics: Dict[str, Metric] = {}
+
+def _register(cls: type, name: str, *args: Any) -> Any:
+    with _lock:
+        metric = _metrics.get(name)
+
+        if metric is None:
+            metric = _metrics[name] = cls(name, *args)
+        elif not isinstance(metric, cls):
+            raise ValueError(f"Invalid metric: {name}. Already registered as a {metric.kind}.")
+
+        return metric
+
+def counter(name: str, help: str) -> Counter:
+
+    """
+    Returns the counter called 'name', creating it if needed.
+    """
+
+    return _register(Counter, name, help)
+
+def gauge(name: str, help: str, function: Optional[Callable[[], float]] = None) -> Gauge:
+
+    """
+    Returns the gauge called 'name', creating it if needed. A gauge with a
+    'function' takes its value from it whenever it is exported.
+    """
+
+    return _register(Gauge, name, help, function)
+
+def histogram(name: str, help: str, buckets: Tuple[float, ...] = BUCKETS) -> Histogram:
+
+    """
+    Returns the histogram called 'name', creating it if needed.
+    """
+
+    return _register(Histogram, name, help, buckets)
+
+def prometheus() -> str:
+
+    """
+    Returns every metric in the Prometheus text exposition format.
+    """
+
+    with _lock:
+        metrics = list(_metrics.values())
+
+    lines = []
+
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(_format(name, labels, value) for name, labels, value in metric.samples())
+
+    return '\n'.join(lines) + '\n'
+
+def snapshot() -> Dict[str, Any]:
+
+    """
+    Returns every metric as a JSON-serializable object, along with the time
+    of the snapshot and the uptime of the process.
+    """
+
+    with _lock:
+        metrics = list(_metrics.values())
+
+    now = time.time()
+
+    return {
+        'time': now,
+        'uptime': now - START,
+        'metrics': {metric.name: {'type': metric.kind, 'help': metric.help, 'samples': metric.snapshot()} for metric in metrics},
+    }
+
+def write(path: str) -> None:
+
+    """
+    Atomically writes every metric to 'path', as a JSON snapshot if the path
+    ends in '.json' and in the Prometheus text format otherwise.
+    """
+
+    if path.endswith('.json'):
+        text = json.dumps(snapshot(), indent=4)
+    else:
+        text = prometheus()
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+
+    with os.fdopen(fd, 'w') as file:
+        file.write(text)
+
+    os.replace(temp, path)
+
+class Exporter:
+    """
+    Writes the metrics to 'path' every 'interval' seconds on a daemon thread,
+    and once more when it is stopped.
+    """
+
+    def __init__(self: Self, path: str, interval: float = 15.0) -> None:
+        self._path = path
+        self._interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='metrics', daemon=True)
+
+    def __enter__(self: Self) -> Self:
+        self.start()
+        return self
+
+    def __exit__(self: Self, *args: Any) -> None:
+        self.stop()
+
+    @property
+    def path(self: Self) -> str:
+        """
+        Get the file the metrics are written to.
+        """
+
+        return self._path
+
+    def start(self: Self) -> None:
+        self._thread.start()
+
+    def stop(self: Self) -> None:
+        self._stop.set()
+
+        if self._thread.is_alive():
+            self._thread.join()
+
+        write(self._path)
+
+    def _run(self: Self) -> None:
+        while not self._stop.wait(self._interval):
+            try:
+                write(self._path)
+            except OSError as e:
+                from util.logs import (logger)
+
+                logger.warning(f'Exporter(path={self._path}): {e}')
@@ -0,0 +1,80 @@
+
+from sqlite3 import (Connection)
+from typing import (List, Tuple)
+from util.logs import (logger)
+
+import os
+import re
+import sqlite3
+
+"""
+A versioned migration runner for the OHLCV database.
+
+Migrations are the SQL scripts in 'sql/migrations' named 'NNNN_<name>.sql'.
+The number of the last applied migration is kept in the 'user_version' pragma
+of the database, and each pending migration is applied in its own transaction
+so that an interrupted migration leaves the database at the previous version.
+"""
+
+# The directory holding the migration scripts.
+MIGRATIONS_DIR: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir, "sql", "migrations")
+
+def migrations() -> List[Tuple[int, str]]:
+
+    """
+    Returns the version and path of every migration script, ordered by
+    version.
+    """
+
+    scripts = []
+
+    for name in os.listdir(MIGRATIONS_DIR):
+        match = re.fullmatch(r"(\d+)_\w+\.sql", name)
+
+        if match is not None:
+            scripts.append((int(match.group(1)), os.path.join(MIGRATIONS_DIR, name)))
+
+    return sorted(scripts)
+
+def version(con: Connection) -> int:
+
+    """
+    Returns the version of the last migration applied to the database.
+    """
+
+    return con.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(path: str) -> int:
+
+    """
+    Applies the pending migrations to the database at 'path' in place, and
+    returns the resulting version.
+    """
+
+    con: Connection = sqlite3.connect(path, isolation_level=None)
+
+    try:
+        current: int = version(con)
+
+        for number, script in migrations():
+            if number <= current:
+                continue
+
+            logger.info(f"migrate(path={path}): applying {os.path.basename(script)}")
+
+            with open(script, "r") as file:
+                sql_script: str = file.read()
+
+            try:
+                con.executescript(f"BEGIN;\n{sql_script}\nPRAGMA user_version = {number};\nCOMMIT;")
+            except Exception as e:
+                if con.in_transaction:
+                    con.execute("ROLLBACK")
+
+                raise e
+
+            current = number
+
+        return current
+    finally:
+        con.close()
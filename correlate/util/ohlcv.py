@@ -1,8 +1,26 @@
 
+from datetime import (datetime)
 from functools import cached_property
-from typing import (Dict, Final, Iterator, List, Self, Tuple, Union)
+from itertools import (repeat)
+from typing import (Any, Dict, Final, Iterable, Iterator, List, Self, Tuple, Union)
 
-import pandas
+import numpy as np
+
+from util.lazy import (lazy)
+
+# Imported on first use, as only the 'OHLCV' objects and DataFrames need it.
+pandas = lazy('pandas')
+
+# The NumPy record layout of a single OHLCV bar. Timestamps are UNIX epochs in
+# seconds, matching what 'OHLCV.to_tuple' writes to the database.
+OHLCV_DTYPE: Final[np.dtype] = np.dtype([
+    ('t', np.int64),
+    ('o', np.float64),
+    ('h', np.float64),
+    ('l', np.float64),
+    ('c', np.float64),
+    ('v', np.float64),
+])
 
 
 class Model:
@@ -12,7 +30,7 @@ class Model:
 
     def __init__(
             self: Self,
-            timestamp: Union[pandas.Timestamp, int],
+            timestamp: Union['pandas.Timestamp', int],
             open: float,
             high: float,
             low: float,
@@ -49,7 +67,7 @@ class Model:
         yield self.volume
 
     @cached_property
-    def timestamp(self: Self) -> pandas.Timestamp:
+    def timestamp(self: Self) -> 'pandas.Timestamp':
         """
         Returns the timestamp of the 'Model' object.
         """
@@ -133,7 +151,7 @@ class OHLCV(Model):
 
     def __init__(
             self: Self,
-            timestamp: Union[pandas.Timestamp | int],
+            timestamp: Union['pandas.Timestamp', int],
             symbol: str,
             open: float,
             high: float,
@@ -169,7 +187,7 @@ class OHLCV(Model):
         return f"OHLCV(timestamp={self.timestamp}, symbol='{self.symbol}', open={self.open}, high={self.high}, low={self.low}, close={self.close}, volume={self.volume})"
 
     @staticmethod
-    def from_tuple(t: Tuple[pandas.Timestamp, str, float, float, float, float, float]):
+    def from_tuple(t: Tuple['pandas.Timestamp', str, float, float, float, float, float]):
         """
         Creates an OHLCV object from a Tuple.
         """
@@ -184,7 +202,7 @@ class OHLCV(Model):
             volume=t[6],
         )
 
-    def to_tuple(self: Self) -> Tuple[pandas.Timestamp, str, float, float, float, float, float]:
+    def to_tuple(self: Self) -> Tuple['pandas.Timestamp', str, float, float, float, float, float]:
         """
         Converts the OHLCV object to a Tuple.
         """
@@ -198,3 +216,252 @@ class OHLCV(Model):
             self.close,
             self.volume
         )
+
+class OHLCVBatch:
+    """
+    A compact batch of OHLCV bars for a single symbol, stored as parallel
+    NumPy columns with int64 epoch-second timestamps in ascending order.
+
+    A bar costs 48 bytes, compared to several hundred for an 'OHLCV' object,
+    and slicing a batch (by position or by time range) returns views of the
+    same columns without copying.
+    """
+
+    def __init__(
+            self: Self,
+            symbol: str,
+            t: np.ndarray,
+            open: np.ndarray,
+            high: np.ndarray,
+            low: np.ndarray,
+            close: np.ndarray,
+            volume: np.ndarray,
+        ) -> None:
+
+        """
+        Initializes the 'OHLCVBatch' from its columns. The columns must all
+        have the same length and be ordered by timestamp.
+        """
+
+        self._s = symbol
+        self._t = np.asarray(t, dtype=np.int64)
+        self._o = np.asarray(open, dtype=np.float64)
+        self._h = np.asarray(high, dtype=np.float64)
+        self._l = np.asarray(low, dtype=np.float64)
+        self._c = np.asarray(close, dtype=np.float64)
+        self._v = np.asarray(volume, dtype=np.float64)
+
+        if not all(len(x) == len(self._t) for x in (self._o, self._h, self._l, self._c, self._v)):
+            raise ValueError(f"OHLCVBatch(symbol={symbol}, ...): columns must have the same length")
+
+    def __len__(self: Self) -> int:
+        """
+        Returns the number of bars in the 'OHLCVBatch'.
+        """
+
+        return len(self._t)
+
+    def __getitem__(self: Self, key: slice) -> Self:
+        """
+        Returns the bars selected by the slice 'key' as a new 'OHLCVBatch'
+        sharing memory with this one.
+        """
+
+        if not isinstance(key, slice):
+            raise TypeError(f"OHLCVBatch indices must be slices, got {type(key)}")
+
+        return OHLCVBatch(
+            symbol=self._s,
+            t=self._t[key],
+            open=self._o[key],
+            high=self._h[key],
+            low=self._l[key],
+            close=self._c[key],
+            volume=self._v[key],
+        )
+
+    def __iter__(self: Self) -> Iterator[OHLCV]:
+        """
+        Returns an iterator over the bars of the batch as 'OHLCV' objects.
+        """
+
+        for row in zip(self._t.tolist(), self._o.tolist(), self._h.tolist(), self._l.tolist(), self._c.tolist(), self._v.tolist()):
+            yield OHLCV(
+                timestamp=pandas.Timestamp(row[0], unit='s'),
+                symbol=self._s,
+                open=row[1],
+                high=row[2],
+                low=row[3],
+                close=row[4],
+                volume=row[5],
+            )
+
+    def __repr__(self: Self) -> str:
+        """
+        Returns a string representation of the 'OHLCVBatch' object.
+        """
+
+        return f"OHLCVBatch(symbol='{self.symbol}', len={len(self)})"
+
+    @property
+    def symbol(self: Self) -> str:
+        """
+        Returns the symbol of the bars in the batch.
+        """
+
+        return self._s
+
+    @property
+    def t(self: Self) -> np.ndarray:
+        """
+        Returns the timestamps of the batch as UNIX epochs in seconds.
+        """
+
+        return self._t
+
+    @property
+    def open(self: Self) -> np.ndarray:
+        """
+        Returns the open prices of the batch.
+        """
+
+        return self._o
+
+    @property
+    def high(self: Self) -> np.ndarray:
+        """
+        Returns the high prices of the batch.
+        """
+
+        return self._h
+
+    @property
+    def low(self: Self) -> np.ndarray:
+        """
+        Returns the low prices of the batch.
+        """
+
+        return self._l
+
+    @property
+    def close(self: Self) -> np.ndarray:
+        """
+        Returns the close prices of the batch.
+        """
+
+        return self._c
+
+    @property
+    def volume(self: Self) -> np.ndarray:
+        """
+        Returns the volumes of the batch.
+        """
+
+        return self._v
+
+    @property
+    def nbytes(self: Self) -> int:
+        """
+        Returns the number of bytes used by the columns of the batch.
+        """
+
+        return sum(x.nbytes for x in (self._t, self._o, self._h, self._l, self._c, self._v))
+
+    def between(self: Self, t0: Union[datetime, int], t1: Union[datetime, int]) -> Self:
+        """
+        Returns the bars with timestamps in the closed range [t0, t1] as a view
+        of this batch. Timestamps are either datetimes or epoch seconds.
+        """
+
+        if isinstance(t0, datetime):
+            t0 = int(t0.timestamp())
+
+        if isinstance(t1, datetime):
+            t1 = int(t1.timestamp())
+
+        i0 = int(np.searchsorted(self._t, t0, side='left'))
+        i1 = int(np.searchsorted(self._t, t1, side='right'))
+
+        return self[i0:i1]
+
+    def columns(self: Self) -> Dict[str, np.ndarray]:
+        """
+        Returns the columns of the batch keyed by 't', 'o', 'h', 'l', 'c' and
+        'v'.
+        """
+
+        return {
+            't': self._t,
+            'o': self._o,
+            'h': self._h,
+            'l': self._l,
+            'c': self._c,
+            'v': self._v,
+        }
+
+    def to_frame(self: Self) -> 'pandas.DataFrame':
+        """
+        Converts the batch to a DataFrame indexed by timestamp, with columns
+        'o', 'h', 'l', 'c' and 'v'.
+        """
+
+        columns = self.columns()
+        index = pandas.DatetimeIndex(pandas.to_datetime(columns.pop('t'), unit='s'), name='t')
+
+        return pandas.DataFrame(data=columns, index=index, copy=False)
+
+    def to_rows(self: Self) -> Iterator[Tuple[int, str, float, float, float, float, float]]:
+        """
+        Returns an iterator over the bars of the batch as rows of the 'ohlcv'
+        database table, in the same layout as 'OHLCV.to_tuple'.
+        """
+
+        return zip(
+            self._t.tolist(),
+            repeat(self._s),
+            self._o.tolist(),
+            self._h.tolist(),
+            self._l.tolist(),
+            self._c.tolist(),
+            self._v.tolist(),
+        )
+
+    @staticmethod
+    def from_records(symbol: str, records: np.ndarray):
+        """
+        Creates an 'OHLCVBatch' from a NumPy record array with the
+        'OHLCV_DTYPE' layout.
+        """
+
+        return OHLCVBatch(
+            symbol=symbol,
+            t=np.ascontiguousarray(records['t']),
+            open=np.ascontiguousarray(records['o']),
+            high=np.ascontiguousarray(records['h']),
+            low=np.ascontiguousarray(records['l']),
+            close=np.ascontiguousarray(records['c']),
+            volume=np.ascontiguousarray(records['v']),
+        )
+
+    @staticmethod
+    def from_rows(symbol: str, rows: Iterable[Tuple[int, float, float, float, float, float]]):
+        """
+        Creates an 'OHLCVBatch' from an iterable of (t, o, h, l, c, v) rows, such
+        as a database cursor.
+        """
+
+        return OHLCVBatch.from_records(symbol, np.fromiter(rows, dtype=OHLCV_DTYPE))
+
+    @staticmethod
+    def from_aggs(symbol: str, aggs: Iterable[Any]):
+        """
+        Creates an 'OHLCVBatch' from an iterable of Polygon 'Agg' records. The
+        millisecond timestamps of the records are converted to seconds.
+        """
+
+        rows = (
+            (agg.timestamp // 1000, agg.open, agg.high, agg.low, agg.close, agg.volume)
+            for agg in aggs
+        )
+
+        return OHLCVBatch.from_rows(symbol, rows)
@@ -0,0 +1,111 @@
+
+from functools import (lru_cache)
+from typing import (Dict, Iterable, Iterator, List, Optional, Tuple)
+
+import numpy as np
+
+"""
+Sparse output of correlation matrices: the pairs of tickers whose
+correlations are the 'k' strongest, or at least a 'threshold' in absolute
+value, as (i, j, rho) triplets with i < j.
+
+Pairs are selected from one (n, n) matrix at a time, so a stream of matrices
+such as 'dcc_loss.R_iter' is reduced step by step and the output only grows
+with the number of pairs kept. The triplets of every step are collected into
+a coordinate format of four aligned arrays, 'step', 'i', 'j' and 'rho'.
+"""
+
+# The triplets of the selected pairs of every step, as aligned arrays.
+Pairs = Dict[str, np.ndarray]
+
+
+@lru_cache(maxsize=8)
+def _upper(n: int) -> Tuple[np.ndarray, np.ndarray]:
+    return np.triu_indices(n, k=1)
+
+def select(
+        R: np.ndarray,
+        k: Optional[int] = None,
+        threshold: Optional[float] = None,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+
+    """
+    Returns the (i, j, rho) triplets of the pairs of the (n, n) correlation
+    matrix 'R' with an absolute correlation of at least 'threshold', if
+    given, and among the 'k' strongest, if given, from the strongest.
+    """
+
+    if k is not None and k < 1:
+        raise ValueError(f"Invalid number of pairs: {k}. Must be positive.")
+
+    if threshold is not None and not 0.0 <= threshold <= 1.0:
+        raise ValueError(f"Invalid threshold: {threshold}. Must be between 0 and 1.")
+
+    i, j = _upper(R.shape[0])
+    rho = R[i, j]
+    strength = np.abs(rho)
+
+    if threshold is not None:
+        keep = np.flatnonzero(strength >= threshold)
+    else:
+        keep = np.arange(len(rho))
+
+    # A partial sort picks the 'k' strongest pairs in linear time, and only
+    # those are sorted.
+    if k is not None and k < len(keep):
+        keep = keep[np.argpartition(-strength[keep], k - 1)[:k]]
+
+    keep = keep[np.argsort(-strength[keep], kind='stable')]
+
+    return i[keep], j[keep], rho[keep]
+
+def stream(
+        Rs: Iterable[np.ndarray],
+        k: Optional[int] = None,
+        threshold: Optional[float] = None,
+        start: int = 0,
+    ) -> Iterator[Tuple[int, np.ndarray, np.ndarray, np.ndarray]]:
+
+    """
+    Yields the step, numbered from 'start', and the (i, j, rho) triplets of
+    the pairs selected from each correlation matrix of 'Rs' (see 'select').
+    """
+
+    for step, R in enumerate(Rs, start=start):
+        yield step, *select(R, k=k, threshold=threshold)
+
+def collect(triplets: Iterable[Tuple[int, np.ndarray, np.ndarray, np.ndarray]]) -> Pairs:
+
+    """
+    Returns the triplets yielded by 'stream' as one set of aligned arrays.
+    """
+
+    steps: List[np.ndarray] = []
+    i: List[np.ndarray] = []
+    j: List[np.ndarray] = []
+    rho: List[np.ndarray] = []
+
+    for step, si, sj, srho in triplets:
+        steps.append(np.full(len(si), step, dtype=np.int64))
+        i.append(si)
+        j.append(sj)
+        rho.append(srho)
+
+    return {
+        'step': np.concatenate([*steps, np.empty(0, dtype=np.int64)]),
+        'i': np.concatenate([*i, np.empty(0, dtype=np.int64)]).astype(np.int64),
+        'j': np.concatenate([*j, np.empty(0, dtype=np.int64)]).astype(np.int64),
+        'rho': np.concatenate([*rho, np.empty(0)]),
+    }
+
+def named(pairs: Pairs, tickers: List[str]) -> List[Tuple[int, str, str, float]]:
+
+    """
+    Returns the triplets of 'pairs' as (step, ticker, ticker, rho) tuples,
+    naming each row of the correlation matrices by its ticker in 'tickers'.
+    """
+
+    return [
+        (int(step), tickers[i], tickers[j], float(rho))
+        for step, i, j, rho in zip(pairs['step'], pairs['i'], pairs['j'], pairs['rho'])
+    ]
@@ -0,0 +1,163 @@
+
+from typing import (Final, Dict, List, Optional, Self, Tuple)
+
+import numpy as np
+
+from util.lazy import (lazy)
+
+# Imported on first use, as only 'Panel.to_frame' needs it.
+pd = lazy('pandas')
+
+# The database column holding each OHLCV field, keyed by the field names
+# accepted by the '--column' command-line option.
+FIELDS: Final[Dict[str, str]] = {
+    'open': 'o',
+    'high': 'h',
+    'low': 'l',
+    'close': 'c',
+    'volume': 'v',
+}
+
+
+class Panel:
+    """
+    A (T, n) matrix of one OHLCV field for n symbols, aligned on the union of
+    their timestamps. Missing bars are NaN in 'values' and False in 'mask'.
+    """
+
+    def __init__(
+            self: Self,
+            t: np.ndarray,
+            symbols: List[str],
+            values: np.ndarray,
+            mask: np.ndarray,
+        ) -> None:
+
+        """
+        Initializes the attributes of the 'Panel' with the given timestamps,
+        symbols, values and mask of present bars.
+        """
+
+        self._t = t
+        self._symbols = symbols
+        self._values = values
+        self._mask = mask
+
+    def __len__(self: Self) -> int:
+        """
+        Returns the number of timestamps in the 'Panel'.
+        """
+
+        return len(self._t)
+
+    def __repr__(self: Self) -> str:
+        """
+        Returns a string representation of the 'Panel' object.
+        """
+
+        return f"Panel(symbols={self.symbols}, len={len(self)}, missing={self.missing})"
+
+    @property
+    def t(self: Self) -> np.ndarray:
+        """
+        Returns the timestamps of the rows of the panel as UNIX epochs in
+        seconds.
+        """
+
+        return self._t
+
+    @property
+    def symbols(self: Self) -> List[str]:
+        """
+        Returns the symbols of the columns of the panel.
+        """
+
+        return self._symbols
+
+    @property
+    def values(self: Self) -> np.ndarray:
+        """
+        Returns the (T, n) matrix of values, with NaN for missing bars.
+        """
+
+        return self._values
+
+    @property
+    def mask(self: Self) -> np.ndarray:
+        """
+        Returns the (T, n) boolean matrix that is True where a bar is present.
+        """
+
+        return self._mask
+
+    @property
+    def missing(self: Self) -> int:
+        """
+        Returns the number of missing bars in the panel.
+        """
+
+        return int(self._mask.size - np.count_nonzero(self._mask))
+
+    def to_frame(self: Self) -> 'pd.DataFrame':
+        """
+        Converts the panel to a DataFrame indexed by timestamp with one column
+        per symbol.
+        """
+
+        index = pd.DatetimeIndex(pd.to_datetime(self._t, unit='s'), name='t')
+
+        return pd.DataFrame(data=self._values, index=index, columns=self._symbols, copy=False)
+
+
+def pivot(t: np.ndarray, i: np.ndarray, x: np.ndarray, symbols: List[str]) -> Panel:
+
+    """
+    Pivots long-format rows, given as timestamps 't' sorted in ascending order,
+    symbol indices 'i' into 'symbols' and values 'x', into an aligned 'Panel'
+    in a single pass.
+    """
+
+    n = len(symbols)
+
+    # Since 't' is sorted, each new timestamp starts a new row of the panel.
+    start = np.empty(len(t), dtype=bool)
+    start[:1] = True
+    np.not_equal(t[1:], t[:-1], out=start[1:])
+
+    row = np.cumsum(start) - 1
+
+    values = np.full((int(np.count_nonzero(start)), n), np.nan)
+    values[row, i] = x
+
+    mask = np.zeros(values.shape, dtype=bool)
+    mask[row, i] = True
+
+    return Panel(t=t[start], symbols=list(symbols), values=values, mask=mask)
+
+def subset(
+        panel: Panel,
+        symbols: List[str],
+        mask: Optional[np.ndarray] = None,
+    ) -> Tuple[Panel, Optional[np.ndarray]]:
+
+    """
+    Returns the columns of 'symbols' of 'panel' and of its (T, n) session
+    'mask', if given (see 'util.session.restrict'), without the timestamps
+    at which none of 'symbols' has a bar in session, as if the panel of
+    'symbols' had been loaded and filtered on its own.
+    """
+
+    columns = [panel.symbols.index(symbol) for symbol in symbols]
+    rows = panel.mask[:, columns].any(axis=1)
+
+    if mask is not None:
+        rows &= mask[:, columns].any(axis=1)
+
+    selected = Panel(
+        t=panel.t[rows],
+        symbols=list(symbols),
+        values=panel.values[rows][:, columns],
+        mask=panel.mask[rows][:, columns],
+    )
+
+    return selected, None if mask is None else mask[rows][:, columns]
@@ -0,0 +1,66 @@
+
+from typing import (Any, Iterable, Iterator, Optional, Tuple, TypeVar)
+
+import queue
+import threading
+
+T = TypeVar('T')
+
+# Marks the end of the items produced by the background thread.
+_DONE: object = object()
+
+def prefetch(iterable: Iterable[T], depth: int = 2) -> Iterator[T]:
+
+    """
+    Iterates over 'iterable' on a background thread, keeping up to 'depth'
+    items ready ahead of the consumer. The producer blocks while the queue is
+    full, so at most 'depth' items are held in memory at once. An exception
+    raised by the producer is re-raised to the consumer, and closing the
+    returned iterator stops the producer at the next item.
+
+    With a 'depth' of zero, 'iterable' is iterated in the calling thread.
+    """
+
+    if depth <= 0:
+        yield from iterable
+        return
+
+    items: queue.Queue[Tuple[Any, Optional[BaseException]]] = queue.Queue(maxsize=depth)
+    stop: threading.Event = threading.Event()
+
+    def put(item: Any, error: Optional[BaseException] = None) -> bool:
+        while not stop.is_set():
+            try:
+                items.put((item, error), timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+
+        return False
+
+    def produce() -> None:
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+
+            put(_DONE)
+        except BaseException as e:
+            put(_DONE, e)
+
+    thread = threading.Thread(target=produce, name='prefetch', daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            item, error = items.get()
+
+            if error is not None:
+                raise error
+
+            if item is _DONE:
+                return
+
+            yield item
+    finally:
+        stop.set()
@@ -0,0 +1,318 @@
+
+from collections import (Counter, defaultdict)
+from typing import (Any, Dict, Final, List, Optional, Self, Tuple)
+
+import os
+import sys
+import threading
+import time
+
+"""
+Per-stage timing of a run.
+
+Stages are timed with the 'stage' context manager, keyed by a stage name and
+any number of keyword keys such as the ticker or window being processed:
+
+    with stage('api', ticker=ticker):
+        ...
+
+Stages nest, and a stage inherits the keys of the stages enclosing it in the
+same thread. Until 'enable' is called, 'stage' returns a shared no-op context
+manager, so instrumented code pays for little more than a function call.
+
+A 'Profiler' can also run cProfile over the thread that enabled it, and
+sample the stacks of every thread into a collapsed-stack file that flame
+graph tools read.
+"""
+
+# The keys of a timed stage, as sorted (name, value) pairs.
+Keys = Tuple[Tuple[str, str], ...]
+
+# The number of slowest keys of each stage listed in the report.
+TOP: Final[int] = 3
+
+
+class _Disabled:
+    """
+    The context manager returned by 'stage' while profiling is disabled.
+    """
+
+    def __enter__(self: Self) -> None:
+        return None
+
+    def __exit__(self: Self, *args: Any) -> None:
+        return None
+
+_DISABLED: Final[_Disabled] = _Disabled()
+
+class _Stage:
+    """
+    Times one stage on entry and exit, and records its duration in its
+    profiler.
+    """
+
+    __slots__ = ('_profiler', '_name', '_keys', '_t', '_parent')
+
+    def __init__(self: Self, profiler: 'Profiler', name: str, keys: Dict[str, Any]) -> None:
+        self._profiler = profiler
+        self._name = name
+        self._keys = keys
+
+    def __enter__(self: Self) -> None:
+        local = self._profiler._local
+        self._parent = getattr(local, 'keys', {})
+
+        if len(self._keys) > 0:
+            local.keys = {**self._parent, **{k: str(v) for k, v in self._keys.items()}}
+
+        self._t = time.perf_counter()
+
+    def __exit__(self: Self, *args: Any) -> None:
+        seconds = time.perf_counter() - self._t
+        local = self._profiler._local
+
+        self._profiler.record(self._name, tuple(sorted(getattr(local, 'keys', {}).items())), seconds)
+
+        local.keys = self._parent
+
+class _Sampler:
+    """
+    Samples the Python stacks of every other thread every 'interval' seconds
+    on a daemon thread, and counts each distinct stack.
+    """
+
+    def __init__(self: Self, interval: float) -> None:
+        self._interval = interval
+        self._stacks: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    @property
+    def stacks(self: Self) -> Counter:
+        """
+        Get the number of samples of each stack, as collapsed stacks of
+        semicolon-separated frames from the thread down to the innermost
+        frame.
+        """
+
+        return self._stacks
+
+    def start(self: Self) -> None:
+        self._thread.start()
+
+    def stop(self: Self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self: Self) -> None:
+        names = {}
+
+        while not self._stop.wait(self._interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == threading.get_ident():
+                    continue
+
+                if ident not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+
+                frames = []
+
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+
+                frames.append(names.get(ident, str(ident)))
+
+                self._stacks[';'.join(reversed(frames))] += 1
+
+class Profiler:
+    """
+    Accumulates the number of calls and the total and largest durations of
+    every stage and set of keys timed while it is enabled.
+    """
+
+    def __init__(self: Self, cprofile: bool = False, interval: Optional[float] = None) -> None:
+        self._stats: Dict[str, Dict[Keys, List[float]]] = defaultdict(dict)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._t = time.perf_counter()
+        self._wall: Optional[float] = None
+
+        if cprofile:
+            import cProfile
+
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        else:
+            self._cprofile = None
+
+        if interval is not None:
+            self._sampler = _Sampler(interval)
+            self._sampler.start()
+        else:
+            self._sampler = None
+
+    @property
+    def wall(self: Self) -> float:
+        """
+        Get the number of seconds the profiler has been, or was, enabled.
+        """
+
+        return (time.perf_counter() if self._wall is None else self._wall) - self._t
+
+    def record(self: Self, name: str, keys: Keys, seconds: float) -> None:
+
+        """
+        Records a call of the stage 'name' with 'keys' that took 'seconds'.
+        """
+
+        with self._lock:
+            entry = self._stats[name].get(keys)
+
+            if entry is None:
+                self._stats[name][keys] = [1, seconds, seconds]
+            else:
+                entry[0] += 1
+                entry[1] += seconds
+                entry[2] = max(entry[2], seconds)
+
+    def stop(self: Self) -> None:
+
+        """
+        Stops cProfile and the stack sampler, if they are running, and fixes
+        the wall time of the run.
+        """
+
+        if self._wall is None:
+            self._wall = time.perf_counter()
+
+        if self._cprofile is not None:
+            self._cprofile.disable()
+
+        if self._sampler is not None:
+            self._sampler.stop()
+
+    def breakdown(self: Self) -> List[Dict[str, Any]]:
+
+        """
+        Returns the totals of each stage, from the slowest: its 'calls', total
+        and largest 'seconds', and its 'top' slowest keys with their total
+        seconds.
+        """
+
+        with self._lock:
+            stats = {name: dict(entries) for name, entries in self._stats.items()}
+
+        rows = []
+
+        for name, entries in stats.items():
+            keyed = sorted(((keys, entry[1]) for keys, entry in entries.items() if len(keys) > 0), key=lambda x: -x[1])
+
+            rows.append({
+                'stage': name,
+                'calls': int(sum(entry[0] for entry in entries.values())),
+                'seconds': sum(entry[1] for entry in entries.values()),
+                'max': max(entry[2] for entry in entries.values()),
+                'top': [(' '.join(f"{k}={v}" for k, v in keys), seconds) for keys, seconds in keyed[:TOP]],
+            })
+
+        return sorted(rows, key=lambda row: -row['seconds'])
+
+    def report(self: Self) -> str:
+
+        """
+        Returns the breakdown of the run as a table. Stages nest and may run
+        on several threads at once, so their shares of the wall time need not
+        add up to 100%.
+        """
+
+        wall = self.wall
+        lines = [
+            f"{'stage':<16} {'calls':>8} {'total (s)':>11} {'mean (ms)':>11} {'max (ms)':>11} {'share':>7}",
+        ]
+
+        for row in self.breakdown():
+            lines.append(
+                f"{row['stage']:<16} {row['calls']:>8} {row['seconds']:>11.3f} "
+                f"{row['seconds'] / row['calls'] * 1e3:>11.2f} {row['max'] * 1e3:>11.2f} "
+                f"{row['seconds'] / wall:>7.1%}"
+            )
+
+            for keys, seconds in row['top']:
+                lines.append(f"  {keys:<40} {seconds:>11.3f}")
+
+        lines.append(f"{'wall':<16} {'':>8} {wall:>11.3f}")
+
+        return '\n'.join(lines)
+
+    def dump(self: Self, path: str) -> None:
+
+        """
+        Writes the cProfile statistics of the run to 'path', for 'pstats' or
+        'snakeviz'.
+        """
+
+        if self._cprofile is None:
+            raise ValueError("Invalid profiler: cProfile is not enabled.")
+
+        self._cprofile.dump_stats(path)
+
+    def dump_stacks(self: Self, path: str) -> None:
+
+        """
+        Writes the sampled stacks of the run to 'path' in the collapsed-stack
+        format of 'flamegraph.pl' and 'speedscope', one stack and its number
+        of samples per line.
+        """
+
+        if self._sampler is None:
+            raise ValueError("Invalid profiler: stack sampling is not enabled.")
+
+        with open(path, 'w') as file:
+            for stack, count in self._sampler.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+
+_profiler: Optional[Profiler] = None
+
+def stage(name: str, **keys: Any) -> Any:
+
+    """
+    Returns a context manager timing the stage 'name' with 'keys' in the
+    enabled profiler, or a no-op context manager if profiling is disabled.
+    """
+
+    if _profiler is None:
+        return _DISABLED
+
+    return _Stage(_profiler, name, keys)
+
+def enable(cprofile: bool = False, interval: Optional[float] = None) -> Profiler:
+
+    """
+    Starts timing stages in a new profiler and returns it. With 'cprofile'
+    the calling thread is also profiled with cProfile, and with an
+    'interval' the stacks of every thread are sampled every 'interval'
+    seconds.
+    """
+
+    global _profiler
+
+    _profiler = Profiler(cprofile=cprofile, interval=interval)
+
+    return _profiler
+
+def disable() -> Optional[Profiler]:
+
+    """
+    Stops timing stages, and returns the profiler that was enabled, if any.
+    """
+
+    global _profiler
+
+    profiler, _profiler = _profiler, None
+
+    if profiler is not None:
+        profiler.stop()
+
+    return profiler
@@ -0,0 +1,86 @@
+
+from typing import (Final, Tuple)
+from util.ohlcv import (OHLCVBatch)
+
+import numpy as np
+
+"""
+Vectorized resampling of OHLCV bars into coarser timespans. Bars are grouped
+into UTC calendar buckets (days, weeks starting on Monday, or months) and each
+bucket is reduced in a single pass over the columns: first open, max high,
+min low, last close and summed volume.
+"""
+
+# The timespans accepted by the Polygon aggregates API, from finest to coarsest.
+TIMESPANS: Final[Tuple[str, ...]] = ('minute', 'hour', 'day', 'week', 'month')
+
+# The timespans that are derived locally from cached hourly bars.
+DERIVED: Final[Tuple[str, ...]] = ('day', 'week', 'month')
+
+# The timespans too coarse for weekly windows, which hold at most one of their
+# bars and so no returns.
+COARSE: Final[Tuple[str, ...]] = ('week', 'month')
+
+def floor(t: np.ndarray, timespan: str) -> np.ndarray:
+
+    """
+    Returns the start of the bucket over 'timespan' containing each of the
+    epoch-second timestamps 't', as epoch seconds.
+    """
+
+    t = np.asarray(t, dtype=np.int64)
+
+    if timespan == 'minute':
+        return t - t % 60
+    elif timespan == 'hour':
+        return t - t % 3600
+    elif timespan == 'day':
+        return t - t % 86400
+    elif timespan == 'week':
+        # The UNIX epoch fell on a Thursday, so weeks starting on Monday are
+        # offset by three days from multiples of seven days.
+        return t - (t + 3 * 86400) % (7 * 86400)
+    elif timespan == 'month':
+        return t.astype('datetime64[s]').astype('datetime64[M]').astype('datetime64[s]').astype(np.int64)
+    else:
+        raise ValueError(f"Invalid timespan: {timespan}. Must be one of {', '.join(TIMESPANS)}.")
+
+def ceil(t: np.ndarray, timespan: str) -> np.ndarray:
+
+    """
+    Returns the start of the bucket over 'timespan' following the one
+    containing each of the epoch-second timestamps 't', as epoch seconds.
+    """
+
+    start = floor(t, timespan)
+
+    if timespan == 'month':
+        return (start.astype('datetime64[s]').astype('datetime64[M]') + 1).astype('datetime64[s]').astype(np.int64)
+
+    return start + {'minute': 60, 'hour': 3600, 'day': 86400, 'week': 7 * 86400}[timespan]
+
+def resample(batch: OHLCVBatch, timespan: str) -> OHLCVBatch:
+
+    """
+    Resamples the bars of 'batch', which must be ordered by timestamp, into
+    bars over 'timespan' stamped with the start of their bucket.
+    """
+
+    if len(batch) == 0:
+        return batch
+
+    key = floor(batch.t, timespan)
+
+    # Since the bars are ordered, each change of bucket starts a new group.
+    start = np.flatnonzero(np.concatenate(([True], key[1:] != key[:-1])))
+    last = np.append(start[1:], len(key)) - 1
+
+    return OHLCVBatch(
+        symbol=batch.symbol,
+        t=key[start],
+        open=batch.open[start],
+        high=np.maximum.reduceat(batch.high, start),
+        low=np.minimum.reduceat(batch.low, start),
+        close=batch.close[last],
+        volume=np.add.reduceat(batch.volume, start),
+    )
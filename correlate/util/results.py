@@ -0,0 +1,243 @@
+
+from datetime import (datetime)
+from model import (FitReport, FitStats)
+from sqlite3 import (Connection)
+from typing import (Any, Dict, Final, List, Optional, Self, Set, Tuple)
+from util.logs import (logger)
+from util.pairs import (Pairs, named)
+
+import hashlib
+import json
+import numpy as np
+import os
+import sqlite3
+
+"""
+A streaming sink for the per-window output of the GARCH and DCC models.
+"""
+
+# The directory holding the SQL scripts for the results database.
+SQL_DIR: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir, "sql")
+
+# The tables keyed by window, which databases created before windows were
+# keyed by their settings as well are migrated from.
+TABLES: Final[Tuple[str, ...]] = ('dcc', 'garch', 'fits', 'pairs')
+
+# The columns of each table that earlier schemas declared NOT NULL, which
+# tables still declaring them so are rebuilt to allow NULL in.
+NULLABLE: Final[Dict[str, Tuple[str, ...]]] = {'dcc': ('loss',)}
+
+
+class ResultSink:
+    """
+    Appends the fitted GARCH parameters, DCC parameters, final correlation
+    matrix and fit diagnostics of each window to a SQLite results database.
+    Rows are buffered and committed every 'batch_size' windows, and when the
+    sink is closed. The optimizer reports of the fits are stored per model
+    and aggregated over every window written (see 'stats'). Windows written
+    with sparse 'pairs' store those instead of their dense correlation
+    matrix.
+
+    Windows are keyed by the 'settings' of the run as well (see 'key'), so
+    runs with different data or model settings are stored side by side, and
+    a window is only skipped on resume if it was fitted with the same
+    settings.
+    """
+
+    def __init__(
+            self: Self,
+            path: str = "results.db",
+            batch_size: int = 16,
+            settings: Optional[Dict[str, Any]] = None,
+        ) -> None:
+
+        self._batch_size = batch_size
+        self._settings = self.key(settings or {})
+        self._dcc: List[Tuple] = []
+        self._garch: List[Tuple] = []
+        self._fits: List[Tuple] = []
+        self._pairs: List[Tuple] = []
+        self._stats = FitStats()
+
+        self._con: Connection = sqlite3.connect(path)
+
+        self._create()
+
+        with self._con:
+            self._con.execute('INSERT OR IGNORE INTO settings VALUES (?, ?)', (self._settings, json.dumps(settings or {}, sort_keys=True)))
+
+    def _create(self: Self) -> None:
+        # Tables from before windows were keyed by their settings are renamed,
+        # and their rows copied with an empty key that no run's settings have.
+        # Tables with a NOT NULL column that is now nullable are renamed and
+        # their rows copied as they are, as SQLite cannot alter a column.
+        legacy = []
+
+        for table in TABLES:
+            info = {row[1]: row[3] for row in self._con.execute(f'PRAGMA table_info({table})')}
+            columns = ', '.join(info)
+
+            if len(info) > 0 and 'settings' not in info:
+                legacy.append((table, f'settings, {columns}', f"'', {columns}"))
+            elif any(info.get(column) for column in NULLABLE.get(table, ())):
+                legacy.append((table, columns, columns))
+
+        for table, _, _ in legacy:
+            self._con.execute(f'ALTER TABLE {table} RENAME TO {table}_legacy')
+
+        with open(os.path.join(SQL_DIR, "create_table_results.sql"), "r") as file:
+            self._con.executescript(file.read())
+
+        with self._con:
+            for table, columns, values in legacy:
+                self._con.execute(f"INSERT INTO {table} ({columns}) SELECT {values} FROM {table}_legacy")
+                self._con.execute(f'DROP TABLE {table}_legacy')
+
+                logger.info(f'ResultSink._create(): migrated table {table}')
+
+    def __enter__(self: Self) -> Self:
+        return self
+
+    def __exit__(self: Self, *args: Any) -> None:
+        self.close()
+
+    @property
+    def stats(self: Self) -> FitStats:
+        """
+        Get the aggregated optimizer reports of the fits written so far.
+        """
+
+        return self._stats
+
+    @staticmethod
+    def universe(tickers: List[str]) -> str:
+        """
+        Returns the key of the universe of 'tickers' in the results database.
+        """
+
+        return " ".join(tickers)
+
+    @staticmethod
+    def key(settings: Dict[str, Any]) -> str:
+        """
+        Returns the key of the fit 'settings' in the results database, a hash
+        of the settings that determine the returns and the fitted models.
+        """
+
+        return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:16]
+
+    @property
+    def settings(self: Self) -> str:
+        """
+        Get the key of the settings of the windows written by the sink.
+        """
+
+        return self._settings
+
+    def windows(self: Self, tickers: List[str]) -> Set[Tuple[int, int]]:
+        """
+        Returns the (t0, t1) epoch-second bounds of the windows already stored
+        for the universe of 'tickers' with the settings of the sink, including
+        those not yet committed.
+        """
+
+        universe = self.universe(tickers)
+
+        stored = self._con.execute('SELECT t0, t1 FROM dcc WHERE universe = ? AND settings = ?', (universe, self._settings)).fetchall()
+        pending = [(row[1], row[2]) for row in self._dcc if row[0] == universe]
+
+        return set(stored) | set(pending)
+
+    def contains(self: Self, tickers: List[str], t0: datetime, t1: datetime) -> bool:
+        """
+        Returns whether the window [t0, t1] is already stored for the universe
+        of 'tickers'.
+        """
+
+        return (int(t0.timestamp()), int(t1.timestamp())) in self.windows(tickers)
+
+    def write(
+            self: Self,
+            tickers: List[str],
+            t0: datetime,
+            t1: datetime,
+            thetas: np.ndarray,
+            garch_losses: np.ndarray,
+            ab: np.ndarray,
+            R: np.ndarray,
+            loss: Optional[float],
+            iterations: int,
+            nobs: int,
+            garch_reports: Optional[List[FitReport]] = None,
+            report: Optional[FitReport] = None,
+            pairs: Optional[Pairs] = None,
+        ) -> None:
+
+        """
+        Buffers the output of the models fitted to the window [t0, t1] for the
+        universe of 'tickers', committing once 'batch_size' windows are
+        buffered.
+        """
+
+        universe = self.universe(tickers)
+        w0, w1 = int(t0.timestamp()), int(t1.timestamp())
+        key = self._settings
+
+        self._dcc.append((
+            universe, w0, w1, key,
+            float(ab[0]), float(ab[1]),
+            json.dumps(np.asarray(R).tolist() if pairs is None else None),
+            None if loss is None else float(loss), int(iterations), int(nobs),
+        ))
+
+        for ticker, theta, garch_loss in zip(tickers, thetas, garch_losses):
+            self._garch.append((universe, w0, w1, key, ticker, json.dumps(np.asarray(theta).tolist()), float(garch_loss)))
+
+        if pairs is not None:
+            self._pairs.extend((universe, w0, w1, key, *triplet) for triplet in named(pairs, tickers))
+
+        fits = list(zip(tickers, garch_reports or [])) + ([('', report)] if report is not None else [])
+
+        for ticker, fit in fits:
+            self._fits.append((
+                universe, w0, w1, key, ticker, fit.model,
+                fit.calls, fit.nfev, fit.njev, fit.nit, fit.seconds,
+                int(fit.success), fit.status, fit.message, fit.violation, int(fit.cached),
+            ))
+
+            self._stats.add(fit, universe=universe, window=f'{t0:%Y-%m-%d}', ticker=ticker or None)
+
+        if len(self._dcc) >= self._batch_size:
+            self.flush()
+
+    def flush(self: Self) -> None:
+        """
+        Commits the buffered rows to the results database.
+        """
+
+        if len(self._dcc) == 0:
+            return
+
+        with self._con:
+            self._con.executemany('INSERT OR REPLACE INTO dcc VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', self._dcc)
+            self._con.executemany('INSERT OR REPLACE INTO garch VALUES (?, ?, ?, ?, ?, ?, ?)', self._garch)
+            self._con.executemany('INSERT OR REPLACE INTO fits VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', self._fits)
+            # The pairs of a window are replaced as a whole, as a refit may
+            # keep other pairs than the one it replaces.
+            self._con.executemany('DELETE FROM pairs WHERE universe = ? AND t0 = ? AND t1 = ? AND settings = ?', [row[:4] for row in self._dcc])
+            self._con.executemany('INSERT OR REPLACE INTO pairs VALUES (?, ?, ?, ?, ?, ?, ?, ?)', self._pairs)
+
+        logger.info(f'ResultSink.flush(): committed {len(self._dcc)} windows')
+
+        self._dcc.clear()
+        self._garch.clear()
+        self._fits.clear()
+        self._pairs.clear()
+
+    def close(self: Self) -> None:
+        """
+        Commits the buffered rows and closes the results database.
+        """
+
+        self.flush()
+        self._con.close()
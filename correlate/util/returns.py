@@ -0,0 +1,90 @@
+
+from typing import (Final, Tuple, Union)
+from util.panel import (Panel)
+
+import numpy as np
+
+"""
+Construction of return panels from aligned price matrices. The returns are
+laid out as a C-contiguous float64 (n, T) array ordered from the newest to the
+oldest bar, i.e. [[r1_T, ..., r1_1], ..., [rn_T, ..., rn_1]], which is the
+layout expected by 'GARCH.fit' (one row per ticker) and 'DCC.fit'.
+"""
+
+# The kinds of returns that can be computed.
+KINDS: Final[Tuple[str, ...]] = ('simple', 'log')
+
+# The policies for handling missing bars.
+#
+#  * 'drop' discards every timestamp where any ticker is missing a bar, and
+#    computes returns between the remaining timestamps.
+#  * 'ffill' carries each ticker's last price forward over missing bars, and
+#    discards the leading timestamps before every ticker has a price.
+#  * 'mask' keeps every timestamp, and sets returns that start or end on a
+#    missing bar to zero.
+MISSING: Final[Tuple[str, ...]] = ('drop', 'ffill', 'mask')
+
+def returns(
+        prices: Union[Panel, np.ndarray],
+        kind: str = 'simple',
+        missing: str = 'drop',
+        mask: np.ndarray = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+
+    """
+    Computes the returns of a (T, n) matrix of prices ordered from the oldest
+    to the newest bar, or of the values of a 'Panel'. Missing bars are NaN or
+    False in 'mask', and are handled according to 'missing'.
+
+    :return: The (n, T') returns, newest first, and the positions of the rows
+        of 'prices' that each return ends on, in the same order.
+    """
+
+    if kind not in KINDS:
+        raise ValueError(f"Invalid kind of returns: {kind}. Must be one of {', '.join(KINDS)}.")
+
+    if missing not in MISSING:
+        raise ValueError(f"Invalid missing data policy: {missing}. Must be one of {', '.join(MISSING)}.")
+
+    if isinstance(prices, Panel):
+        mask = prices.mask if mask is None else mask & prices.mask
+        prices = prices.values
+
+    prices = np.asarray(prices, dtype=np.float64)
+
+    if mask is None:
+        mask = ~np.isnan(prices)
+
+    rows = np.arange(len(prices))
+
+    if missing == 'drop':
+        rows = rows[mask.all(axis=1)]
+        prices = prices[rows]
+    elif missing == 'ffill':
+        last = np.maximum.accumulate(np.where(mask, rows[:, None], -1), axis=0)
+        start = int(np.searchsorted(last.min(axis=1), 0, side='left'))
+        rows = rows[start:]
+        prices = np.take_along_axis(prices, last[start:], axis=0)
+    else:
+        prices = np.where(mask, prices, np.nan)
+
+    T, n = prices.shape
+
+    if T < 2:
+        return np.empty((n, 0)), np.empty(0, dtype=np.intp)
+
+    # Write the returns through a time-reversed view, so that the contiguous
+    # output is ordered newest first without a further copy.
+    r = np.empty((n, T - 1))
+    out = r[:, ::-1]
+    x = prices.T
+
+    if kind == 'simple':
+        np.subtract(np.divide(x[:, 1:], x[:, :-1], out=out), 1.0, out=out)
+    else:
+        np.log(np.divide(x[:, 1:], x[:, :-1], out=out), out=out)
+
+    if missing == 'mask':
+        np.nan_to_num(r, copy=False, nan=0.0)
+
+    return r, rows[:0:-1]
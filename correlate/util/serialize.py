@@ -0,0 +1,45 @@
+
+from datetime import (datetime)
+from typing import (Any, Dict, Tuple, Union)
+from util.pairs import (named)
+
+import numpy as np
+
+"""
+The JSON form of the answers to correlation queries, shared by the service
+and the batch job runner.
+"""
+
+# A query for the correlation matrix of a universe of tickers over the window
+# [t0, t1].
+Query = Tuple[Tuple[str, ...], datetime, datetime]
+
+
+def encode(query: Query, answer: Union[Dict[str, Any], Exception]) -> Dict[str, Any]:
+
+    """
+    Returns the JSON object answering 'query'.
+    """
+
+    tickers, t0, t1 = query
+
+    obj = {'tickers': list(tickers), 'start': t0.isoformat(), 'end': t1.isoformat()}
+
+    if isinstance(answer, Exception):
+        obj['error'] = str(answer)
+    else:
+        obj['ab'] = np.asarray(answer['ab']).tolist()
+
+        if 'pairs' in answer:
+            obj['pairs'] = named(answer['pairs'], list(tickers))
+        else:
+            obj['R'] = np.asarray(answer['R']).tolist()
+
+        obj['thetas'] = np.asarray(answer['thetas']).tolist()
+        obj['loss'] = None if answer['loss'] is None else float(answer['loss'])
+        obj['iterations'] = int(answer['iterations'])
+        obj['nobs'] = int(answer['nobs'])
+        obj['report'] = answer['report'].to_dict()
+        obj['garch_reports'] = [report.to_dict() for report in answer['garch_reports']]
+
+    return obj
@@ -0,0 +1,199 @@
+
+from typing import (Dict, Final, List, Optional, Tuple)
+from util.calendar import (CALENDARS, Calendar, calendar_of)
+from util.logs import (logger)
+from util.metrics import (Counter, counter)
+from util.panel import (Panel)
+
+import numpy as np
+
+"""
+Vectorized filtering of intraday bars to the trading sessions of their
+exchanges, and detection of the bars missing from those sessions.
+
+A bar is in session when its midpoint falls within a session's [open,
+close), so an hourly bar from 9:00 to 10:00 Eastern counts towards the 9:30
+open and one from 16:00 to 17:00 does not. Bars are matched to sessions by
+binary search over the session opens, with every session of the range of
+the bars computed at once by the calendar.
+
+'restrict' turns a 'Panel' into the mask of its bars that are in session
+for the calendar of each ticker, and drops the timestamps that are in no
+ticker's session. The mask is passed to 'util.returns.returns', where bars
+out of session are handled like missing bars by its 'missing' policy, so
+overnight bars never reach the models.
+"""
+
+# The session filters: 'all' keeps every bar, 'regular' the bars of the
+# regular sessions, and 'extended' those of the pre-market and after-hours
+# sessions as well.
+SESSIONS: Final[Tuple[str, ...]] = ('all', 'regular', 'extended')
+
+# The length of the intraday timespans in seconds. Coarser bars are never
+# filtered.
+STEPS: Final[Dict[str, int]] = {
+    'minute': 60,
+    'hour': 3600,
+}
+
+# The bars dropped or found missing by the session filter.
+OUT_OF_SESSION: Final[Counter] = counter('correlate_bars_out_of_session_total', 'The bars outside the sessions of their exchange.')
+MISSING_BARS: Final[Counter] = counter('correlate_bars_missing_total', 'The bars missing from the sessions of their exchange.')
+
+
+def sessions(calendar: Calendar, t0: int, t1: int, extended: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+
+    """
+    Returns the UTC opens and closes, in epoch seconds, of the sessions of
+    'calendar' around the epoch seconds 't0' to 't1'.
+    """
+
+    # A day either side covers sessions whose local dates differ from their
+    # UTC dates.
+    days = calendar.sessions(np.datetime64(t0 - 86400, 's'), np.datetime64(t1 + 86400, 's'))
+    opens, closes = calendar.opens_closes(days, extended=extended)
+
+    return opens.astype(np.int64), closes.astype(np.int64)
+
+def in_session(
+        t: np.ndarray,
+        calendar: Calendar,
+        step: int,
+        extended: bool = False,
+    ) -> np.ndarray:
+
+    """
+    Returns whether each bar of 'step' seconds starting at the sorted epoch
+    seconds 't' is in a session of 'calendar'.
+    """
+
+    t = np.asarray(t, dtype=np.int64)
+
+    if len(t) == 0:
+        return np.zeros(0, dtype=bool)
+
+    opens, closes = sessions(calendar, int(t[0]), int(t[-1]), extended=extended)
+    middle = t + step // 2
+
+    i = np.searchsorted(opens, middle, side='right') - 1
+
+    return (i >= 0) & (middle < closes[np.maximum(i, 0)])
+
+def expected(
+        calendar: Calendar,
+        t0: int,
+        t1: int,
+        step: int,
+        extended: bool = False,
+    ) -> np.ndarray:
+
+    """
+    Returns the epoch-second starts of every bar of 'step' seconds in the
+    sessions of 'calendar' between the epoch seconds 't0' and 't1'.
+    """
+
+    opens, closes = sessions(calendar, t0, t1, extended=extended)
+
+    # The bars whose midpoints fall in [open, close), on multiples of 'step'.
+    first = -((step // 2 - opens) // step) * step
+    counts = np.maximum(-((step // 2 - closes) // step) - first // step, 0)
+
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    starts = np.repeat(first, counts) + offsets * step
+
+    return starts[(starts >= t0) & (starts <= t1)]
+
+def missing(
+        panel: Panel,
+        calendars: List[Calendar],
+        step: int,
+        t0: int,
+        t1: int,
+        extended: bool = False,
+    ) -> np.ndarray:
+
+    """
+    Returns the number of bars missing from the sessions between the epoch
+    seconds 't0' and 't1' for each symbol of 'panel', which trades on the
+    calendar at the same position of 'calendars'.
+    """
+
+    counts = np.zeros(len(panel.symbols), dtype=np.int64)
+    T = len(panel.t)
+
+    for calendar in set(calendars):
+        columns = [j for j, c in enumerate(calendars) if c is calendar]
+        bars = expected(calendar, t0, t1, step, extended=extended)
+
+        i = np.searchsorted(panel.t, bars)
+        found = i < T
+        found[found] = panel.t[i[found]] == bars[found]
+
+        present = np.zeros((len(bars), len(columns)), dtype=bool)
+        present[found] = panel.mask[i[found]][:, columns]
+
+        counts[columns] = len(bars) - present.sum(axis=0)
+
+    return counts
+
+def restrict(
+        panel: Panel,
+        session: str = 'all',
+        timespan: str = 'hour',
+        default: str = 'XNYS',
+        t0: Optional[int] = None,
+        t1: Optional[int] = None,
+    ) -> Tuple[Panel, Optional[np.ndarray]]:
+
+    """
+    Filters the bars of 'panel' to the 'session' of the calendar each of its
+    symbols trades on (see 'calendar_of'), with 'default' for symbols without
+    a market prefix, and counts the bars missing from those sessions between
+    the epoch seconds 't0' and 't1' (by default, the range of the panel).
+
+    :return: The panel without the timestamps that are in no symbol's
+        session, and the (T, n) mask of its bars that are in session, or the
+        panel as is and None if no filtering applies.
+    """
+
+    if session not in SESSIONS:
+        raise ValueError(f"Invalid session: {session}. Must be one of {', '.join(SESSIONS)}.")
+
+    if default not in CALENDARS:
+        raise ValueError(f"Invalid calendar: {default}. Must be one of {', '.join(CALENDARS)}.")
+
+    if session == 'all' or timespan not in STEPS or len(panel) == 0:
+        return panel, None
+
+    step = STEPS[timespan]
+    extended = session == 'extended'
+    calendars = [calendar_of(symbol, CALENDARS[default]) for symbol in panel.symbols]
+
+    keep = np.empty((len(panel), len(calendars)), dtype=bool)
+
+    for calendar in set(calendars):
+        columns = [j for j, c in enumerate(calendars) if c is calendar]
+        keep[:, columns] = in_session(panel.t, calendar, step, extended=extended)[:, None]
+
+    OUT_OF_SESSION.inc(int(np.count_nonzero(panel.mask & ~keep)))
+
+    t0 = int(panel.t[0]) if t0 is None else t0
+    t1 = int(panel.t[-1]) if t1 is None else t1
+
+    gaps = missing(panel, calendars, step, t0, t1, extended=extended)
+
+    if gaps.sum() > 0:
+        MISSING_BARS.inc(int(gaps.sum()))
+
+        logger.info(f'restrict(session={session}): missing bars {dict(zip(panel.symbols, gaps.tolist()))}')
+
+    rows = keep.any(axis=1)
+
+    filtered = Panel(
+        t=panel.t[rows],
+        symbols=panel.symbols,
+        values=panel.values[rows],
+        mask=panel.mask[rows],
+    )
+
+    return filtered, keep[rows]
@@ -0,0 +1,156 @@
+
+from contextlib import (contextmanager)
+from multiprocessing import (shared_memory)
+from typing import (Iterator, List, Self, Tuple)
+
+import atexit
+import numpy as np
+import sys
+
+"""
+Zero-copy transfer of NumPy arrays to worker processes through
+'multiprocessing.shared_memory'.
+
+The parent publishes each array once into a named segment owned by a
+'SharedArrays' context, and sends workers only the small, picklable
+'SharedArray' descriptor. Workers attach a NumPy view of the segment by name,
+so neither the array nor results written into it are ever pickled. Segments
+are unlinked when the context exits, at interpreter exit if the context was
+never closed, and by the multiprocessing resource tracker if the parent is
+killed outright.
+"""
+
+
+class SharedArray:
+    """
+    A picklable descriptor of a NumPy array stored in a named shared memory
+    segment.
+    """
+
+    def __init__(self: Self, name: str, shape: Tuple[int, ...], dtype: str) -> None:
+        self._name = name
+        self._shape = tuple(shape)
+        self._dtype = dtype
+
+    def __repr__(self: Self) -> str:
+        return f"SharedArray(name='{self.name}', shape={self.shape}, dtype={self.dtype})"
+
+    @property
+    def name(self: Self) -> str:
+        """
+        Returns the name of the shared memory segment.
+        """
+
+        return self._name
+
+    @property
+    def shape(self: Self) -> Tuple[int, ...]:
+        """
+        Returns the shape of the array.
+        """
+
+        return self._shape
+
+    @property
+    def dtype(self: Self) -> str:
+        """
+        Returns the dtype of the array.
+        """
+
+        return self._dtype
+
+
+class SharedArrays:
+    """
+    Owns the shared memory segments published by the parent process, and
+    unlinks all of them when closed.
+    """
+
+    def __init__(self: Self) -> None:
+        self._segments: List[shared_memory.SharedMemory] = []
+
+        atexit.register(self.close)
+
+    def __enter__(self: Self) -> Self:
+        return self
+
+    def __exit__(self: Self, *args) -> None:
+        self.close()
+
+    def empty(self: Self, shape: Tuple[int, ...], dtype: str = 'float64') -> Tuple[SharedArray, np.ndarray]:
+        """
+        Allocates an uninitialized shared array, and returns its descriptor
+        along with a view of it in this process.
+        """
+
+        nbytes = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+        segment = shared_memory.SharedMemory(create=True, size=nbytes)
+
+        self._segments.append(segment)
+
+        view = np.ndarray(shape, dtype=dtype, buffer=segment.buf)
+
+        return SharedArray(name=segment.name, shape=shape, dtype=np.dtype(dtype).str), view
+
+    def publish(self: Self, array: np.ndarray) -> SharedArray:
+        """
+        Copies 'array' into a new shared segment, and returns its descriptor.
+        """
+
+        descriptor, view = self.empty(array.shape, array.dtype.str)
+        view[...] = array
+
+        return descriptor
+
+    def close(self: Self) -> None:
+        """
+        Unlinks every segment published by this object. Views of the segments
+        must not be used afterwards.
+        """
+
+        while self._segments:
+            segment = self._segments.pop()
+
+            try:
+                segment.close()
+            except BufferError:
+                # A view of the segment is still alive in this process; the
+                # mapping is released when it is garbage collected.
+                pass
+
+            try:
+                segment.unlink()
+            except FileNotFoundError:
+                pass
+
+        atexit.unregister(self.close)
+
+
+@contextmanager
+def attach(descriptor: SharedArray) -> Iterator[np.ndarray]:
+
+    """
+    Attaches the shared array described by 'descriptor' for the duration of
+    the 'with' block, yielding a NumPy view of it. The view must not be used
+    after the block.
+    """
+
+    if sys.version_info >= (3, 13):
+        segment = shared_memory.SharedMemory(name=descriptor.name, track=False)
+    else:
+        # Before Python 3.13 attaching always registers the segment with the
+        # resource tracker. Pool workers share the parent's tracker, where the
+        # registration is a no-op, so it must not be undone here.
+        segment = shared_memory.SharedMemory(name=descriptor.name)
+
+    view = np.ndarray(descriptor.shape, dtype=descriptor.dtype, buffer=segment.buf)
+
+    try:
+        yield view
+    finally:
+        del view
+
+        try:
+            segment.close()
+        except BufferError:
+            pass
@@ -0,0 +1,49 @@
+
+from types import (ModuleType)
+from typing import (Dict, Final, Optional)
+
+import importlib
+
+"""
+Runtime selection of the bar storage backend. Every backend is a module with
+the interface of 'util.database': 'init', 'insert_ohlcv', 'insert_coverage',
+'insert_bars', 'count_ohlcv', 'select_coverage', 'select_ohlcv',
+'select_ohlcv_batch', 'select_ohlcv_arrays', 'select_ohlcv_frame' and
+'select_panel'. Bars that a later read relies on without fetching them are
+written with 'insert_bars', which records their coverage along with them.
+"""
+
+# The available storage backends, mapped to the modules implementing them.
+BACKENDS: Final[Dict[str, str]] = {
+    'sqlite': 'util.database',
+    'columnar': 'util.colstore',
+}
+
+_backend: Optional[ModuleType] = None
+
+def use(name: str) -> ModuleType:
+
+    """
+    Selects the storage backend called 'name' and returns its module.
+    """
+
+    global _backend
+
+    if name not in BACKENDS:
+        raise ValueError(f"Invalid storage backend: {name}. Must be one of {', '.join(BACKENDS)}.")
+
+    _backend = importlib.import_module(BACKENDS[name])
+
+    return _backend
+
+def backend() -> ModuleType:
+
+    """
+    Returns the module of the selected storage backend, selecting the SQLite
+    backend if none has been selected yet.
+    """
+
+    if _backend is None:
+        return use('sqlite')
+
+    return _backend
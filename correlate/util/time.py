@@ -1,7 +1,7 @@
 
-from datetime import (datetime, timedelta)
-from functools import reduce
-from typing import (Callable, Iterator, List, Optional, Self)
+from datetime import (datetime)
+from typing import (Iterator)
+from util.calendar import (NYSE)
 
 
 def weekly(
@@ -10,33 +10,14 @@ def weekly(
     ) -> Iterator[tuple[datetime, datetime]]:
 
     """
-    Groups a continuous 'Iterator[datetime]' into weekly 'OHLCV' objects.
+    Yields the bounds of each trading week of the NYSE between 't0' and 't1':
+    from the start of its first session day to the last second of its last
+    session day, clipped to [t0, t1]. Weekends and exchange holidays are
+    skipped, and the final week is yielded even if it is partial (see
+    'util.calendar.Calendar.windows').
     """
 
-    def nearest_weekday(date: datetime) -> datetime:
-        weekday = date.weekday()
-
-        if weekday == 6: # If it is Saturday
-            return date + timedelta(days=2) # Move to Monday
-        elif weekday == 5: # If it is Sunday
-            return date + timedelta(days=1) # Move to Monday'
-        else:
-            return date
-
-    t0 = nearest_weekday(t0)
-    t1 = nearest_weekday(t1)
-
-    t: datetime = t0
-
-    while t < t1:
-        if t.weekday() == 4:
-            yield (t0, t)
-
-            t += timedelta(days=3) # Move to next Monday
-
-            t0 = t
-        else:
-            t += timedelta(days=1)
+    return NYSE.iter_windows(t0, t1, every='week')
 
 
 
@@ -0,0 +1,109 @@
+CREATE TABLE IF NOT EXISTS settings(
+    -- The hash of the settings of the fits, which keys the windows of every
+    -- other table.
+    settings TEXT NOT NULL,
+    -- The settings as a JSON object.
+    value TEXT NOT NULL,
+
+    PRIMARY KEY (settings)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS dcc(
+    -- The space-separated tickers of the universe, in the order of 'r'.
+    universe TEXT NOT NULL,
+    -- UNIX epoch timestamp in seconds of the start of the window.
+    t0 INTEGER NOT NULL,
+    -- UNIX epoch timestamp in seconds of the end of the window.
+    t1 INTEGER NOT NULL,
+    -- The key of the settings the window was fitted with (see 'settings').
+    settings TEXT NOT NULL,
+    -- The fitted DCC parameters.
+    a REAL NOT NULL,
+    b REAL NOT NULL,
+    -- The final correlation matrix R_T as a JSON array of rows, or JSON
+    -- null if only its strongest pairs were kept (see 'pairs').
+    r TEXT NOT NULL,
+    -- The final training loss of the DCC model, or NULL for the EWMA model,
+    -- which is not trained.
+    loss REAL,
+    -- The number of optimizer iterations run by the DCC model.
+    iterations INTEGER NOT NULL,
+    -- The number of returns the models were fitted to.
+    nobs INTEGER NOT NULL,
+
+    PRIMARY KEY (universe, t0, t1, settings)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS garch(
+    -- The space-separated tickers of the universe.
+    universe TEXT NOT NULL,
+    -- UNIX epoch timestamp in seconds of the start of the window.
+    t0 INTEGER NOT NULL,
+    -- UNIX epoch timestamp in seconds of the end of the window.
+    t1 INTEGER NOT NULL,
+    -- The key of the settings the window was fitted with (see 'settings').
+    settings TEXT NOT NULL,
+    -- The ticker the GARCH model was fitted to.
+    s TEXT NOT NULL,
+    -- The fitted GARCH parameters as a JSON array.
+    theta TEXT NOT NULL,
+    -- The final training loss of the GARCH model.
+    loss REAL NOT NULL,
+
+    PRIMARY KEY (universe, t0, t1, settings, s)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS fits(
+    -- The space-separated tickers of the universe.
+    universe TEXT NOT NULL,
+    -- UNIX epoch timestamp in seconds of the start of the window.
+    t0 INTEGER NOT NULL,
+    -- UNIX epoch timestamp in seconds of the end of the window.
+    t1 INTEGER NOT NULL,
+    -- The key of the settings the window was fitted with (see 'settings').
+    settings TEXT NOT NULL,
+    -- The ticker of a GARCH fit, or '' for the DCC fit of the universe.
+    s TEXT NOT NULL,
+    -- The fitted model, 'GARCH' or 'DCC'.
+    model TEXT NOT NULL,
+    -- The number of calls to the optimizer.
+    calls INTEGER NOT NULL,
+    -- The number of loss and gradient evaluations, and of iterations.
+    nfev INTEGER NOT NULL,
+    njev INTEGER NOT NULL,
+    nit INTEGER NOT NULL,
+    -- The wall time spent in the optimizer, in seconds.
+    seconds REAL NOT NULL,
+    -- Whether every call to the optimizer converged.
+    success INTEGER NOT NULL,
+    -- The termination status and message of the last call to the optimizer.
+    status INTEGER NOT NULL,
+    message TEXT NOT NULL,
+    -- The largest constraint violation of the fitted parameters.
+    violation REAL NOT NULL,
+    -- Whether the fit was loaded from the fit cache.
+    cached INTEGER NOT NULL,
+
+    PRIMARY KEY (universe, t0, t1, settings, s)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS pairs(
+    -- The space-separated tickers of the universe.
+    universe TEXT NOT NULL,
+    -- UNIX epoch timestamp in seconds of the start of the window.
+    t0 INTEGER NOT NULL,
+    -- UNIX epoch timestamp in seconds of the end of the window.
+    t1 INTEGER NOT NULL,
+    -- The key of the settings the window was fitted with (see 'settings').
+    settings TEXT NOT NULL,
+    -- The step of the correlation recursion, from 0 for the oldest return
+    -- to nobs - 1 for the final correlation matrix R_T.
+    step INTEGER NOT NULL,
+    -- The tickers of the pair, in the order of the universe.
+    s1 TEXT NOT NULL,
+    s2 TEXT NOT NULL,
+    -- The correlation of the pair.
+    rho REAL NOT NULL,
+
+    PRIMARY KEY (universe, t0, t1, settings, step, s1, s2)
+) WITHOUT ROWID;
@@ -3,11 +3,12 @@
 -- !!!
 
 INSERT INTO ohlcv (
-  t, -- timestamp as a UNIX epoch in minutes
+  t, -- timestamp as a UNIX epoch in seconds
   s, -- symbol
   o, -- open
   h, -- high
   l, -- low
   c, -- close
-  v  -- volume
-) VALUES (?, ?, ?, ?, ?, ?, ?)
\ No newline at end of file
+  v, -- volume
+  timespan -- aggregation period
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
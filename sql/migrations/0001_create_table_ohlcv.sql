@@ -1,5 +1,5 @@
 CREATE TABLE IF NOT EXISTS ohlcv(
-    -- UNIX epoch timestamp in miliseconds.
+    -- UNIX epoch timestamp in seconds.
     t INTEGER NOT NULL,
     -- The ticker for the OHLCV record.
     s TEXT NOT NULL,
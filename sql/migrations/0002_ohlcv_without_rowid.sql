@@ -0,0 +1,37 @@
+-- Re-key the OHLCV table as (s, timespan, t) in a WITHOUT ROWID table, so
+-- that a range of one ticker's bars is a contiguous scan of the primary key.
+CREATE TABLE ohlcv_v2(
+    -- The ticker for the OHLCV record.
+    s TEXT NOT NULL,
+    -- The aggregation period of the record, e.g. 'hour' or 'day'.
+    timespan TEXT NOT NULL,
+    -- UNIX epoch timestamp in seconds.
+    t INTEGER NOT NULL,
+    -- The opening price of the asset across the aggregation period.
+    o REAL NOT NULL,
+    -- The highest price of the asset across the aggregation period.
+    h REAL NOT NULL,
+    -- The lowest price of the asset across the aggregation period.
+    l REAL NOT NULL,
+    -- The closing price of the asset across the aggregation period.
+    c REAL NOT NULL,
+    -- The volume of shares of the asset that were traded across the period.
+    v REAL NOT NULL,
+
+    PRIMARY KEY (s, timespan, t)
+) WITHOUT ROWID;
+
+-- Every record written before this migration holds an hourly aggregate. The
+-- timestamps were written in seconds, but are normalized in case a record was
+-- stored in milliseconds.
+INSERT OR IGNORE INTO ohlcv_v2 (s, timespan, t, o, h, l, c, v)
+SELECT
+    s,
+    'hour',
+    CAST(CASE WHEN t >= 100000000000 THEN t / 1000 ELSE t END AS INTEGER),
+    o, h, l, c, v
+FROM ohlcv;
+
+DROP TABLE ohlcv;
+
+ALTER TABLE ohlcv_v2 RENAME TO ohlcv;
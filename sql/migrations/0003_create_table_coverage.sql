@@ -0,0 +1,14 @@
+-- The ranges of bars that have been fetched or derived in full, so that a
+-- lookup can tell a range without bars from one that was never fetched.
+CREATE TABLE coverage(
+    -- The ticker the range was fetched for.
+    s TEXT NOT NULL,
+    -- The aggregation period of the range, e.g. 'hour' or 'day'.
+    timespan TEXT NOT NULL,
+    -- UNIX epoch timestamps in seconds of the first and last second of the
+    -- range, inclusive.
+    t0 INTEGER NOT NULL,
+    t1 INTEGER NOT NULL,
+
+    PRIMARY KEY (s, timespan, t0, t1)
+) WITHOUT ROWID;
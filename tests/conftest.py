@@ -0,0 +1,7 @@
+
+import os
+import sys
+
+# The modules of the package import each other as top-level modules, as when
+# run with 'python correlate'.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'correlate'))
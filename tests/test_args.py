@@ -0,0 +1,33 @@
+
+import sys
+
+import pytest
+
+from args import (parse_args)
+
+
+@pytest.mark.parametrize('timespan', ['week', 'month'])
+def test_weekly_windows_reject_coarse_timespans(timespan, monkeypatch):
+    monkeypatch.setattr(sys, 'argv', ['correlate', '--api-key', 'x', '--start', '2024-03-04', '--timespan', timespan, 'A', 'B'])
+
+    with pytest.raises(SystemExit):
+        parse_args()
+
+def test_service_accepts_coarse_timespans(monkeypatch):
+    monkeypatch.setattr(sys, 'argv', ['correlate', '--api-key', 'x', '--serve', '8080', '--timespan', 'week'])
+
+    assert parse_args().timespan == 'week'
+
+@pytest.mark.parametrize('flag, value', [('--workers', '0'), ('--workers', 'x'), ('--prefetch', '-1')])
+def test_counts_are_validated(flag, value, monkeypatch):
+    monkeypatch.setattr(sys, 'argv', ['correlate', '--api-key', 'x', '--start', '2024-03-04', flag, value, 'A', 'B'])
+
+    with pytest.raises(SystemExit):
+        parse_args()
+
+def test_prefetch_may_be_disabled(monkeypatch):
+    monkeypatch.setattr(sys, 'argv', ['correlate', '--api-key', 'x', '--start', '2024-03-04', '--prefetch', '0', '--workers', '1', 'A', 'B'])
+
+    args = parse_args()
+
+    assert (args.prefetch, args.workers) == (0, 1)
@@ -0,0 +1,42 @@
+
+import numpy as np
+import os
+
+from cache import (FitCache)
+from dcc import (DCC)
+from garch import (GARCH)
+
+
+def test_fit_is_loaded_into_theta_and_ab(tmp_path):
+    cache = FitCache(path=str(tmp_path))
+    rng = np.random.default_rng(0)
+    returns = rng.standard_normal(200) * 0.01
+
+    garch = GARCH(max_iterations=1)
+    entry = cache.fit(garch, returns)
+
+    loaded = GARCH(max_iterations=1)
+    cache.fit(loaded, returns)
+
+    assert np.array_equal(loaded.theta, entry['params'])
+    assert loaded.report.cached
+
+    dcc = DCC(max_iterations=1)
+    entry = cache.fit(dcc, rng.standard_normal((2, 50)))
+
+    assert np.array_equal(dcc.ab, entry['params'])
+
+def test_puts_only_scan_once_over_budget(tmp_path, monkeypatch):
+    cache = FitCache(path=str(tmp_path), max_bytes=4096)
+    scans = []
+
+    entries = cache._entries
+    monkeypatch.setattr(cache, '_entries', lambda: scans.append(1) or entries())
+
+    for i in range(16):
+        cache.put(f'{i:02d}', x=np.zeros(64))
+
+    size = sum(entry.stat().st_size for entry in os.scandir(tmp_path))
+
+    assert 0 < len(scans) < 16
+    assert size <= 4096
@@ -0,0 +1,125 @@
+
+from datetime import (datetime, timezone)
+
+import numpy as np
+import pytest
+
+from replay import (ReplayServer, SyntheticSource)
+from util.client import (PolygonClient)
+from util.ohlcv import (OHLCVBatch)
+
+import util.client as client_module
+import util.colstore as colstore
+import util.database as database
+import util.storage as storage
+
+
+def utc(*args: int) -> datetime:
+    return datetime(*args, tzinfo=timezone.utc)
+
+def hourly(ticker: str, t0: datetime, t1: datetime) -> np.ndarray:
+    """
+    Returns the synthetic hourly bars of 'ticker' starting in [t0, t1).
+    """
+
+    aggs = SyntheticSource().aggs(ticker, 1, 'hour', int(t0.timestamp()), int(t1.timestamp()) - 1)
+
+    return np.array([(a['t'] // 1000, a['o'], a['c'], a['v']) for a in aggs], dtype=[('t', np.int64), ('o', float), ('c', float), ('v', float)])
+
+@pytest.fixture(scope='module')
+def server():
+    with ReplayServer() as server:
+        yield server
+
+@pytest.fixture
+def client(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(database, 'PATH', str(tmp_path / 'olhcv.db'))
+    storage.use('sqlite').init()
+
+    return PolygonClient(api_key='offline', base=server.url)
+
+def test_partial_hourly_cache_is_completed(client):
+    # Only the hours from 08:30 were fetched, as by a window starting then.
+    client.list_aggs('A', utc(2024, 3, 4, 8, 30), utc(2024, 3, 4, 23, 59), timespan='hour')
+
+    day = client.list_aggs('A', utc(2024, 3, 4, 8, 30), utc(2024, 3, 5, 8, 30), timespan='day')
+    hours = hourly('A', utc(2024, 3, 4), utc(2024, 3, 5))
+
+    assert day.t[0] == int(utc(2024, 3, 4).timestamp())
+    assert day.open[0] == pytest.approx(hours['o'][0])
+    assert day.close[0] == pytest.approx(hours['c'][-1])
+    assert day.volume[0] == pytest.approx(hours['v'].sum())
+
+def test_hourly_store_hit_requires_coverage(client, server):
+    client.list_aggs('A', utc(2024, 3, 4, 12), utc(2024, 3, 4, 18), timespan='hour')
+
+    bars = client.list_aggs('A', utc(2024, 3, 4), utc(2024, 3, 4, 23), timespan='hour')
+
+    assert len(bars) == 24
+
+    requests = server.stats()['requests']
+    client.list_aggs('A', utc(2024, 3, 4), utc(2024, 3, 4, 23), timespan='hour')
+
+    assert server.stats()['requests'] == requests
+
+@pytest.mark.parametrize('timespan, t0, t1, buckets', [
+    ('week', utc(2024, 3, 4), utc(2024, 3, 25), [utc(2024, 3, 4), utc(2024, 3, 11), utc(2024, 3, 18)]),
+    ('month', utc(2024, 1, 1), utc(2024, 3, 1), [utc(2024, 1, 1), utc(2024, 2, 1)]),
+])
+def test_week_and_month_bars_are_complete(client, timespan, t0, t1, buckets):
+    # A partial week of hours is cached first, as by an earlier run.
+    client.list_aggs('A', utc(2024, 1, 17, 8, 30), utc(2024, 1, 19), timespan='hour')
+    client.list_aggs('A', utc(2024, 3, 18, 8, 30), utc(2024, 3, 20, 9), timespan='hour')
+
+    bars = client.list_aggs('A', t0, datetime.fromtimestamp(t1.timestamp() - 1, timezone.utc), timespan=timespan)
+
+    assert bars.t.tolist() == [int(bucket.timestamp()) for bucket in buckets]
+
+    for i, (start, end) in enumerate(zip(buckets, buckets[1:] + [t1])):
+        hours = hourly('A', start, end)
+
+        assert bars.open[i] == pytest.approx(hours['o'][0])
+        assert bars.close[i] == pytest.approx(hours['c'][-1])
+        assert bars.volume[i] == pytest.approx(hours['v'].sum())
+
+def test_derived_bars_overlap_window(client):
+    # A window starting at 08:30 on a Monday includes that Monday's day bar.
+    panel = client.fetch_panel(['A', 'B'], utc(2024, 3, 4, 8, 30), utc(2024, 3, 8, 23, 59, 59), timespan='day')
+
+    assert panel.t[0] == int(utc(2024, 3, 4).timestamp())
+    assert len(panel) == 5
+
+def test_open_bucket_is_not_cached(client, monkeypatch):
+    now = utc(2024, 3, 20, 12).timestamp()
+
+    with monkeypatch.context() as patch:
+        patch.setattr(client_module.time, 'time', lambda: now)
+
+        bars = client.list_aggs('A', utc(2024, 3, 18), utc(2024, 3, 20, 11), timespan='day')
+
+    assert bars.t.tolist() == [int(utc(2024, 3, 18).timestamp()), int(utc(2024, 3, 19).timestamp())]
+
+    bars = client.list_aggs('A', utc(2024, 3, 20), utc(2024, 3, 20, 23), timespan='day')
+    hours = hourly('A', utc(2024, 3, 20), utc(2024, 3, 21))
+
+    assert len(bars) == 1
+    assert bars.volume[0] == pytest.approx(hours['v'].sum())
+
+@pytest.mark.parametrize('name', ['sqlite', 'columnar'])
+def test_bars_are_stored_with_their_coverage(tmp_path, monkeypatch, name):
+    monkeypatch.setattr(database, 'PATH', str(tmp_path / 'olhcv.db'))
+    monkeypatch.setattr(colstore, 'PATH', str(tmp_path / 'bars'))
+    monkeypatch.setattr(storage, '_backend', storage.backend())
+
+    backend = storage.use(name)
+    backend.init()
+
+    t0, t1 = utc(2024, 3, 4), utc(2024, 3, 4, 23)
+    aggs = SyntheticSource().aggs('A', 1, 'hour', int(t0.timestamp()), int(t1.timestamp()))
+    batch = OHLCVBatch.from_rows('A', ((a['t'] // 1000, a['o'], a['h'], a['l'], a['c'], a['v']) for a in aggs))
+
+    backend.insert_bars(batch, t0, t1)
+    backend.insert_bars(batch[:0], t1, t0)
+
+    assert backend.select_coverage(['A'], t0, t1)['A'] == [(int(t0.timestamp()), int(t1.timestamp()))]
+    assert len(backend.select_ohlcv_batch('A', t0, t1)) == len(batch)
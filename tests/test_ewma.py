@@ -0,0 +1,73 @@
+
+from collections import (deque)
+
+import numpy as np
+import pytest
+
+from dcc_loss import (R_iter)
+from ewma import (EWMA, correlation, correlation_iter, covariance, covariance_iter, covariances)
+
+
+def series(n: int = 4, T: int = 80) -> np.ndarray:
+    return np.random.default_rng(0).standard_normal((n, T)) * 0.01
+
+def test_covariance_is_the_last_of_the_recursion():
+    tr = series()
+
+    S = deque(covariance_iter(tr, 0.9), maxlen=1)[0]
+
+    assert np.allclose(covariance(tr, 0.9), S)
+
+def recursion(tr: np.ndarray, decay: float) -> np.ndarray:
+    S = (tr @ tr.T) / tr.shape[1]
+    Ss = [S]
+
+    for t in range(tr.shape[1] - 1, 0, -1):
+        S = decay * S + (1.0 - decay) * np.outer(tr[:, t], tr[:, t])
+        Ss.append(S)
+
+    return np.array(Ss)
+
+@pytest.mark.parametrize('size', [1, 48, 1 << 22])
+def test_stacks_follow_the_recursion(size):
+    tr = series()
+    n = tr.shape[0]
+
+    stacks = list(covariances(tr, 0.9, size=size))
+
+    assert all(len(S) * n * n <= max(size, n * n) for S in stacks)
+    assert np.allclose(np.concatenate(stacks), recursion(tr, 0.9))
+
+def test_correlations_match_the_dcc_recursion():
+    tr = series()
+
+    for R, expected in zip(correlation_iter(tr, 0.9), R_iter(tr=tr, ab=[0.1, 0.9]), strict=True):
+        assert np.allclose(R, expected)
+
+def test_fit_skips_the_loss_by_default():
+    tr = series()
+    model = EWMA(decay=0.9)
+
+    assert model.fit(tr) == []
+    assert np.allclose(model.R, correlation(covariance(tr, 0.9)))
+    assert np.allclose(model.ab, [0.1, 0.9])
+
+def test_fit_streams_the_loss_on_request():
+    tr = series()
+    model = EWMA(decay=0.9, loss=True)
+
+    loss = 0.0
+
+    for S, e in zip(recursion(tr, 0.9), tr[:, ::-1].T):
+        e = e / np.sqrt(np.diagonal(S))
+        R = correlation(S)
+        loss += np.log(np.linalg.det(R)) + e @ np.linalg.inv(R) @ e
+
+    losses = model.fit(tr)
+
+    assert len(losses) == 1
+    assert losses[0] == pytest.approx(loss)
+
+def test_decay_must_be_a_fraction():
+    with pytest.raises(ValueError):
+        EWMA(decay=1.0)
@@ -0,0 +1,79 @@
+
+import json
+import numpy as np
+
+import jobs
+import pipeline
+
+from util.panel import (Panel)
+
+DEFAULTS = {
+    'column': 'close',
+    'timespan': 'hour',
+    'returns': 'log',
+    'missing': 'drop',
+    'session': 'all',
+    'calendar': 'XNYS',
+    'max_iterations': 1,
+    'method': 'SLSQP',
+    'p': 1,
+    'q': 1,
+    'stopping_early': True,
+    'model': 'dcc',
+    'decay': 0.94,
+    'top_k': None,
+    'threshold': None,
+    'steps': False,
+}
+
+
+class Client:
+    """
+    Serves hourly prices of the tickers A to D, with every other bar of D
+    missing.
+    """
+
+    def fetch_panel(self, tickers, t0, t1, column, timespan) -> Panel:
+        T = 60
+        rng = np.random.default_rng(0)
+        prices = 100.0 * np.exp(np.cumsum(rng.standard_normal((T, 4)) * 0.01, axis=0))
+        mask = np.ones((T, 4), dtype=bool)
+        mask[::2, 3] = False
+
+        columns = ['ABCD'.index(ticker) for ticker in tickers]
+        t = int(t0.timestamp()) + 3600 * np.arange(T)
+
+        return Panel(t=t, symbols=tickers, values=np.where(mask, prices, np.nan)[:, columns], mask=mask[:, columns])
+
+def test_jobs_share_garch_fits_and_keep_their_own_returns(tmp_path, monkeypatch):
+    spec = {
+        'jobs': [
+            {'name': 'ab', 'tickers': ['A', 'B'], 'start': '2024-03-04', 'end': '2024-03-08'},
+            {'name': 'ab_top', 'tickers': ['A', 'B'], 'start': '2024-03-04', 'end': '2024-03-08', 'top_k': 1},
+            {'name': 'bcd', 'tickers': ['B', 'C', 'D'], 'start': '2024-03-04', 'end': '2024-03-08'},
+        ],
+    }
+
+    path = tmp_path / 'jobs.json'
+    path.write_text(json.dumps(spec))
+
+    fitted = []
+    fit_garch = pipeline.fit_garch
+
+    def spy(returns, tickers=None, **kwargs):
+        fitted.extend(tickers)
+        return fit_garch(returns, tickers=tickers, **kwargs)
+
+    monkeypatch.setattr(pipeline, 'fit_garch', spy)
+
+    jobs.run(jobs.load(str(path), defaults=DEFAULTS), Client())
+
+    outputs = {name: [json.loads(line) for line in open(tmp_path / f'{name}.jsonl')] for name in ['ab', 'ab_top', 'bcd']}
+
+    # A and B are fitted once for both settings of the universe A B, and B
+    # again for B C D, whose returns skip the bars D is missing.
+    assert sorted(fitted) == ['A', 'B', 'B', 'C', 'D']
+    assert outputs['ab'][0]['nobs'] == 59
+    assert outputs['bcd'][0]['nobs'] == 29
+    assert outputs['ab'][0]['thetas'] == outputs['ab_top'][0]['thetas']
+    assert 'pairs' in outputs['ab_top'][0]
@@ -0,0 +1,41 @@
+
+import numpy as np
+import pytest
+
+from util.pairs import (collect, select, stream)
+
+R = np.array([
+    [1.0, 0.9, -0.2, 0.1],
+    [0.9, 1.0, -0.7, 0.3],
+    [-0.2, -0.7, 1.0, 0.5],
+    [0.1, 0.3, 0.5, 1.0],
+])
+
+
+def test_select_strongest_pairs():
+    i, j, rho = select(R, k=2)
+
+    assert list(zip(i, j)) == [(0, 1), (1, 2)]
+    assert rho.tolist() == [0.9, -0.7]
+
+def test_select_by_threshold():
+    i, j, rho = select(R, threshold=0.3)
+
+    assert list(zip(i, j)) == [(0, 1), (1, 2), (2, 3), (1, 3)]
+
+    i, j, _ = select(R, k=1, threshold=0.95)
+
+    assert len(i) == 0
+
+def test_select_rejects_invalid_arguments():
+    with pytest.raises(ValueError):
+        select(R, k=0)
+
+    with pytest.raises(ValueError):
+        select(R, threshold=1.5)
+
+def test_stream_numbers_the_steps():
+    pairs = collect(stream([R, np.eye(4)], k=1, start=5))
+
+    assert pairs['step'].tolist() == [5, 6]
+    assert pairs['i'].tolist() == [0, 0]
@@ -0,0 +1,38 @@
+
+import numpy as np
+
+import pipeline
+
+from dcc_loss import (R_iter)
+from pipeline import (fit_window)
+from util.pairs import (collect, stream)
+
+
+def test_only_pending_universes_are_fitted(monkeypatch):
+    fitted = []
+    fit_garch = pipeline.fit_garch
+
+    def spy(returns, tickers=None, **kwargs):
+        fitted.append((tickers, returns.shape[0]))
+        return fit_garch(returns, tickers=tickers, **kwargs)
+
+    monkeypatch.setattr(pipeline, 'fit_garch', spy)
+
+    rng = np.random.default_rng(0)
+    returns = rng.standard_normal((3, 100)) * 0.01
+
+    fits = fit_window(returns, tickers=['A', 'B', 'C'], universes=[['C', 'A']], max_iterations=1)
+
+    assert fitted == [(['C', 'A'], 2)]
+    assert [fit['tickers'] for fit in fits] == [['C', 'A']]
+    assert len(fits[0]['garch_reports']) == 2
+
+def test_ewma_steps_follow_the_dcc_recursion():
+    rng = np.random.default_rng(0)
+    returns = rng.standard_normal((3, 100)) * 0.01
+
+    fit, = fit_window(returns, tickers=['A', 'B', 'C'], universes=[['A', 'B', 'C']], model='ewma', top_k=2, steps=True)
+    expected = collect(stream(R_iter(tr=returns, ab=fit['ab']), k=2))
+
+    for key in ['step', 'i', 'j', 'rho']:
+        assert np.allclose(fit['pairs'][key], expected[key])
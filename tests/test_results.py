@@ -0,0 +1,135 @@
+
+from datetime import (datetime, timezone)
+
+import numpy as np
+import os
+import sqlite3
+
+from util.results import (SQL_DIR, ResultSink)
+
+T0 = datetime(2024, 3, 4, tzinfo=timezone.utc)
+T1 = datetime(2024, 3, 8, tzinfo=timezone.utc)
+
+
+def write(sink: ResultSink, tickers=('A', 'B')) -> None:
+    sink.write(
+        tickers=list(tickers),
+        t0=T0,
+        t1=T1,
+        thetas=np.zeros((len(tickers), 3)),
+        garch_losses=np.zeros(len(tickers)),
+        ab=np.array([0.1, 0.8]),
+        R=np.eye(len(tickers)),
+        loss=0.0,
+        iterations=1,
+        nobs=10,
+    )
+
+def test_windows_are_keyed_by_settings(tmp_path):
+    path = str(tmp_path / 'results.db')
+
+    with ResultSink(path=path, settings={'timespan': 'hour'}) as sink:
+        write(sink)
+
+    with ResultSink(path=path, settings={'timespan': 'day'}) as sink:
+        assert sink.windows(['A', 'B']) == set()
+
+        write(sink)
+
+    with ResultSink(path=path, settings={'timespan': 'hour'}) as sink:
+        assert sink.contains(['A', 'B'], T0, T1)
+
+    rows = sqlite3.connect(path).execute('SELECT COUNT(*), COUNT(DISTINCT settings) FROM dcc').fetchone()
+
+    assert rows == (2, 2)
+
+def test_legacy_tables_are_migrated(tmp_path):
+    path = str(tmp_path / 'results.db')
+
+    con = sqlite3.connect(path)
+    con.execute('CREATE TABLE dcc(universe TEXT, t0 INTEGER, t1 INTEGER, a REAL, b REAL, r TEXT, loss REAL, iterations INTEGER, nobs INTEGER, PRIMARY KEY (universe, t0, t1))')
+    con.execute("INSERT INTO dcc VALUES ('A B', 1, 2, 0.1, 0.8, '[]', 0.0, 1, 10)")
+    con.commit()
+    con.close()
+
+    with ResultSink(path=path, settings={'timespan': 'hour'}) as sink:
+        assert sink.windows(['A', 'B']) == set()
+
+    rows = sqlite3.connect(path).execute('SELECT universe, t0, t1, settings FROM dcc').fetchall()
+
+    assert rows == [('A B', 1, 2, '')]
+
+def test_refit_replaces_the_pairs_of_a_window(tmp_path):
+    path = str(tmp_path / 'results.db')
+    pairs = lambda i, j: {'step': np.array([9]), 'i': np.array([i]), 'j': np.array([j]), 'rho': np.array([0.5])}
+
+    for i, j in [(0, 1), (1, 2)]:
+        with ResultSink(path=path) as sink:
+            sink.write(
+                tickers=['A', 'B', 'C'],
+                t0=T0,
+                t1=T1,
+                thetas=np.empty((0, 0)),
+                garch_losses=np.empty(0),
+                ab=np.array([0.06, 0.94]),
+                R=np.eye(3),
+                loss=0.0,
+                iterations=0,
+                nobs=10,
+                pairs=pairs(i, j),
+            )
+
+    rows = sqlite3.connect(path).execute('SELECT s1, s2 FROM pairs').fetchall()
+
+    assert rows == [('B', 'C')]
+
+def test_models_without_a_loss_are_stored(tmp_path):
+    path = str(tmp_path / 'results.db')
+
+    with ResultSink(path=path) as sink:
+        sink.write(
+            tickers=['A', 'B'],
+            t0=T0,
+            t1=T1,
+            thetas=np.empty((0, 0)),
+            garch_losses=np.empty(0),
+            ab=np.array([0.06, 0.94]),
+            R=np.eye(2),
+            loss=None,
+            iterations=0,
+            nobs=10,
+        )
+
+    assert sqlite3.connect(path).execute('SELECT loss FROM dcc').fetchall() == [(None,)]
+
+def test_loss_is_made_nullable_in_existing_databases(tmp_path):
+    path = str(tmp_path / 'results.db')
+
+    # The schema of the results database before the loss was nullable.
+    with open(os.path.join(SQL_DIR, 'create_table_results.sql'), 'r') as file:
+        schema = file.read().replace('loss REAL,', 'loss REAL NOT NULL,')
+
+    con = sqlite3.connect(path)
+    con.executescript(schema)
+    con.execute("INSERT INTO dcc VALUES ('A B', 1, 2, 'key', 0.1, 0.8, '[]', 0.5, 1, 10)")
+    con.commit()
+    con.close()
+
+    with ResultSink(path=path) as sink:
+        sink.write(
+            tickers=['A', 'B'],
+            t0=T0,
+            t1=T1,
+            thetas=np.empty((0, 0)),
+            garch_losses=np.empty(0),
+            ab=np.array([0.06, 0.94]),
+            R=np.eye(2),
+            loss=None,
+            iterations=0,
+            nobs=10,
+        )
+
+    rows = sqlite3.connect(path).execute('SELECT t0, settings, loss FROM dcc ORDER BY t0').fetchall()
+
+    assert rows[0] == (1, 'key', 0.5)
+    assert rows[1][2] is None
@@ -0,0 +1,103 @@
+
+from datetime import (datetime, timedelta, timezone)
+
+import numpy as np
+import pytest
+
+from args import (dateformat)
+from util.calendar import (CRYPTO, NYSE)
+from util.panel import (Panel)
+from util.session import (MISSING_BARS, expected, in_session, restrict, sessions)
+
+
+def utc(text: str) -> int:
+    return int(np.datetime64(text, 's').astype(np.int64))
+
+def test_opens_follow_daylight_saving_time():
+    days = np.array(['2024-03-08', '2024-03-11', '2024-11-01', '2024-11-04'], dtype='datetime64[D]')
+    opens, closes = NYSE.opens_closes(days)
+
+    assert opens.astype(str).tolist() == [
+        '2024-03-08T14:30:00',
+        '2024-03-11T13:30:00',
+        '2024-11-01T13:30:00',
+        '2024-11-04T14:30:00',
+    ]
+    assert (closes - opens == np.timedelta64(390, 'm')).all()
+
+def test_early_closes_shorten_regular_and_extended_sessions():
+    days = np.array(['2024-07-03', '2024-11-29', '2024-12-24'], dtype='datetime64[D]')
+
+    _, closes = NYSE.opens_closes(days)
+    _, extended = NYSE.opens_closes(days, extended=True)
+
+    assert closes.astype(str).tolist() == ['2024-07-03T17:00:00', '2024-11-29T18:00:00', '2024-12-24T18:00:00']
+    assert (extended - closes == np.timedelta64(4, 'h')).all()
+
+def test_holidays_are_not_sessions():
+    days = NYSE.sessions('2024-03-25', '2024-03-31').astype(str).tolist()
+
+    assert days == ['2024-03-25', '2024-03-26', '2024-03-27', '2024-03-28']
+    assert '2024-07-04' not in NYSE.sessions('2024-07-01', '2024-07-05').astype(str).tolist()
+    assert len(CRYPTO.sessions('2024-03-25', '2024-03-31')) == 7
+
+def test_windows_are_clipped_to_the_range():
+    starts, ends = NYSE.windows(datetime(2024, 3, 20, 12), datetime(2024, 4, 3), every='week')
+
+    assert starts.astype(str).tolist() == ['2024-03-20T12:00:00', '2024-03-25T00:00:00', '2024-04-01T00:00:00']
+    assert ends.astype(str).tolist() == ['2024-03-22T23:59:59', '2024-03-28T23:59:59', '2024-04-03T00:00:00']
+
+@pytest.mark.filterwarnings('error')
+def test_aware_bounds_are_taken_in_utc():
+    t1 = datetime(2024, 7, 5, 2, tzinfo=timezone(timedelta(hours=2)))
+
+    starts, ends = NYSE.windows(dateformat('2024-06-28T00:00:00Z'), t1, every='week')
+
+    assert starts.astype(str).tolist() == ['2024-06-28T08:30:00', '2024-07-01T00:00:00']
+    assert ends.astype(str).tolist() == ['2024-06-28T23:59:59', '2024-07-05T00:00:00']
+
+def test_bars_are_in_session_by_their_midpoint():
+    t = utc('2024-03-08T13:00') + 3600 * np.arange(10)
+
+    # 8:00 to 17:00 Eastern: the bars from 9:00 to 16:00 are in session.
+    assert in_session(t, NYSE, 3600).tolist() == [False, True, True, True, True, True, True, True, False, False]
+    assert in_session(t, NYSE, 3600, extended=True).all()
+
+def test_expected_bars_of_regular_and_early_close_sessions():
+    assert len(expected(NYSE, utc('2024-03-08'), utc('2024-03-09'), 3600)) == 7
+    assert len(expected(NYSE, utc('2024-11-29'), utc('2024-11-30'), 3600)) == 4
+    assert len(expected(NYSE, utc('2024-03-29'), utc('2024-03-30'), 3600)) == 0
+
+    opens, _ = sessions(NYSE, utc('2024-03-08'), utc('2024-03-08'))
+
+    assert utc('2024-03-08T14:30') in opens
+
+def test_restrict_masks_bars_out_of_session_and_counts_missing_bars():
+    t = utc('2024-03-08T00:00') + 3600 * np.arange(24)
+    values = np.ones((24, 2))
+    mask = np.ones((24, 2), dtype=bool)
+
+    # The bar of A from 15:00 to 16:00 UTC is missing.
+    mask[15, 0] = False
+
+    panel = Panel(t=t, symbols=['A', 'X:BTCUSD'], values=values, mask=mask)
+    missing = MISSING_BARS.value()
+
+    filtered, keep = restrict(panel, session='regular', timespan='hour')
+
+    assert len(filtered) == 24
+    assert keep[:, 0].sum() == 7
+    assert keep[:, 1].all()
+    assert MISSING_BARS.value() == missing + 1
+
+    filtered, keep = restrict(Panel(t=t, symbols=['A'], values=values[:, :1], mask=mask[:, :1]), session='regular', timespan='hour')
+
+    assert filtered.t.tolist() == t[14:21].tolist()
+
+def test_restrict_leaves_daily_bars_and_rejects_unknown_sessions():
+    panel = Panel(t=np.arange(3) * 86400, symbols=['A'], values=np.ones((3, 1)), mask=np.ones((3, 1), dtype=bool))
+
+    assert restrict(panel, session='regular', timespan='day') == (panel, None)
+
+    with pytest.raises(ValueError):
+        restrict(panel, session='overnight')
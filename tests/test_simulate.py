@@ -0,0 +1,26 @@
+
+from datetime import (datetime, timezone)
+
+from simulate import (Simulator, write)
+from util.client import (PolygonClient)
+
+import util.database as database
+import util.storage as storage
+
+
+def test_simulated_bars_are_read_offline(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, 'PATH', str(tmp_path / 'olhcv.db'))
+    storage.use('sqlite').init()
+
+    t0 = datetime(2024, 3, 4, tzinfo=timezone.utc)
+    t1 = datetime(2024, 3, 17, 23, 59, 59, tzinfo=timezone.utc)
+
+    written = write(Simulator(n=2, seed=0), ['A', 'B'], 14 * 24, t0, chunk=100)
+
+    # Nothing listens on the port, so any request made would fail.
+    client = PolygonClient(api_key='offline', base='http://127.0.0.1:9')
+    windows = list(client.fetch(tickers=['A', 'B'], t0=t0, t1=t1))
+
+    assert written == 2 * 14 * 24
+    assert len(windows) == 2
+    assert all(r.shape[0] == 2 for _, r in windows)
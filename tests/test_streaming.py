@@ -0,0 +1,94 @@
+
+from datetime import (datetime, timezone)
+
+import numpy as np
+
+from pipeline import (fit_window)
+from service import (QUERIES, CorrelationService)
+from streaming import (StreamingFit)
+from util.panel import (Panel)
+
+TICKERS = ['A', 'B', 'C']
+
+
+def series(T: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+
+    return rng.standard_normal((len(TICKERS), T)) * 0.01
+
+def test_state_matches_the_fit():
+    r = series(120)
+
+    for model in ['dcc', 'ewma']:
+        fit, = fit_window(r, tickers=TICKERS, universes=[TICKERS], model=model, max_iterations=1)
+        warm = StreamingFit(fit, r, model=model)
+
+        assert np.allclose(warm.R, fit['R'])
+        assert warm.nobs == 120
+
+def test_advance_follows_the_garch_and_dcc_recursions():
+    r = series(121)
+    old = r[:, 1:]
+
+    fit, = fit_window(old, tickers=TICKERS, universes=[TICKERS], max_iterations=1)
+    warm = StreamingFit(fit, old)
+
+    sigma, e, Q = warm._sigma[:, 0], warm._e, warm._Q
+
+    assert warm.advance(r)
+    assert warm.nobs == 121
+
+    w, alpha, gamma, beta = np.asarray(fit['thetas']).T
+    r0 = old[:, 0]
+    expected = np.sqrt(w + alpha * r0 ** 2 + gamma * r0 ** 2 * (r0 < 0) + beta * sigma ** 2)
+    a, b = fit['ab']
+
+    assert np.allclose(warm._sigma[:, 0], expected)
+    assert np.allclose(warm._e, r[:, 0] / expected)
+    assert np.allclose(warm._Q, (1 - a - b) * warm._Q_int + a * np.outer(e, e) + b * Q)
+
+def test_advance_refuses_changed_or_too_many_returns():
+    r = series(200)
+    old = r[:, 100:]
+
+    fit, = fit_window(old, tickers=TICKERS, universes=[TICKERS], model='ewma')
+
+    changed = r[:, 99:].copy()
+    changed[0, -1] += 1.0
+
+    assert not StreamingFit(fit, old, model='ewma').advance(changed)
+    assert not StreamingFit(fit, old, model='ewma').advance(r)
+    assert StreamingFit(fit, old, model='ewma').advance(r[:, 90:])
+
+class Client:
+    """
+    Serves the first 'T' bars of a fixed panel.
+    """
+
+    def __init__(self, prices: np.ndarray) -> None:
+        self.prices = prices
+        self.T = 0
+
+    def fetch_panel(self, tickers, t0, t1, column, timespan) -> Panel:
+        t = 1_700_000_000 + 3600 * np.arange(self.T)
+
+        return Panel(t=t, symbols=tickers, values=self.prices[:self.T], mask=np.ones((self.T, len(tickers)), dtype=bool))
+
+def test_open_windows_are_advanced():
+    prices = 100.0 * np.exp(np.cumsum(series(150, seed=1).T, axis=0))
+    client = Client(prices)
+    service = CorrelationService(client=client, model='ewma')
+
+    query = (tuple(TICKERS), datetime(2024, 1, 1, tzinfo=timezone.utc), datetime(2100, 1, 1, tzinfo=timezone.utc))
+    warm = QUERIES.value(result='warm')
+
+    client.T = 120
+    fitted, = service.query([query])
+
+    client.T = 125
+    advanced, = service.query([query])
+
+    assert QUERIES.value(result='warm') == warm + 1
+    assert advanced['nobs'] == fitted['nobs'] + 5
+    assert np.array_equal(advanced['ab'], fitted['ab'])
+    assert not np.allclose(advanced['R'], fitted['R'])